@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+from config_store import atomic_write
+from logring import log
+from metrics import registry
+
+MAX_ENTRIES = 512
+MAX_BYTES = 64 * 1024 * 1024  # Cached cover files, in total
+MAX_FILE_SIZE = 8 * 1024 * 1024  # Bigger local files are not cached
+MAX_IMAGE_LENGTH = 256  # Longest large_image Discord accepts
+INDEX_VERSION = 1
+
+IMAGE_TYPES = {
+    b"\x89PNG": ".png",
+    b"\xff\xd8\xff": ".jpg",
+    b"GIF8": ".gif",
+    b"RIFF": ".webp",
+}
+
+
+def cache_dir():
+    """Per-user cache location ($XDG_CACHE_HOME on Linux, %LOCALAPPDATA% on Windows)."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "DiscordCRP", "art")
+
+
+def art_url(properties):
+    """mpris:artUrl of the current track, or None."""
+    url = properties.get('Metadata', {}).get('mpris:artUrl')
+    return str(url).strip() if url else None
+
+
+def image_extension(head, path):
+    for magic, extension in IMAGE_TYPES.items():
+        if head.startswith(magic):
+            return extension
+    extension = os.path.splitext(path)[1].lower()
+    return extension if extension in (".png", ".jpg", ".jpeg", ".gif", ".webp") else ".img"
+
+
+class ArtCache:
+    """Maps MPRIS art URLs to a large_image value.
+
+    http(s) art is passed through as Discord fetches it itself. file:// art
+    is hashed and copied into the cache directory under its content hash,
+    so covers shared by a whole album are stored once; Discord can only show
+    those when art_base_url points at where that directory is served from.
+
+    Entries are kept in LRU order, bounded by count and by the size of the
+    cached files, and the index is saved next to them so a restart does not
+    hash everything again. A local file is re-hashed only when its size or
+    mtime changes.
+    """
+
+    def __init__(self, directory=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.directory = directory or cache_dir()
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # art URL -> entry dict
+        self.blobs = {}  # content hash -> (file name, size)
+        self.total_bytes = 0
+        self.loaded = False
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def resolve(self, url, base_url=''):
+        """large_image value for an art URL, or None if Discord can't show it."""
+        if not self.loaded:
+            self.load()
+        parsed = urlparse(url)
+        if parsed.scheme in ('http', 'https'):
+            entry = self._lookup(url, None)
+            if entry is None:
+                entry = self._store(url, {"image": url if len(url) <= MAX_IMAGE_LENGTH else None})
+            return entry["image"]
+        if parsed.scheme != 'file' or not base_url:
+            # Local art only shows when it is served from art_base_url
+            return None
+
+        path = unquote(parsed.path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self._lookup(url, (stat.st_size, stat.st_mtime_ns))
+        if entry is None:
+            entry = self._add_file(url, path, stat)
+            if entry is None:
+                return None
+        if entry["hash"] not in self.blobs:
+            return None
+        image = f"{base_url.rstrip('/')}/{self.blobs[entry['hash']][0]}"
+        return image if len(image) <= MAX_IMAGE_LENGTH else None
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio(), 3)
+        }
+
+    def describe(self):
+        """One line for the Diagnostics panel."""
+        return (f"Album art: {len(self.entries)} cached, {self.total_bytes / 1024:.0f} kB, "
+                f"hit ratio {self.hit_ratio():.0%} ({self.hits}/{self.hits + self.misses})")
+
+    def _lookup(self, url, signature):
+        entry = self.entries.get(url)
+        if entry is not None and signature is not None:
+            if [entry.get("size"), entry.get("mtime")] != list(signature) or entry["hash"] not in self.blobs:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            registry.inc('art_cache_misses')
+            return None
+        self.entries.move_to_end(url)
+        self.hits += 1
+        registry.inc('art_cache_hits')
+        return entry
+
+    def _add_file(self, url, path, stat):
+        if stat.st_size > MAX_FILE_SIZE:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(MAX_FILE_SIZE + 1)
+        except OSError as e:
+            log(f"Error reading album art: {e}")
+            return None
+        if len(data) > MAX_FILE_SIZE:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.blobs:
+            name = digest + image_extension(data[:4], path)
+            try:
+                atomic_write(os.path.join(self.directory, name), data)
+            except OSError as e:
+                log(f"Error caching album art: {e}")
+                return None
+            self.blobs[digest] = (name, len(data))
+            self.total_bytes += len(data)
+        return self._store(url, {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns})
+
+    def _store(self, url, entry):
+        previous = self.entries.get(url)
+        self.entries[url] = entry
+        self.entries.move_to_end(url)
+        self.dirty = True
+        if previous is not None:
+            # The file at this URL changed, its old content may be unused now
+            self._release(previous.get("hash"))
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, entry = self.entries.popitem(last=False)
+            self._release(entry.get("hash"))
+
+    def _release(self, digest):
+        """Delete a cached file once no entry refers to it."""
+        if not digest or digest not in self.blobs:
+            return
+        if any(entry.get("hash") == digest for entry in self.entries.values()):
+            return
+        name, size = self.blobs.pop(digest)
+        self.total_bytes -= size
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log(f"Error removing cached album art: {e}")
+
+    def load(self):
+        """Read the saved index, dropping entries whose file is gone."""
+        self.loaded = True
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log(f"Error loading album art cache: {e}")
+            return
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+            return
+        for digest, (name, size) in index.get("blobs", {}).items():
+            if os.path.exists(os.path.join(self.directory, name)):
+                self.blobs[digest] = (name, size)
+                self.total_bytes += size
+        for url, entry in index.get("entries", []):
+            if "hash" not in entry or entry["hash"] in self.blobs:
+                self.entries[url] = entry
+        self._evict()
+
+    def save(self):
+        """Write the index if it changed since the last save."""
+        if not self.dirty:
+            return
+        index = {
+            "version": INDEX_VERSION,
+            "blobs": self.blobs,
+            "entries": list(self.entries.items())
+        }
+        try:
+            atomic_write(self.index_path, json.dumps(index))
+            self.dirty = False
+        except OSError as e:
+            log(f"Error saving album art cache: {e}")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Album art resolution through ArtCache, offline with file:// fixtures.
+
+Writes a set of fake cover files (a few albums, each shared by several
+tracks like embedded art extracted per track by some players), then plays
+through them the way a listening session would: every album in turn, then
+a reshuffled replay. Each pass runs twice, with a fresh cache and with one
+reloaded from the index of the previous run, and reports the time per
+lookup, the hit ratio and what is on disk.
+
+    python3 bench/bench_art.py [--albums 40] [--tracks 12] [--cover-kb 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import harness
+from art_cache import ArtCache
+
+
+def write_fixtures(directory, albums, tracks, cover_kb):
+    """file:// URLs in play order; every track of an album has its own copy of the cover."""
+    urls = []
+    for album in range(albums):
+        cover = b"\x89PNG" + os.urandom(cover_kb * 1024)
+        for track in range(tracks):
+            path = os.path.join(directory, f"album {album}", f"track {track}.png")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(cover)
+            urls.append("file://" + path.replace(" ", "%20"))
+    return urls
+
+
+def run(label, cache, urls):
+    start = time.perf_counter()
+    for url in urls:
+        cache.resolve(url, "https://art.example.com")
+    elapsed = time.perf_counter() - start
+    cache.save()
+    print(f"{label}: {elapsed / len(urls) * 1e6:.0f} us/lookup, {cache.describe()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--albums', type=int, default=40)
+    parser.add_argument('--tracks', type=int, default=12)
+    parser.add_argument('--cover-kb', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="discordcrp-bench-art-")
+    try:
+        urls = write_fixtures(os.path.join(workdir, "music"), args.albums, args.tracks, args.cover_kb)
+        replay = urls[:]
+        random.Random(1).shuffle(replay)
+        cache_dir = os.path.join(workdir, "cache")
+
+        run("cold", ArtCache(cache_dir), urls + replay)
+        run("restart", ArtCache(cache_dir), urls + replay)
+        files = [name for name in os.listdir(cache_dir) if name != "index.json"]
+        size = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in files)
+        print(f"disk: {len(files)} files for {len(urls)} tracks, {size / 1024 / 1024:.1f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
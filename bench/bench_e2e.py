@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""End-to-end soak benchmark: track change to SET_ACTIVITY frame.
+
+Runs a private dbus-daemon, bench/fake_mpris.py, bench/fake_discord.py and
+the headless daemon (`script.py --headless --player bench`, the same
+PresenceService the window uses). It changes tracks on a fixed period, and
+periodically restarts the player and the Discord server. It reports:
+
+    latency     track change (SetTrack on the fake player) to the matching
+                SET_ACTIVITY frame at the fake Discord server, p50/p99/max
+    D-Bus       method calls the app made on the player, per minute
+    wakeups     context switches of the daemon per second, and CPU use
+    RSS         daemon VmRSS at start, peak and end of the run
+    reconnects  Discord restart to the replayed presence, p50/max
+
+Discord accepts one update per 15 s, so track changes are spaced wider than
+the rate limit by default and latency measures the app alone. --rate-interval
+shortens the limit inside the daemon for quicker runs.
+
+    python3 bench/bench_e2e.py [--duration 600] [--track-period 16]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+import dbus
+from fake_mpris import CONTROL_INTERFACE
+from mpris import MPRIS_PATH
+
+PLAYER_NAME = 'bench'
+
+# Starts the headless daemon with a different rate limit
+DAEMON = r'''
+import sys
+import service
+from presence_queue import PresenceQueue
+interval = float(sys.argv[1])
+service.PresenceQueue = lambda clock: PresenceQueue(interval=interval, clock=clock)
+from headless import main
+sys.exit(main(sys.argv[2:]))
+'''
+
+CONFIG = {
+    'app_id': '123456789012345678',
+    'details': 'Soak test',
+    'state': '{title}',  # Track changes show up in the activity
+    'timestamp': 'Current Time',
+    'large_image': 'avatar',
+    'large_text': '',
+    'small_image': '',
+    'small_text': '',
+    'button1_text': '',
+    'button1_url': '',
+    'button2_text': '',
+    'button2_url': ''
+}
+
+
+def proc_sample(pid):
+    """(VmRSS in kB, context switches, CPU seconds) of a process and its threads."""
+    rss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    switches = 0
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/status") as f:
+                for line in f:
+                    if line.startswith(("voluntary_ctxt_switches:", "nonvoluntary_ctxt_switches:")):
+                        switches += int(line.split()[1])
+        except FileNotFoundError:
+            pass  # Thread exited
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return rss, switches, cpu
+
+
+def read_activities(path):
+    """(monotonic time, activity) frames logged by the fake Discord servers."""
+    if not os.path.exists(path):
+        return []
+    activities = []
+    with open(path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Still being written
+            entry = json.loads(line)
+            activities.append((entry["time"], entry["activity"]))
+    return activities
+
+
+def wait_for_activity(log_path, after, timeout=30):
+    """Time of the first frame logged after `after`, or None."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for logged, _ in read_activities(log_path):
+            if logged >= after:
+                return logged
+        time.sleep(0.05)
+    return None
+
+
+def player_control(address):
+    bus = dbus.bus.BusConnection(address)
+    service = f"org.mpris.MediaPlayer2.{PLAYER_NAME}"
+    return bus, dbus.Interface(bus.get_object(service, MPRIS_PATH), CONTROL_INTERFACE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=600, help="seconds of soak (default: %(default)s)")
+    parser.add_argument('--track-period', type=float, default=16, help="seconds between track changes")
+    parser.add_argument('--rate-interval', type=float, default=15, help="rate limit inside the daemon")
+    parser.add_argument('--churn-every', type=int, default=10, help="restart the player every N tracks (0: never)")
+    parser.add_argument('--restart-every', type=int, default=15, help="restart Discord every N tracks (0: never)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="discordcrp-bench-")
+    runtime_dir = os.path.join(workdir, "run")
+    config_home = os.path.join(workdir, "config")
+    os.makedirs(runtime_dir)
+    os.makedirs(os.path.join(config_home, "DiscordCRP"))
+    with open(os.path.join(config_home, "DiscordCRP", "config.json"), 'w') as f:
+        json.dump(CONFIG, f)
+    ipc_path = os.path.join(runtime_dir, "discord-ipc-0")
+    log_path = os.path.join(workdir, "activities.jsonl")
+
+    daemon = player = discord = app = None
+    try:
+        daemon, address = harness.start_session_bus()
+        player, _ = harness.start_fake_player(address, PLAYER_NAME)
+        discord = harness.start_fake_discord(ipc_path, '--log', log_path)
+        env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address,
+                   XDG_RUNTIME_DIR=runtime_dir, XDG_CONFIG_HOME=config_home,
+                   XDG_CACHE_HOME=workdir, XDG_DATA_HOME=workdir)
+        started = time.monotonic()
+        app = subprocess.Popen(
+            [sys.executable, '-c', DAEMON, str(args.rate_interval), '--player', PLAYER_NAME],
+            cwd=harness.REPO_DIR, env=env, stdout=subprocess.DEVNULL
+        )
+        if wait_for_activity(log_path, started) is None:
+            raise RuntimeError("the daemon never sent a presence")
+        bus, control = player_control(address)
+
+        changes = []  # (monotonic time, title)
+        reconnects = []
+        player_calls = 0
+        samples = [proc_sample(app.pid)]
+        begin = time.monotonic()
+        track = 0
+        while time.monotonic() - begin < args.duration:
+            track += 1
+            disrupted = False
+            if args.churn_every and track % args.churn_every == 0:
+                player_calls += control.Calls()
+                bus.close()
+                harness.stop(player)
+                player, _ = harness.start_fake_player(address, PLAYER_NAME)
+                bus, control = player_control(address)
+                disrupted = True
+            if args.restart_every and track % args.restart_every == 0:
+                harness.stop(discord)
+                restarted = time.monotonic()
+                discord = harness.start_fake_discord(ipc_path, '--log', log_path)
+                replayed = wait_for_activity(log_path, restarted, timeout=90)
+                if replayed is not None:
+                    reconnects.append(replayed - restarted)
+                disrupted = True
+            if disrupted:
+                # Following the new player sends an update too; let the rate
+                # limit refill so the next change is not measured waiting on it
+                time.sleep(args.rate_interval)
+
+            title = f"Track {track}"
+            changes.append((time.monotonic(), title))
+            control.SetTrack(title, "Bench Artist", "Bench Album", dbus.Int64(180_000_000))
+            next_change = time.monotonic() + args.track_period
+            while time.monotonic() < next_change:
+                time.sleep(min(1.0, max(0.0, next_change - time.monotonic())))
+                samples.append(proc_sample(app.pid))
+        elapsed = time.monotonic() - begin
+        player_calls += control.Calls()
+        bus.close()
+        time.sleep(1)  # Let the last frame arrive
+    finally:
+        harness.stop(app, discord, player, daemon)
+
+    activities = read_activities(log_path)
+    latencies = []
+    missed = 0
+    for changed, title in changes:
+        for logged, activity in activities:
+            if logged >= changed and activity and activity.get("state") == title:
+                latencies.append((logged - changed) * 1000)
+                break
+        else:
+            missed += 1
+
+    rss = [sample[0] for sample in samples]
+    switches = samples[-1][1] - samples[0][1]
+    cpu = samples[-1][2] - samples[0][2]
+    print(f"soak: {elapsed:.0f} s, {len(changes)} track changes, {missed} never reached Discord")
+    print(f"latency: p50 {harness.percentile(latencies, 0.5):.1f} ms, "
+          f"p99 {harness.percentile(latencies, 0.99):.1f} ms, "
+          f"max {max(latencies, default=0):.1f} ms")
+    print(f"D-Bus: {player_calls / elapsed * 60:.1f} player method calls/min")
+    print(f"wakeups: {switches / elapsed:.2f} context switches/s, CPU {cpu / elapsed * 100:.2f}%")
+    print(f"RSS: start {rss[0] / 1024:.1f} MB, peak {max(rss) / 1024:.1f} MB, end {rss[-1] / 1024:.1f} MB")
+    if reconnects:
+        print(f"reconnects: {len(reconnects)}, p50 {harness.percentile(reconnects, 0.5):.2f} s, "
+              f"max {max(reconnects):.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Per-refresh cost of reading MPRIS metadata, before and after MprisClient.
+
+"before" rebuilds the proxy and issues two Properties.Get calls per
+refresh, as get_mpris_metadata used to. "after" goes through the cached
+proxy and a single Properties.GetAll.
+
+    python3 bench/bench_mpris.py [--iterations N]
+"""
+import argparse
+import time
+
+import harness
+import dbus
+from mpris import MprisClient, MPRIS_PATH, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+from fake_mpris import CONTROL_INTERFACE
+
+
+def refresh_before(bus, service):
+    player = bus.get_object(service, MPRIS_PATH)
+    properties = dbus.Interface(player, PROPERTIES_INTERFACE)
+    properties.Get(PLAYER_INTERFACE, 'Metadata')
+    properties.Get(PLAYER_INTERFACE, 'PlaybackStatus')
+
+
+def refresh_after(client, service):
+    client.get_properties(service)
+
+
+def run(label, refresh, control, iterations):
+    control.ResetCalls()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        refresh()
+        samples.append((time.perf_counter() - start) * 1000)
+    calls = control.Calls()
+    print(f"{label:>6}: {calls / iterations:.2f} calls/refresh, "
+          f"p50 {harness.percentile(samples, 0.5):.3f} ms, "
+          f"p99 {harness.percentile(samples, 0.99):.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    daemon, address = harness.start_session_bus()
+    player = None
+    try:
+        player, service = harness.start_fake_player(address, 'bench')
+        bus = dbus.bus.BusConnection(address)
+        control = dbus.Interface(bus.get_object(service, MPRIS_PATH), CONTROL_INTERFACE)
+        client = MprisClient(bus)
+        run("before", lambda: refresh_before(bus, service), control, args.iterations)
+        run("after", lambda: refresh_after(client, service), control, args.iterations)
+    finally:
+        harness.stop(player, daemon)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Replay a recorded MPRIS session against the headless daemon.
+
+Runs a private dbus-daemon, bench/replay_mpris.py serving the trace,
+bench/fake_discord.py and the headless daemon following the players
+(`--player auto` by default). Once the daemon's first presence is out the
+trace plays, and the run reports:
+
+    updates     SET_ACTIVITY frames the daemon sent during the replay, per
+                replayed event
+    latency     replayed event to the next frame, p50/p99/max, counting
+                frames that followed an event
+    D-Bus       method calls the daemon made on the replayed players
+    CPU         daemon CPU time and context switches over the replay
+
+The same trace gives the same input on every run, so the numbers can be
+compared between builds; --json prints them for scripts.
+
+    python3 bench/bench_replay.py session.trace.gz [--speed 10] [--rate-interval 1]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import harness
+from bench_e2e import CONFIG, DAEMON, proc_sample, read_activities, wait_for_activity
+
+# Show the replayed tracks, so track changes change the activity
+REPLAY_CONFIG = dict(CONFIG, details='{title}', state='{? by {artist}}', timestamp='Track Progress')
+
+
+def read_events(path):
+    """Monotonic times of the events bench/replay_mpris.py replayed."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line)["time"] for line in f if line.endswith("\n")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', help="trace from bench/record_mpris.py")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay pace (default: %(default)s)")
+    parser.add_argument('--rate-interval', type=float, default=15, help="rate limit inside the daemon")
+    parser.add_argument('--player', default='auto', help="--player for the daemon (default: %(default)s)")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="discordcrp-replay-")
+    runtime_dir = os.path.join(workdir, "run")
+    config_home = os.path.join(workdir, "config")
+    os.makedirs(runtime_dir)
+    os.makedirs(os.path.join(config_home, "DiscordCRP"))
+    with open(os.path.join(config_home, "DiscordCRP", "config.json"), 'w') as f:
+        json.dump(REPLAY_CONFIG, f)
+    ipc_path = os.path.join(runtime_dir, "discord-ipc-0")
+    activity_log = os.path.join(workdir, "activities.jsonl")
+    event_log = os.path.join(workdir, "events.jsonl")
+
+    daemon = replay = discord = app = None
+    try:
+        daemon, address = harness.start_session_bus()
+        env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+        replay = subprocess.Popen(
+            [sys.executable, os.path.join(harness.BENCH_DIR, 'replay_mpris.py'), args.trace,
+             '--speed', str(args.speed), '--paused', '--log', event_log,
+             '--linger', str(args.rate_interval + 1)],
+            env=env, stdout=subprocess.PIPE, text=True
+        )
+        if replay.stdout.readline().strip() != "ready":
+            raise RuntimeError("the replayer did not start")
+        discord = harness.start_fake_discord(ipc_path, '--log', activity_log)
+        app = subprocess.Popen(
+            [sys.executable, '-c', DAEMON, str(args.rate_interval), '--player', args.player],
+            cwd=harness.REPO_DIR,
+            env=dict(env, XDG_RUNTIME_DIR=runtime_dir, XDG_CONFIG_HOME=config_home,
+                     XDG_CACHE_HOME=workdir, XDG_DATA_HOME=workdir),
+            stdout=subprocess.DEVNULL
+        )
+        if wait_for_activity(activity_log, 0) is None:
+            raise RuntimeError("the daemon never sent a presence")
+        # Start from a full rate limit bucket
+        time.sleep(args.rate_interval)
+
+        samples = [proc_sample(app.pid)]
+        begin = time.monotonic()
+        replay.send_signal(signal.SIGUSR1)
+        while replay.poll() is None:
+            time.sleep(1.0)
+            if replay.poll() is None:
+                samples.append(proc_sample(app.pid))
+        elapsed = time.monotonic() - begin
+        summary = json.loads(replay.stdout.read().strip().splitlines()[-1])
+    finally:
+        harness.stop(app, discord, replay, daemon)
+
+    events = read_events(event_log)
+    frames = [logged for logged, _ in read_activities(activity_log) if logged >= begin]
+    latencies = []
+    index = 0
+    for logged in frames:
+        # Latest event before the frame, each event counted once
+        while index < len(events) and events[index] <= logged:
+            index += 1
+        if index and (not latencies or events[index - 1] > latencies[-1][0]):
+            latencies.append((events[index - 1], (logged - events[index - 1]) * 1000))
+    latencies = [latency for _, latency in latencies]
+
+    switches = samples[-1][1] - samples[0][1]
+    cpu = samples[-1][2] - samples[0][2]
+    results = {
+        "seconds": round(elapsed, 1),
+        "events": summary["events"],
+        "updates": len(frames),
+        "updates_per_event": round(len(frames) / max(1, summary["events"]), 3),
+        "latency_ms": {
+            "p50": round(harness.percentile(latencies, 0.5), 1),
+            "p99": round(harness.percentile(latencies, 0.99), 1),
+            "max": round(max(latencies, default=0), 1),
+        },
+        "dbus_calls": summary["calls"],
+        "cpu_seconds": round(cpu, 3),
+        "context_switches": switches,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"replay: {results['seconds']:.0f} s, {results['events']} events at {args.speed:g}x")
+    print(f"updates: {results['updates']} SET_ACTIVITY frames, {results['updates_per_event']} per event")
+    print(f"latency: p50 {results['latency_ms']['p50']:.1f} ms, p99 {results['latency_ms']['p99']:.1f} ms, "
+          f"max {results['latency_ms']['max']:.1f} ms")
+    print(f"D-Bus: {results['dbus_calls']} player method calls")
+    print(f"CPU: {cpu:.2f} s ({cpu / elapsed * 100:.2f}%), {switches / elapsed:.2f} context switches/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Startup time and resident memory of the window vs. the headless daemon.
+
+Each sample runs in a fresh interpreter against bench/fake_discord.py and a
+config that was connected when the app last closed, and reports (ms since
+the interpreter started):
+
+    imports   app modules imported
+    paint     first paint of the window (window only)
+    presence  Discord acknowledged the first SET_ACTIVITY
+    mpris     MPRIS players listed
+
+plus VmRSS once everything is done. Use QT_QPA_PLATFORM=offscreen to measure
+the window without a display.
+
+    python3 bench/bench_startup.py [--runs N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+import harness
+from fake_discord import FakeDiscordServer
+
+TIMEOUT = 10.0
+CONFIG = {
+    'app_id': '123456789012345678',
+    'details': 'Benchmarking',
+    'state': 'Cold start',
+    'timestamp': 'Current Time',
+    'large_image': 'avatar',
+    'large_text': '',
+    'small_image': '',
+    'small_text': '',
+    'button1_text': '',
+    'button1_url': '',
+    'button2_text': '',
+    'button2_url': '',
+    'connected': True
+}
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+marks = {}
+
+def mark(name):
+    marks.setdefault(name, (time.perf_counter() - start) * 1000)
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+mode, timeout = sys.argv[1], float(sys.argv[2])
+if mode == "gui":
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+    app = QApplication(sys.argv[:1])
+    import script
+    mark("imports")
+
+    class PaintProbe(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint:
+                mark("paint")
+            return False
+
+    def done():
+        if "presence" in marks and "mpris" in marks:
+            app.exit(0)
+
+    tray_app = script.TrayApp()
+    probe = PaintProbe()
+    tray_app.window.installEventFilter(probe)
+    on_result = tray_app.service.on_result
+    def result(cleared, error):
+        mark("presence")
+        on_result(cleared, error)
+        done()
+    tray_app.service.on_result = result
+    start_mpris = tray_app.start_mpris
+    def populated():
+        start_mpris()
+        mark("mpris")
+        done()
+    tray_app.start_mpris = populated
+    QTimer.singleShot(int(timeout * 1000), lambda: app.exit(0))
+    app.exec()
+    tray_app.service.close()
+else:
+    from config_store import ConfigStore
+    from eventloop import new_loop
+    from service import PresenceService
+    mark("imports")
+    loop, _ = new_loop()
+    store = ConfigStore()
+    store.load()
+    service = PresenceService(loop, store)
+    def result(cleared, error):
+        mark("presence")
+        loop.stop()
+    service.on_result = result
+    service.connect()
+    try:
+        service.start_mpris()
+        mark("mpris")
+    except Exception:
+        pass
+    loop.call_later(timeout, loop.stop)
+    loop.run_forever()
+    service.close()
+print(json.dumps({"marks": marks, "rss_kb": rss_kb(),
+                  "qt_loaded": any(name.startswith("PyQt6") for name in sys.modules)}))
+'''
+
+
+async def sample(mode):
+    with tempfile.TemporaryDirectory() as runtime_dir, tempfile.TemporaryDirectory() as config_home:
+        os.makedirs(os.path.join(config_home, "DiscordCRP"))
+        with open(os.path.join(config_home, "DiscordCRP", "config.json"), 'w') as f:
+            json.dump(CONFIG, f)
+        server = FakeDiscordServer(os.path.join(runtime_dir, "discord-ipc-0"))
+        await server.start()
+        # Art cache and history stay in the temporary directory too
+        env = dict(os.environ, XDG_RUNTIME_DIR=runtime_dir, XDG_CONFIG_HOME=config_home,
+                   XDG_CACHE_HOME=config_home, XDG_DATA_HOME=config_home)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', PROBE, mode, str(TIMEOUT),
+                cwd=harness.REPO_DIR, env=env, stdout=asyncio.subprocess.PIPE
+            )
+            output, _ = await proc.communicate()
+        finally:
+            await server.stop()
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def median_mark(results, name):
+    values = [r['marks'][name] for r in results if name in r['marks']]
+    return f"{statistics.median(values):7.1f} ms" if values else "      n/a"
+
+
+async def run(args):
+    for mode in ("gui", "headless"):
+        results = [await sample(mode) for _ in range(args.runs)]
+        print(f"{mode:>8}: imports {median_mark(results, 'imports')}, "
+              f"paint {median_mark(results, 'paint')}, "
+              f"presence {median_mark(results, 'presence')}, "
+              f"mpris {median_mark(results, 'mpris')}, "
+              f"RSS {statistics.median(r['rss_kb'] for r in results) / 1024:6.1f} MB, "
+              f"Qt loaded: {results[0]['qt_loaded']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
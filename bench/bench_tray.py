@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Resident memory of the app in the tray, window kept vs. torn down.
+
+Each sample runs in a fresh interpreter (Discord and D-Bus absent, which
+the app tolerates) and reports VmRSS:
+
+    shown       window shown and painted
+    hidden      window hidden but kept alive (minimize to tray before the
+                window was torn down)
+    torn down   window destroyed by TrayApp.hide_to_tray()
+    reshown     "Show" from the tray rebuilt the window
+    tray start  started with --tray, the window never built
+
+Use QT_QPA_PLATFORM=offscreen to measure without a display; a real
+platform plugin keeps more per window (backing store, GL, fonts), so the
+saving there is larger.
+
+    python3 bench/bench_tray.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import harness
+
+PROBE = r'''
+import json, sys
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QEventLoop, QTimer
+import script
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+def settle(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec()
+
+mode = sys.argv[1]
+app = QApplication(sys.argv[:1])
+app.setQuitOnLastWindowClosed(False)
+samples = {}
+if mode == "tray":
+    tray_app = script.TrayApp(show_window=False)
+    settle(1500)
+    samples["tray start"] = rss_kb()
+else:
+    tray_app = script.TrayApp()
+    settle(500)
+    samples["shown"] = rss_kb()
+    if mode == "hide":
+        tray_app.window.hide()
+        settle(1500)
+        samples["hidden"] = rss_kb()
+    else:
+        tray_app.hide_to_tray()
+        settle(1500)
+        samples["torn down"] = rss_kb()
+        tray_app.show_window()
+        settle(500)
+        samples["reshown"] = rss_kb()
+tray_app.close_application()
+print(json.dumps(samples))
+'''
+
+
+def sample(mode):
+    with tempfile.TemporaryDirectory() as runtime_dir, tempfile.TemporaryDirectory() as config_home:
+        env = dict(os.environ, XDG_RUNTIME_DIR=runtime_dir, XDG_CONFIG_HOME=config_home,
+                   XDG_CACHE_HOME=config_home, XDG_DATA_HOME=config_home,
+                   DBUS_SESSION_BUS_ADDRESS="unix:path=/nonexistent")
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, mode],
+            cwd=harness.REPO_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("hide", "teardown", "tray"):
+        for _ in range(args.runs):
+            for name, kb in sample(mode).items():
+                results.setdefault(name, []).append(kb)
+    for name in ("shown", "hidden", "torn down", "reshown", "tray start"):
+        if name in results:
+            print(f"{name:>10}: RSS {statistics.median(results[name]) / 1024:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
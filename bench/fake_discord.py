@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Fake Discord client IPC server for the benchmarks.
+
+Listens on a discord-ipc-N Unix socket, accepts the handshake, answers
+SET_ACTIVITY and records every activity it receives with a timestamp.
+
+    python3 bench/fake_discord.py /tmp/run/discord-ipc-0 [--log frames.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import harness  # noqa: F401  (puts the repo on sys.path)
+from discord_ipc import HEADER, OP_CLOSE, OP_FRAME, OP_HANDSHAKE, OP_PING, OP_PONG, encode_frame
+
+
+class FakeDiscordServer:
+    def __init__(self, path, reply_delay=0.0, reject=False, log=None):
+        self.path = path
+        self.reply_delay = reply_delay
+        self.reject = reject
+        self.log = log
+        self.server = None
+        self.activities = []  # (monotonic time, activity or None)
+        self.connections = 0
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                op, length = HEADER.unpack(header)
+                payload = json.loads(await reader.readexactly(length))
+                if op == OP_HANDSHAKE:
+                    if self.reject:
+                        writer.write(encode_frame(OP_CLOSE, {"code": 4000, "message": "Invalid Client ID"}))
+                        await writer.drain()
+                        break
+                    writer.write(encode_frame(OP_FRAME, {
+                        "cmd": "DISPATCH",
+                        "evt": "READY",
+                        "nonce": None,
+                        "data": {"v": 1, "user": {"id": "0", "username": "fake"}},
+                    }))
+                elif op == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+                elif op == OP_FRAME and payload.get("cmd") == "SET_ACTIVITY":
+                    activity = payload.get("args", {}).get("activity")
+                    self.record(activity)
+                    if self.reply_delay:
+                        await asyncio.sleep(self.reply_delay)
+                    writer.write(encode_frame(OP_FRAME, {
+                        "cmd": "SET_ACTIVITY",
+                        "evt": None,
+                        "nonce": payload.get("nonce"),
+                        "data": activity,
+                    }))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def record(self, activity):
+        now = time.monotonic()
+        self.activities.append((now, activity))
+        if self.log is not None:
+            self.log.write(json.dumps({"time": now, "activity": activity}) + "\n")
+            self.log.flush()
+
+
+async def serve(args):
+    log = open(args.log, 'a') if args.log else None
+    server = FakeDiscordServer(args.path, args.reply_delay, args.reject, log)
+    await server.start()
+    print(f"Listening on {args.path}", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Discord IPC server")
+    parser.add_argument('path')
+    parser.add_argument('--log', help="append received activities as JSON lines")
+    parser.add_argument('--reply-delay', type=float, default=0.0)
+    parser.add_argument('--reject', action='store_true', help="refuse every handshake")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
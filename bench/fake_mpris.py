@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Scriptable fake MPRIS player for the benchmarks.
+
+Owns org.mpris.MediaPlayer2.<name> on the session bus, serves the Player
+properties, and exposes a small control interface to change tracks and
+read how many method calls the player has handled.
+"""
+import sys
+
+import dbus
+import dbus.lowlevel
+import dbus.service
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+
+MPRIS_PATH = '/org/mpris/MediaPlayer2'
+ROOT_INTERFACE = 'org.mpris.MediaPlayer2'
+PLAYER_INTERFACE = 'org.mpris.MediaPlayer2.Player'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+CONTROL_INTERFACE = 'org.discordcrp.FakePlayer'
+
+
+class FakePlayer(dbus.service.Object):
+    def __init__(self, bus, name):
+        self.bus_name = dbus.service.BusName(f"org.mpris.MediaPlayer2.{name}", bus)
+        super().__init__(self.bus_name, MPRIS_PATH)
+        self.calls = 0
+        self.player = {
+            'PlaybackStatus': dbus.String('Playing'),
+            'Rate': dbus.Double(1.0),
+            'Position': dbus.Int64(0),
+            'CanSeek': dbus.Boolean(True),
+            'Metadata': self.make_metadata('Title 0', 'Artist', 'Album', 0),
+        }
+        bus.add_message_filter(self.count_calls)
+
+    def make_metadata(self, title, artist, album, length):
+        return dbus.Dictionary({
+            'mpris:trackid': dbus.ObjectPath(f'/org/discordcrp/track/{abs(hash(title))}'),
+            'mpris:length': dbus.Int64(length),
+            'xesam:title': dbus.String(title),
+            'xesam:artist': dbus.Array([dbus.String(artist)], signature='s'),
+            'xesam:album': dbus.String(album),
+        }, signature='sv')
+
+    def count_calls(self, bus, message):
+        if (isinstance(message, dbus.lowlevel.MethodCallMessage)
+                and message.get_path() == MPRIS_PATH
+                and message.get_interface() != CONTROL_INTERFACE):
+            self.calls += 1
+        return dbus.lowlevel.HANDLER_RESULT_NOT_YET_HANDLED
+
+    # org.freedesktop.DBus.Properties
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='ss', out_signature='v')
+    def Get(self, interface, prop):
+        if interface == PLAYER_INTERFACE:
+            return self.player[prop]
+        if interface == ROOT_INTERFACE and prop == 'Identity':
+            return dbus.String('Fake Player')
+        raise dbus.exceptions.DBusException(
+            f'No property {prop}', name='org.freedesktop.DBus.Error.InvalidArgs'
+        )
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='s', out_signature='a{sv}')
+    def GetAll(self, interface):
+        if interface == PLAYER_INTERFACE:
+            return dbus.Dictionary(self.player, signature='sv')
+        return dbus.Dictionary({}, signature='sv')
+
+    @dbus.service.signal(PROPERTIES_INTERFACE, signature='sa{sv}as')
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
+    @dbus.service.signal(PLAYER_INTERFACE, signature='x')
+    def Seeked(self, position):
+        pass
+
+    # Control interface used by the benchmarks
+
+    @dbus.service.method(CONTROL_INTERFACE, in_signature='sssx')
+    def SetTrack(self, title, artist, album, length):
+        self.player['Metadata'] = self.make_metadata(title, artist, album, length)
+        self.player['Position'] = dbus.Int64(0)
+        self.PropertiesChanged(PLAYER_INTERFACE, {'Metadata': self.player['Metadata']}, [])
+
+    @dbus.service.method(CONTROL_INTERFACE, in_signature='s')
+    def SetStatus(self, status):
+        self.player['PlaybackStatus'] = dbus.String(status)
+        self.PropertiesChanged(PLAYER_INTERFACE, {'PlaybackStatus': self.player['PlaybackStatus']}, [])
+
+    @dbus.service.method(CONTROL_INTERFACE, in_signature='x')
+    def SetPosition(self, position):
+        self.player['Position'] = dbus.Int64(position)
+        self.Seeked(position)
+
+    @dbus.service.method(CONTROL_INTERFACE, out_signature='t')
+    def Calls(self):
+        return self.calls
+
+    @dbus.service.method(CONTROL_INTERFACE)
+    def ResetCalls(self):
+        self.calls = 0
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'fake'
+    DBusGMainLoop(set_as_default=True)
+    bus = dbus.SessionBus()
+    FakePlayer(bus, name)  # Kept alive by its export on the bus
+    loop = GLib.MainLoop()
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
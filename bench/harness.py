@@ -0,0 +1,80 @@
+"""Shared helpers for the benchmarks: a private session bus and fake services."""
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def start_session_bus():
+    """Start a private dbus-daemon and return (process, address)."""
+    proc = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+        stdout=subprocess.PIPE, text=True
+    )
+    address = proc.stdout.readline().strip()
+    if not address:
+        proc.kill()
+        raise RuntimeError("dbus-daemon did not report an address")
+    return proc, address
+
+
+def start_fake_player(address, name, *extra_args):
+    """Run bench/fake_mpris.py on the given bus and wait until it owns its name."""
+    import dbus
+    env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_mpris.py'), name, *extra_args],
+        env=env
+    )
+    bus = dbus.bus.BusConnection(address)
+    service = f"org.mpris.MediaPlayer2.{name}"
+    deadline = time.monotonic() + 10
+    while not bus.name_has_owner(service):
+        if time.monotonic() > deadline or proc.poll() is not None:
+            proc.kill()
+            raise RuntimeError(f"{service} did not appear on the bus")
+        time.sleep(0.05)
+    bus.close()
+    return proc, service
+
+
+def start_fake_discord(path, *extra_args):
+    """Run bench/fake_discord.py on the given socket path and wait until it listens."""
+    if os.path.exists(path):
+        # Left behind by a server that was killed
+        os.unlink(path)
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_discord.py'), path, *extra_args],
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        if time.monotonic() > deadline or proc.poll() is not None:
+            proc.kill()
+            raise RuntimeError(f"fake Discord did not start on {path}")
+        time.sleep(0.05)
+    return proc
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def stop(*procs):
+    for proc in procs:
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
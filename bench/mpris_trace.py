@@ -0,0 +1,117 @@
+"""MPRIS trace files shared by bench/record_mpris.py and bench/replay_mpris.py.
+
+A trace is JSON lines, gzip compressed when the name ends in .gz. The
+first line is a header, every other line one event, with the time in
+seconds since the recording started:
+
+    {"trace": 1, "recorded": 1760000000.0}
+    [0.0, "add", "org.mpris.MediaPlayer2.spotify", {...Player properties}]
+    [12.503, "changed", "org.mpris.MediaPlayer2.spotify", {...changed}, [...invalidated]]
+    [40.12, "seeked", "org.mpris.MediaPlayer2.spotify", 81000000]
+    [97.9, "remove", "org.mpris.MediaPlayer2.spotify"]
+
+Players present when recording starts are "add" events at 0. Property
+values keep their D-Bus types: JSON covers strings, doubles, booleans and
+Int64, the rest are tagged, e.g. {"$o": "/track/1"} for an object path.
+"""
+import gzip
+import json
+
+TRACE_VERSION = 1
+EVENTS = ('add', 'remove', 'changed', 'seeked')
+
+# Tags for D-Bus types JSON has no type for, by dbus-python class name
+TAGS = {
+    'ObjectPath': 'o',
+    'Signature': 'g',
+    'Byte': 'y',
+    'Int16': 'n',
+    'UInt16': 'q',
+    'Int32': 'i',
+    'UInt32': 'u',
+    'UInt64': 't',
+}
+
+
+def open_trace(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class TraceWriter:
+    """Appends events to a trace file, flushed per event so a killed recorder keeps them."""
+
+    def __init__(self, path, clock, recorded):
+        self.file = open_trace(path, 'w')
+        self.clock = clock
+        self.started = clock()
+        self.count = 0
+        self.file.write(json.dumps({"trace": TRACE_VERSION, "recorded": recorded}) + "\n")
+
+    def write(self, event, name, *args):
+        elapsed = round(self.clock() - self.started, 3)
+        self.file.write(json.dumps([elapsed, event, name, *args], separators=(',', ':')) + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """Return (header, events) of a trace file; events are lists as written."""
+    with open_trace(path, 'r') as f:
+        header = json.loads(f.readline())
+        if header.get("trace") != TRACE_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_VERSION} MPRIS trace")
+        events = []
+        for line in f:
+            if not line.endswith("\n"):
+                break  # The recorder was killed mid-line
+            event = json.loads(line)
+            if event[1] in EVENTS:
+                events.append(event)
+    return header, events
+
+
+def encode(value):
+    """D-Bus value (as dbus-python returns it) to JSON."""
+    tag = TAGS.get(type(value).__name__)
+    if tag is not None:
+        return {"$" + tag: int(value) if tag not in 'og' else str(value)}
+    if isinstance(value, dict):
+        return {str(key): encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, bool) or type(value).__name__ == 'Boolean':
+        return bool(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    return str(value)
+
+
+def decode(value):
+    """JSON from encode() back to dbus-python types, for sending over the bus."""
+    import dbus
+    if isinstance(value, dict):
+        if len(value) == 1:
+            key, item = next(iter(value.items()))
+            if key.startswith("$") and key[1:] in TAGS.values():
+                cls = next(name for name, tag in TAGS.items() if tag == key[1:])
+                return getattr(dbus, cls)(item)
+        return dbus.Dictionary({key: decode(item) for key, item in value.items()}, signature='sv')
+    if isinstance(value, list):
+        items = [decode(item) for item in value]
+        # Artists and genres are string lists; anything else goes in variants
+        signature = 's' if all(isinstance(item, str) for item in value) else 'v'
+        return dbus.Array(items, signature=signature)
+    if isinstance(value, bool):
+        return dbus.Boolean(value)
+    if isinstance(value, int):
+        return dbus.Int64(value)
+    if isinstance(value, float):
+        return dbus.Double(value)
+    return dbus.String(value)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Record the MPRIS traffic on the session bus into a trace file.
+
+Captures what the app sees of every player: the Player properties when
+it appears, PropertiesChanged, Seeked, and when its name goes away.
+Run it next to the app while using players normally, stop it with
+Ctrl+C, then replay the session with bench/replay_mpris.py or
+bench/bench_replay.py.
+
+    python3 bench/record_mpris.py session.trace.gz
+"""
+import argparse
+import signal
+import time
+
+import harness  # noqa: F401  (puts the repo on sys.path)
+import dbus
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+from mpris import MPRIS_PATH, MPRIS_PREFIX, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+from mpris_trace import TraceWriter, encode
+
+
+class Recorder:
+    def __init__(self, bus, writer):
+        self.bus = bus
+        self.writer = writer
+        self.owners = {}  # unique bus name -> service name
+
+    def start(self):
+        # Subscribe before listing so a player appearing in between is not missed
+        self.bus.add_signal_receiver(
+            self.on_name_owner_changed,
+            signal_name='NameOwnerChanged',
+            dbus_interface='org.freedesktop.DBus',
+            bus_name='org.freedesktop.DBus',
+            path='/org/freedesktop/DBus'
+        )
+        self.bus.add_signal_receiver(
+            self.on_properties_changed,
+            signal_name='PropertiesChanged',
+            dbus_interface=PROPERTIES_INTERFACE,
+            path=MPRIS_PATH,
+            sender_keyword='sender'
+        )
+        self.bus.add_signal_receiver(
+            self.on_seeked,
+            signal_name='Seeked',
+            dbus_interface=PLAYER_INTERFACE,
+            path=MPRIS_PATH,
+            sender_keyword='sender'
+        )
+        for name in sorted(self.bus.list_names()):
+            if name.startswith(MPRIS_PREFIX):
+                try:
+                    self.add(str(name), str(self.bus.get_name_owner(name)))
+                except dbus.exceptions.DBusException:
+                    pass  # Gone already
+
+    def add(self, name, owner):
+        self.owners[owner] = name
+        try:
+            player = self.bus.get_object(name, MPRIS_PATH, introspect=False)
+            properties = player.GetAll(PLAYER_INTERFACE, dbus_interface=PROPERTIES_INTERFACE)
+        except dbus.exceptions.DBusException:
+            # Not exported yet; PropertiesChanged fills it in
+            properties = {}
+        self.writer.write('add', name, encode(properties))
+
+    def on_name_owner_changed(self, name, old_owner, new_owner):
+        if not name.startswith(MPRIS_PREFIX):
+            return
+        if old_owner:
+            self.owners.pop(str(old_owner), None)
+            self.writer.write('remove', str(name))
+        if new_owner:
+            self.add(str(name), str(new_owner))
+
+    def on_properties_changed(self, interface, changed, invalidated, sender=None):
+        name = self.owners.get(str(sender))
+        if name is not None and interface == PLAYER_INTERFACE:
+            self.writer.write('changed', name, encode(changed), [str(prop) for prop in invalidated])
+
+    def on_seeked(self, position, sender=None):
+        name = self.owners.get(str(sender))
+        if name is not None:
+            self.writer.write('seeked', name, int(position))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', help="trace file to write, gzip compressed if it ends in .gz")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    DBusGMainLoop(set_as_default=True)
+    writer = TraceWriter(args.trace, time.monotonic, time.time())
+    recorder = Recorder(dbus.SessionBus(), writer)
+    recorder.start()
+
+    loop = GLib.MainLoop()
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, lambda: loop.quit() or False)
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, lambda: loop.quit() or False)
+    if args.duration:
+        GLib.timeout_add(int(args.duration * 1000), lambda: loop.quit() or False)
+    print(f"Recording MPRIS traffic to {args.trace}, Ctrl+C to stop")
+    try:
+        loop.run()
+    finally:
+        writer.close()
+    print(f"{writer.count} events in {time.monotonic() - writer.started:.0f} s")
+
+
+if __name__ == '__main__':
+    main()
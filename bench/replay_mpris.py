@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Replay an MPRIS trace from bench/record_mpris.py on a session bus.
+
+Every player in the trace gets its own bus connection, so names come and
+go (and signals carry distinct senders) as they did when recording. The
+players answer Get/GetAll from the replayed state, with Position advancing
+while playing, and count the method calls made on them.
+
+Players present at the start of the trace appear right away; the rest of
+the trace plays at --speed times the recorded pace, after SIGUSR1 with
+--paused. Prints "ready" once the first players are on the bus and a JSON
+summary at the end. --log writes the monotonic time of each replayed
+event, to match against what the app sent.
+
+    python3 bench/replay_mpris.py session.trace.gz [--speed 10] [--paused] [--log events.jsonl]
+"""
+import argparse
+import json
+import os
+import signal
+import time
+
+import harness  # noqa: F401  (puts the repo on sys.path)
+import dbus
+import dbus.lowlevel
+import dbus.service
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+from mpris import MPRIS_PATH, PLAYER_INTERFACE, PROPERTIES_INTERFACE
+from mpris_trace import decode, read_trace
+
+ROOT_INTERFACE = 'org.mpris.MediaPlayer2'
+
+
+class ReplayPlayer(dbus.service.Object):
+    def __init__(self, address, name, properties):
+        self.connection = dbus.bus.BusConnection(address)
+        super().__init__(self.connection, MPRIS_PATH)
+        self.name = name
+        self.calls = 0
+        self.player = dict(properties)
+        self.anchor = time.monotonic()
+        self.connection.add_message_filter(self.count_calls)
+        # Exported first, so the name appears with the object already there
+        self.bus_name = dbus.service.BusName(name, self.connection)
+
+    def count_calls(self, connection, message):
+        if isinstance(message, dbus.lowlevel.MethodCallMessage) and message.get_path() == MPRIS_PATH:
+            self.calls += 1
+        return dbus.lowlevel.HANDLER_RESULT_NOT_YET_HANDLED
+
+    def position(self):
+        """Recorded position advanced at Rate while playing, like a real player."""
+        position = int(self.player.get('Position', 0))
+        if self.player.get('PlaybackStatus') == 'Playing':
+            rate = float(self.player.get('Rate', 1.0))
+            position += int((time.monotonic() - self.anchor) * rate * 1e6)
+        return dbus.Int64(position)
+
+    def rebase(self):
+        self.player['Position'] = self.position()
+        self.anchor = time.monotonic()
+
+    def change(self, changed, invalidated):
+        self.rebase()
+        self.player.update(changed)
+        for prop in invalidated:
+            self.player.pop(prop, None)
+        if 'Metadata' in changed and 'Position' not in changed:
+            # New track, the recording has a Seeked if it didn't start at 0
+            self.player['Position'] = dbus.Int64(0)
+        self.PropertiesChanged(PLAYER_INTERFACE, dbus.Dictionary(changed, signature='sv'),
+                               dbus.Array(invalidated, signature='s'))
+
+    def seek(self, position):
+        self.player['Position'] = dbus.Int64(position)
+        self.anchor = time.monotonic()
+        self.Seeked(dbus.Int64(position))
+
+    def close(self):
+        self.remove_from_connection()
+        self.connection.close()
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='ss', out_signature='v')
+    def Get(self, interface, prop):
+        if interface == PLAYER_INTERFACE and prop == 'Position':
+            return self.position()
+        if interface == PLAYER_INTERFACE and prop in self.player:
+            return self.player[prop]
+        if interface == ROOT_INTERFACE and prop == 'Identity':
+            return dbus.String(self.name.rsplit('.', 1)[-1])
+        raise dbus.exceptions.DBusException(
+            f'No property {prop}', name='org.freedesktop.DBus.Error.InvalidArgs'
+        )
+
+    @dbus.service.method(PROPERTIES_INTERFACE, in_signature='s', out_signature='a{sv}')
+    def GetAll(self, interface):
+        if interface == PLAYER_INTERFACE:
+            return dbus.Dictionary(dict(self.player, Position=self.position()), signature='sv')
+        return dbus.Dictionary({}, signature='sv')
+
+    @dbus.service.signal(PROPERTIES_INTERFACE, signature='sa{sv}as')
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
+    @dbus.service.signal(PLAYER_INTERFACE, signature='x')
+    def Seeked(self, position):
+        pass
+
+
+class Replay:
+    def __init__(self, address, events, speed, log=None):
+        self.address = address
+        self.events = events
+        self.speed = speed
+        self.log = log
+        self.players = {}  # service name -> ReplayPlayer
+        self.index = 0
+        self.started = None
+        self.calls = 0  # From players that already went away
+        self.on_done = None
+
+    def apply(self, event):
+        _, kind, name, *args = event
+        player = self.players.get(name)
+        if kind == 'add':
+            if player is not None:
+                self.remove(name)
+            self.players[name] = ReplayPlayer(self.address, name, decode(args[0]))
+        elif player is None:
+            return  # Recorded before its "add", e.g. while the recorder started
+        elif kind == 'remove':
+            self.remove(name)
+        elif kind == 'changed':
+            player.change(decode(args[0]), [str(prop) for prop in args[1]])
+        elif kind == 'seeked':
+            player.seek(args[0])
+        if self.log is not None:
+            self.log.write(json.dumps({"time": time.monotonic(), "index": self.index, "event": kind,
+                                       "name": name}) + "\n")
+            self.log.flush()
+
+    def remove(self, name):
+        player = self.players.pop(name)
+        self.calls += player.calls
+        player.close()
+
+    def start_players(self):
+        """Bring up the players present when recording started."""
+        while self.index < len(self.events) and self.events[self.index][0] == 0:
+            self.apply(self.events[self.index])
+            self.index += 1
+
+    def play(self):
+        self.started = time.monotonic()
+        self.schedule()
+
+    def schedule(self):
+        if self.index >= len(self.events):
+            if self.on_done:
+                self.on_done()
+            return
+        due = self.started + self.events[self.index][0] / self.speed
+        GLib.timeout_add(max(0, int((due - time.monotonic()) * 1000)), self.tick)
+
+    def tick(self):
+        now = time.monotonic()
+        # Bursts recorded within the same millisecond go out together
+        while self.index < len(self.events) and self.started + self.events[self.index][0] / self.speed <= now:
+            self.apply(self.events[self.index])
+            self.index += 1
+        self.schedule()
+        return False
+
+    def summary(self):
+        calls = self.calls + sum(player.calls for player in self.players.values())
+        return {"events": self.index, "calls": calls,
+                "seconds": time.monotonic() - self.started if self.started else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace')
+    parser.add_argument('--speed', type=float, default=1.0, help="replay pace, 10 is ten times faster")
+    parser.add_argument('--paused', action='store_true', help="wait for SIGUSR1 after the first players")
+    parser.add_argument('--linger', type=float, default=0.0, help="seconds to keep the players after the end")
+    parser.add_argument('--log', help="write the time of every replayed event here")
+    args = parser.parse_args()
+
+    _, events = read_trace(args.trace)
+    DBusGMainLoop(set_as_default=True)
+    log = open(args.log, 'a') if args.log else None
+    replay = Replay(os.environ['DBUS_SESSION_BUS_ADDRESS'], events, args.speed, log)
+    loop = GLib.MainLoop()
+
+    def finish():
+        GLib.timeout_add(int(args.linger * 1000), lambda: loop.quit() or False)
+    replay.on_done = finish
+
+    replay.start_players()
+    print("ready", flush=True)
+    if args.paused:
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, lambda: replay.play() or False)
+    else:
+        replay.play()
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, lambda: loop.quit() or False)
+    loop.run()
+    print(json.dumps(replay.summary()), flush=True)
+    for name in list(replay.players):
+        replay.remove(name)
+    if log is not None:
+        log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import tempfile
+
+from metrics import registry
+
+LEGACY_CONFIG_FILE = "config.json"
+
+CONFIG_FIELDS = {
+    'app_id': str,
+    'details': str,
+    'state': str,
+    'timestamp': str,
+    'large_image': str,
+    'large_text': str,
+    'small_image': str,
+    'small_text': str,
+    'button1_text': str,
+    'button1_url': str,
+    'button2_text': str,
+    'button2_url': str
+}
+
+# Added by later versions, so older config files may not have them
+OPTIONAL_FIELDS = {
+    'custom_timestamp': int,
+    'connected': bool,
+    'player_auto': bool,
+    'player_priority': str,
+    'player_ignore': str,
+    'album_art': bool,
+    'art_base_url': str,
+    'history': bool,
+    'process_rules': list
+}
+
+TIMESTAMP_TYPES = ['None', 'Current Time', 'Custom Timestamp', 'Track Progress']
+
+
+def config_path():
+    """Per-user config location ($XDG_CONFIG_HOME on Linux, %APPDATA% on Windows)."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, "DiscordCRP", "config.json")
+
+
+def atomic_write(path, content):
+    """Replace path with content (str or bytes) so a crash never leaves a half-written file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temp file and rename over the old one
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if sys.platform != "win32":
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def stat_key(stat):
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def validate_config(config):
+    """Validate configuration data."""
+    if not isinstance(config, dict):
+        return False
+
+    # Check if all required fields exist and have correct types
+    for field, field_type in CONFIG_FIELDS.items():
+        if field not in config:
+            return False
+        if not isinstance(config[field], field_type):
+            return False
+    for field, field_type in OPTIONAL_FIELDS.items():
+        if field in config and not isinstance(config[field], field_type):
+            return False
+
+    # Validate timestamp type
+    if config['timestamp'] not in TIMESTAMP_TYPES:
+        return False
+
+    return True
+
+
+class ConfigStore:
+    """In-memory configuration with per-field dirty tracking and atomic writes."""
+
+    def __init__(self, path=None):
+        self.path = path or config_path()
+        self.values = {}
+        self.dirty = set()
+        self.last_written = None  # Serialized content currently on disk
+        self.disk_stat = None  # (inode, size, mtime) of the file when last read or written
+
+    def load(self):
+        """Read the config file, falling back to ./config.json from older versions."""
+        path = self.path
+        if not os.path.exists(path) and os.path.exists(LEGACY_CONFIG_FILE):
+            path = LEGACY_CONFIG_FILE
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r') as f:
+            stat = os.fstat(f.fileno())
+            content = f.read()
+        config = json.loads(content)
+
+        if validate_config(config):
+            self.values = dict(config)
+            self.dirty.clear()
+            if path == self.path:
+                self.last_written = content
+                self.disk_stat = stat_key(stat)
+        return config
+
+    def changed_on_disk(self):
+        """True if the file was replaced or modified since it was last read or written here."""
+        try:
+            return stat_key(os.stat(self.path)) != self.disk_stat
+        except FileNotFoundError:
+            return False
+
+    def reload(self):
+        """Merge changes made to the file by someone else. Returns (changed fields, conflicts).
+
+        Fields that differ from memory are taken from the file, and optional
+        fields deleted from it are dropped, except ones with unsaved edits
+        here: those are kept and listed as conflicts. Our
+        own writes are recognized by the file's stat and content and change
+        nothing. Raises ValueError for a file that isn't a valid config.
+        """
+        if not self.changed_on_disk():
+            return {}, []
+        with open(self.path, 'r') as f:
+            stat = os.fstat(f.fileno())
+            content = f.read()
+        # Read once per change, even if it turns out invalid
+        self.disk_stat = stat_key(stat)
+        if content == self.last_written:
+            return {}, []
+        config = json.loads(content)
+        if not validate_config(config):
+            raise ValueError("Invalid configuration data")
+        previous = self._parse(self.last_written)
+        self.last_written = content
+        registry.inc('config_reloads')
+        changed = {}
+        conflicts = []
+        for field, value in config.items():
+            if self.values.get(field) == value:
+                continue
+            if field in self.dirty:
+                conflicts.append(field)
+                continue
+            self.values[field] = value
+            changed[field] = value
+        # Optional fields deleted from the file go too (as None in changed),
+        # or the next save would write them back; defaults filled in here
+        # and never on disk are left alone
+        for field in OPTIONAL_FIELDS:
+            if field in config or field not in previous or field not in self.values:
+                continue
+            if field in self.dirty:
+                conflicts.append(field)
+                continue
+            del self.values[field]
+            changed[field] = None
+        return changed, conflicts
+
+    def _parse(self, content):
+        try:
+            config = json.loads(content) if content else {}
+        except ValueError:
+            return {}
+        return config if isinstance(config, dict) else {}
+
+    def seed(self, config):
+        """Fill in values without marking them dirty."""
+        for field, value in config.items():
+            self.values.setdefault(field, value)
+
+    def set(self, field, value):
+        """Set one field. Returns True if the value changed."""
+        if self.values.get(field) == value:
+            return False
+        self.values[field] = value
+        self.dirty.add(field)
+        return True
+
+    def update(self, config):
+        """Set several fields. Returns True if any value changed."""
+        changed = False
+        for field, value in config.items():
+            changed = self.set(field, value) or changed
+        return changed
+
+    def flush(self):
+        """Write pending changes. Returns True if the file was actually written."""
+        if not self.dirty:
+            return False
+        if not validate_config(self.values):
+            raise ValueError("Invalid configuration data")
+
+        content = json.dumps(self.values, indent=4)
+        if content == self.last_written:
+            self.dirty.clear()
+            registry.inc('config_writes_skipped')
+            return False
+
+        with registry.timer('config_write_seconds'):
+            atomic_write(self.path, content)
+        registry.inc('config_writes')
+        self.dirty.clear()
+        self.last_written = content
+        try:
+            self.disk_stat = stat_key(os.stat(self.path))
+        except OSError:
+            self.disk_stat = None
+        return True
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""Local control socket for scripted presence updates.
+
+The app listens on $XDG_RUNTIME_DIR/DiscordCRP/control.sock for
+newline-delimited JSON commands. Each command gets one JSON reply line,
+{"ok": true, ...} or {"ok": false, "error": "..."}; an "id" is echoed back.
+
+    {"cmd": "set", "fields": {"details": "Building", "state": "3/10"}}
+    {"cmd": "reset"}                    drop every field set over the socket
+    {"cmd": "clear"}                    clear the presence on Discord
+    {"cmd": "player", "name": "spotify"}  follow an MPRIS player ("auto", or null for none)
+    {"cmd": "status"}
+    {"cmd": "metrics"}                  counters and latencies ("format": "prometheus" for text)
+    {"cmd": "log"}                      recent log lines, repeats collapsed
+    {"cmd": "history", "since": 1760000000, "until": null}  presences shown in that time
+    {"cmd": "top", "since": 1760000000, "limit": 10}       tracks shown longest since then
+
+Fields set here override config.json for the presence only, they are never
+written to disk. The command line client below sends commands to a running
+instance:
+
+    python3 control.py set details="Building" state="3/10"
+    python3 control.py status
+    python3 control.py metrics --prometheus
+    python3 control.py log
+    python3 control.py history --hours 24
+    python3 control.py top --days 7
+    some-tool | python3 control.py --stdin
+"""
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import time
+
+from config_store import CONFIG_FIELDS, TIMESTAMP_TYPES
+from logring import log, ring
+from metrics import registry
+from templates import FIELD_LIMITS, validate as validate_template
+
+MAX_LINE = 65536  # Longest command accepted before the client is dropped
+
+# Everything in the config except the App ID can be overridden
+CONTROL_FIELDS = {field: kind for field, kind in CONFIG_FIELDS.items() if field != 'app_id'}
+CONTROL_FIELDS['custom_timestamp'] = int
+
+
+def control_path():
+    """Socket path of the running instance."""
+    if sys.platform == "win32":
+        return os.path.join(tempfile.gettempdir(), "DiscordCRP", "control.sock")
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"discordcrp-{os.getuid()}")
+    return os.path.join(runtime_dir, "DiscordCRP", "control.sock")
+
+
+def make_private_dir(directory):
+    """Create directory and its missing parents 0700, then check nobody else can get at it.
+
+    Raises OSError unless the directory and its parent are real directories
+    owned by this user without group or other permissions, so another user
+    can't pre-create them and take over the socket.
+    """
+    missing = []
+    path = directory
+    while not os.path.lexists(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    for path in reversed(missing):
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+    for path in (os.path.dirname(directory), directory):
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise OSError(f"{path} must be a directory owned by this user and closed to others")
+
+
+def validate_fields(fields):
+    """Return an error message for a bad "set" command, or None."""
+    if not isinstance(fields, dict):
+        return "fields must be an object"
+    for field, value in fields.items():
+        kind = CONTROL_FIELDS.get(field)
+        if kind is None:
+            return f"Unknown field: {field}"
+        # null drops the override
+        if value is not None and (not isinstance(value, kind) or isinstance(value, bool)):
+            return f"{field} must be a {kind.__name__}"
+        if field == 'timestamp' and value is not None and value not in TIMESTAMP_TYPES:
+            return f"timestamp must be one of {', '.join(TIMESTAMP_TYPES)}"
+        if field in FIELD_LIMITS and value is not None:
+            error = validate_template(value)
+            if error:
+                return f"{field}: {error}"
+    return None
+
+
+class ControlClient:
+    """One connection to the control socket."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.writing = False
+        self.closing = False  # Peer is done sending, drop once replies are out
+
+
+class ControlServer:
+    """Serves the control socket on the app's event loop.
+
+    Commands are applied to `service` (a PresenceService). A burst of "set"
+    commands rebuilds the presence once, after the burst has been read; the
+    service's rate limiter coalesces anything beyond that.
+    """
+
+    def __init__(self, loop, service, path=None):
+        self.loop = loop
+        self.service = service
+        self.path = path or control_path()
+        self.sock = None
+        self.clients = {}  # fd -> ControlClient
+        self.update_handle = None
+        self.counters = {"commands": 0, "errors": 0, "updates": 0}
+
+    def start(self):
+        """Bind the socket. Raises OSError if it is taken by another instance."""
+        if sys.platform == "win32":
+            raise OSError("The control socket is not available on Windows")
+        make_private_dir(os.path.dirname(self.path))
+        if os.path.exists(self.path):
+            # Left behind by a crash, unless another instance still answers
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise OSError(f"Another instance is listening on {self.path}")
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            sock.listen(8)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.loop.add_reader(sock.fileno(), self._on_accept)
+
+    def close(self):
+        self._cancel_update()
+        for fd in list(self.clients):
+            self._drop(fd)
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _on_accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                log(f"Error accepting control connection: {e}")
+                return
+            sock.setblocking(False)
+            self.clients[sock.fileno()] = ControlClient(sock)
+            self.loop.add_reader(sock.fileno(), self._on_readable, sock.fileno())
+
+    def _on_readable(self, fd):
+        client = self.clients.get(fd)
+        if client is None:
+            return
+        closed = False
+        try:
+            while True:
+                data = client.sock.recv(65536)
+                if not data:
+                    closed = True
+                    break
+                client.inbuf += data
+        except BlockingIOError:
+            pass
+        except OSError:
+            closed = True
+
+        while True:
+            end = client.inbuf.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(client.inbuf[:end])
+            del client.inbuf[:end + 1]
+            if line.strip():
+                self._reply(client, self.handle_line(line))
+        if len(client.inbuf) > MAX_LINE:
+            self._reply(client, {"ok": False, "error": "Command too long"})
+            closed = True
+        elif closed and client.inbuf.strip():
+            # Last command without a trailing newline
+            self._reply(client, self.handle_line(bytes(client.inbuf)))
+        if closed and fd in self.clients:
+            client.closing = True
+            self.loop.remove_reader(fd)
+            if not client.outbuf:
+                self._drop(fd)
+
+    def handle_line(self, line):
+        """Run one command line and return the reply."""
+        self.counters["commands"] += 1
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            command = None
+            reply = {"ok": False, "error": f"Invalid JSON: {e}"}
+        else:
+            if not isinstance(command, dict):
+                reply = {"ok": False, "error": "Commands must be JSON objects"}
+            else:
+                try:
+                    reply = self.handle_command(command)
+                except Exception as e:
+                    log(f"Error handling control command: {e}")
+                    reply = {"ok": False, "error": str(e)}
+        if not reply.get("ok"):
+            self.counters["errors"] += 1
+        if isinstance(command, dict) and "id" in command:
+            reply["id"] = command["id"]
+        return reply
+
+    def handle_command(self, command):
+        cmd = command.get("cmd")
+        if cmd == "set":
+            fields = command.get("fields", {})
+            error = validate_fields(fields)
+            if error:
+                return {"ok": False, "error": error}
+            for field, value in fields.items():
+                if value is None:
+                    self.service.overrides.pop(field, None)
+                else:
+                    self.service.overrides[field] = value
+            self._schedule_update()
+            return {"ok": True}
+        if cmd == "reset":
+            self.service.overrides.clear()
+            self._schedule_update()
+            return {"ok": True}
+        if cmd == "clear":
+            # A pending rebuild would bring the presence straight back
+            self._cancel_update()
+            error = self.service.clear()
+            return {"ok": False, "error": error} if error else {"ok": True}
+        if cmd == "player":
+            return self._select_player(command.get("name"))
+        if cmd == "status":
+            return {"ok": True, **self.status()}
+        if cmd == "metrics":
+            if command.get("format") == "prometheus":
+                return {"ok": True, "text": registry.prometheus_text()}
+            return {"ok": True, **registry.snapshot()}
+        if cmd in ("history", "top"):
+            return self._history(cmd, command)
+        if cmd == "log":
+            return {"ok": True, "text": "".join(line + "\n" for line in ring.lines())}
+        return {"ok": False, "error": f"Unknown command: {cmd}"}
+
+    def _select_player(self, name):
+        if name is None:
+            self.service.select_player(None)
+            return {"ok": True, "player": None}
+        if not isinstance(name, str):
+            return {"ok": False, "error": "name must be a string or null"}
+        if self.service.mpris is None:
+            self.service.start_mpris()
+        if name.lower() == "auto":
+            self.service.set_auto(True)
+            return {"ok": True, "player": "auto", "following": self.service.player}
+        player = self.service.find_player(name)
+        if player is None:
+            return {"ok": False, "error": f"No MPRIS player named {name}"}
+        self.service.select_player(player)
+        return {"ok": True, "player": player}
+
+    def _history(self, cmd, command):
+        since, until = command.get("since"), command.get("until")
+        if not isinstance(since, (int, float)) or not isinstance(until, (int, float, type(None))):
+            return {"ok": False, "error": "since must be a time in epoch seconds, until one or null"}
+        history = self.service.history
+        if cmd == "history":
+            return {"ok": True, "records": history.between(since, until)}
+        limit = command.get("limit", 10)
+        if not isinstance(limit, int) or limit < 1:
+            return {"ok": False, "error": "limit must be a positive integer"}
+        tracks = history.top_tracks(since, until, limit)
+        return {"ok": True, "tracks": [{"track": track, "seconds": seconds, "plays": plays}
+                                       for track, seconds, plays in tracks]}
+
+    def status(self):
+        service = self.service
+        return {
+            "state": service.connection.state,
+            "clients": service.connection.stats(),
+            "player": service.player,
+            "auto": service.auto,
+            "players": sorted(service.players),
+            "overrides": dict(service.overrides),
+            "queue": dict(service.queue.counters, pending=service.queue.has_pending),
+            "scheduler": service.scheduler.stats(),
+            "art_cache": service.art_cache.stats(),
+            "history": service.history.stats(),
+            "processes": service.processes.stats(),
+            "control": dict(self.counters)
+        }
+
+    def _schedule_update(self):
+        if self.update_handle is None:
+            self.update_handle = self.loop.call_later(0, self._apply_update)
+
+    def _cancel_update(self):
+        if self.update_handle is not None:
+            self.update_handle.cancel()
+            self.update_handle = None
+
+    def _apply_update(self):
+        self.update_handle = None
+        self.counters["updates"] += 1
+        error = self.service.update()
+        if error:
+            log(f"Error updating presence: {error}")
+
+    def _reply(self, client, reply):
+        client.outbuf += json.dumps(reply).encode('utf-8') + b"\n"
+        self._flush(client)
+
+    def _flush(self, client):
+        fd = client.sock.fileno()
+        try:
+            while client.outbuf:
+                sent = client.sock.send(client.outbuf)
+                del client.outbuf[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.loop.call_later(0, self._drop, fd)
+            return
+        if client.outbuf and not client.writing:
+            self.loop.add_writer(fd, self._flush, client)
+            client.writing = True
+        elif not client.outbuf and client.writing:
+            self.loop.remove_writer(fd)
+            client.writing = False
+            if client.closing:
+                self._drop(fd)
+
+    def _drop(self, fd):
+        client = self.clients.pop(fd, None)
+        if client is None:
+            return
+        if not client.closing:
+            self.loop.remove_reader(fd)
+        if client.writing:
+            self.loop.remove_writer(fd)
+        client.sock.close()
+
+
+# Command line client
+
+def parse_field(assignment):
+    """Turn field=value into (field, value); custom_timestamp is an int, empty means unset."""
+    field, sep, value = assignment.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected field=value, got {assignment}")
+    if value == "":
+        return field, None
+    if CONTROL_FIELDS.get(field) is int:
+        try:
+            return field, int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{field} must be a number")
+    return field, value
+
+
+def send_commands(commands, path=None):
+    """Send commands over one connection and return the replies."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or control_path())
+        sock.sendall(b"".join(json.dumps(command).encode('utf-8') + b"\n" for command in commands))
+        sock.shutdown(socket.SHUT_WR)
+        reader = sock.makefile('rb')
+        return [json.loads(line) for line in reader if line.strip()]
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Control a running DiscordCRP instance")
+    parser.add_argument('--socket', help="control socket (default: %(default)s)", default=control_path())
+    parser.add_argument('--stdin', action='store_true', help="send JSON command lines read from stdin")
+    sub = parser.add_subparsers(dest='cmd')
+    set_parser = sub.add_parser('set', help="override presence fields, e.g. details=\"Building\"")
+    set_parser.add_argument('fields', nargs='+', type=parse_field, metavar='field=value')
+    sub.add_parser('reset', help="go back to the configured presence")
+    sub.add_parser('clear', help="clear the presence")
+    player_parser = sub.add_parser('player', help="follow an MPRIS player")
+    player_parser.add_argument('name', nargs='?', help="player name or auto, omit for none")
+    sub.add_parser('status', help="print the connection and player state")
+    metrics_parser = sub.add_parser('metrics', help="print counters and latencies")
+    metrics_parser.add_argument('--prometheus', action='store_true', help="Prometheus text format")
+    sub.add_parser('log', help="print recent log lines")
+    history_parser = sub.add_parser('history', help="print the presences shown recently")
+    history_parser.add_argument('--hours', type=float, default=24, help="how far back (default: %(default)s)")
+    top_parser = sub.add_parser('top', help="print the tracks shown longest")
+    top_parser.add_argument('--days', type=float, default=7, help="how far back (default: %(default)s)")
+    top_parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.stdin:
+        commands = []
+        for line in sys.stdin:
+            if line.strip():
+                try:
+                    commands.append(json.loads(line))
+                except ValueError as e:
+                    print(f"Invalid JSON: {e}", file=sys.stderr)
+                    return 2
+    elif args.cmd == 'set':
+        commands = [{"cmd": "set", "fields": dict(args.fields)}]
+    elif args.cmd == 'player':
+        commands = [{"cmd": "player", "name": args.name}]
+    elif args.cmd == 'history':
+        commands = [{"cmd": "history", "since": time.time() - args.hours * 3600}]
+    elif args.cmd == 'top':
+        commands = [{"cmd": "top", "since": time.time() - args.days * 86400, "limit": args.limit}]
+    elif args.cmd == 'metrics' and args.prometheus:
+        commands = [{"cmd": "metrics", "format": "prometheus"}]
+    elif args.cmd:
+        commands = [{"cmd": args.cmd}]
+    else:
+        parser.print_help()
+        return 2
+
+    try:
+        replies = send_commands(commands, args.socket)
+    except OSError as e:
+        print(f"Could not reach DiscordCRP at {args.socket}: {e}", file=sys.stderr)
+        return 1
+    failed = False
+    for reply in replies:
+        if not reply.get("ok"):
+            failed = True
+            print(f"Error: {reply.get('error')}", file=sys.stderr)
+        elif "text" in reply:
+            print(reply["text"], end="")
+        elif set(reply) - {"ok", "id"}:
+            print(json.dumps(reply, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,601 @@
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import tempfile
+import threading
+
+OP_HANDSHAKE = 0
+OP_FRAME = 1
+OP_CLOSE = 2
+OP_PING = 3
+OP_PONG = 4
+
+HEADER = struct.Struct("<II")  # opcode, payload length (little endian)
+CONNECT_TIMEOUT = 10.0
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+
+
+def encode_frame(op, payload):
+    """Serialize one IPC frame."""
+    data = json.dumps(payload).encode('utf-8')
+    return HEADER.pack(op, len(data)) + data
+
+
+class FrameDecoder:
+    """Split the IPC byte stream into (op, payload) frames."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            op, length = HEADER.unpack_from(self.buffer)
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            body = bytes(self.buffer[HEADER.size:end])
+            del self.buffer[:end]
+            frames.append((op, json.loads(body.decode('utf-8'))))
+        return frames
+
+
+def ipc_dirs():
+    """Directories where Discord clients create their IPC sockets."""
+    if sys.platform == "win32":
+        return [r"\\?\pipe"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        user_dir = f"/run/user/{os.getuid()}"
+        runtime_dir = user_dir if os.path.isdir(user_dir) else tempfile.gettempdir()
+    return [
+        runtime_dir,
+        os.path.join(runtime_dir, "snap.discord"),
+        os.path.join(runtime_dir, "app", "com.discordapp.Discord"),
+        os.path.join(runtime_dir, "app", "com.discordapp.DiscordCanary"),
+    ]
+
+
+def find_ipc_path():
+    """Return the first discord-ipc-N socket that exists, or None."""
+    if sys.platform == "win32":
+        return r"\\?\pipe\discord-ipc-0"
+    for directory in ipc_dirs():
+        for index in range(10):
+            path = os.path.join(directory, f"discord-ipc-{index}")
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def find_ipc_paths():
+    """Every discord-ipc-N socket that exists, one per running client."""
+    if sys.platform == "win32":
+        # Named pipes are probed by name; listing \\?\pipe is not reliable
+        names = (rf"\\?\pipe\discord-ipc-{index}" for index in range(10))
+        return [path for path in names if os.path.exists(path)]
+    paths = []
+    for directory in ipc_dirs():
+        try:
+            # One listdir per directory instead of probing all ten names
+            names = set(os.listdir(directory))
+        except OSError:
+            continue
+        for index in range(10):
+            if f"discord-ipc-{index}" in names:
+                paths.append(os.path.join(directory, f"discord-ipc-{index}"))
+    return paths
+
+
+def client_label(path):
+    """Short name for a client's socket, relative to the runtime directory."""
+    for directory in ipc_dirs()[1:]:
+        if os.path.dirname(path) == directory:
+            return os.path.relpath(path, ipc_dirs()[0])
+    return os.path.basename(path)
+
+
+def activity_command(activity):
+    """Build a SET_ACTIVITY command from Presence.update keyword arguments (None clears)."""
+    # pypresence is only needed once there is something to send
+    from pypresence.payloads import Payload
+    if activity is None:
+        return Payload.set_activity(pid=os.getpid(), activity=None).data
+    return Payload.set_activity(pid=os.getpid(), **activity).data
+
+
+class DiscordIpcClient:
+    """Non-blocking client for the Discord RPC socket.
+
+    The client registers its socket with `loop`, which needs the asyncio-style
+    call_later, call_soon_threadsafe, add_reader/remove_reader and
+    add_writer/remove_writer methods. Results are reported through callbacks:
+
+    on_ready(user)             handshake accepted
+    on_response(nonce, error)  reply to a command, error is None on success
+    on_closed(reason)          connection lost or refused
+    """
+
+    def __init__(self, client_id, loop, path=None, timeout=CONNECT_TIMEOUT):
+        self.client_id = str(client_id)
+        self.loop = loop
+        self.path = path
+        self.timeout = timeout
+        self.state = "disconnected"
+        self.sock = None
+        self.pipe = None
+        self.outbuf = bytearray()
+        self.decoder = FrameDecoder()
+        self.timeout_handle = None
+        self.writing = False
+        self.close_code = None  # Set when Discord refuses the handshake
+        self.on_ready = None
+        self.on_response = None
+        self.on_closed = None
+
+    def connect(self):
+        """Start connecting. Returns immediately; on_ready or on_closed follows."""
+        if self.state != "disconnected":
+            return
+        path = self.path or find_ipc_path()
+        if path is None:
+            self.state = "connecting"
+            self.loop.call_later(0, self._fail, "Discord is not running")
+            return
+        self.path = path
+        self.state = "connecting"
+        self.timeout_handle = self.loop.call_later(self.timeout, self._fail, "Timed out waiting for Discord")
+        try:
+            if sys.platform == "win32":
+                self._open_pipe()
+            else:
+                self._open_socket()
+        except OSError as e:
+            self.loop.call_later(0, self._fail, f"Could not connect to {path}: {e}")
+            return
+        self._send(OP_HANDSHAKE, {"v": 1, "client_id": self.client_id})
+
+    def _open_socket(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        # Unix socket connects either complete immediately or fail
+        self.sock.connect(self.path)
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def _open_pipe(self):
+        # Windows named pipes have no readiness notification, read on a thread
+        self.pipe = open(self.path, 'r+b', buffering=0)
+        threading.Thread(target=self._read_pipe, args=(self.pipe,), daemon=True).start()
+
+    def _read_pipe(self, pipe):
+        try:
+            while True:
+                data = pipe.read(65536)
+                if not data:
+                    break
+                self.loop.call_soon_threadsafe(self._on_data, data, pipe)
+        except OSError:
+            pass
+        self.loop.call_soon_threadsafe(self._on_pipe_closed, pipe)
+
+    def _on_pipe_closed(self, pipe):
+        if pipe is self.pipe:
+            self._fail("Discord closed the connection")
+
+    def set_activity(self, activity):
+        """Send SET_ACTIVITY (None clears the presence). Returns the command nonce."""
+        if self.state != "ready":
+            raise ConnectionError("Not connected to Discord")
+        command = activity_command(activity)
+        self._send(OP_FRAME, command)
+        return command["nonce"]
+
+    def close(self):
+        """Close the connection without reporting it through on_closed."""
+        self._teardown()
+
+    def _send(self, op, payload):
+        self.outbuf += encode_frame(op, payload)
+        self._flush()
+
+    def _flush(self):
+        if self.pipe is not None:
+            try:
+                self.pipe.write(bytes(self.outbuf))
+                self.outbuf.clear()
+            except OSError as e:
+                self.loop.call_later(0, self._fail, f"Error writing to Discord: {e}")
+            return
+        if self.sock is None:
+            return
+        try:
+            while self.outbuf:
+                sent = self.sock.send(self.outbuf)
+                del self.outbuf[:sent]
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self.loop.call_later(0, self._fail, f"Error writing to Discord: {e}")
+            return
+        if self.outbuf and not self.writing:
+            self.loop.add_writer(self.sock.fileno(), self._flush)
+            self.writing = True
+        elif not self.outbuf and self.writing:
+            self.loop.remove_writer(self.sock.fileno())
+            self.writing = False
+
+    def _on_readable(self):
+        chunks = []
+        closed = False
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    closed = True
+                    break
+                chunks.append(data)
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self._fail(f"Error reading from Discord: {e}")
+            return
+        if chunks:
+            self._on_data(b"".join(chunks))
+        if closed and self.sock is not None:
+            self._fail("Discord closed the connection")
+
+    def _on_data(self, data, pipe=None):
+        if pipe is not None and pipe is not self.pipe:
+            return
+        try:
+            frames = self.decoder.feed(data)
+        except ValueError as e:
+            self._fail(f"Malformed frame from Discord: {e}")
+            return
+        for op, payload in frames:
+            if self.state == "disconnected":
+                return
+            self._handle_frame(op, payload)
+
+    def _handle_frame(self, op, payload):
+        if op == OP_PING:
+            self._send(OP_PONG, payload)
+        elif op == OP_CLOSE:
+            if self.state == "connecting":
+                self.close_code = payload.get("code")
+            self._fail(payload.get("message", "Discord closed the connection"))
+        elif op == OP_FRAME:
+            if payload.get("cmd") == "DISPATCH" and payload.get("evt") == "READY":
+                self.state = "ready"
+                self._cancel_timeout()
+                if self.on_ready:
+                    self.on_ready(payload.get("data", {}).get("user", {}))
+            elif payload.get("nonce") is not None:
+                error = None
+                if payload.get("evt") == "ERROR":
+                    error = payload.get("data", {}).get("message", "Unknown error")
+                if self.on_response:
+                    self.on_response(payload["nonce"], error)
+
+    def _cancel_timeout(self):
+        if self.timeout_handle is not None:
+            self.timeout_handle.cancel()
+            self.timeout_handle = None
+
+    def _teardown(self):
+        self._cancel_timeout()
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            if self.writing:
+                self.loop.remove_writer(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        if self.pipe is not None:
+            try:
+                self.pipe.close()
+            except OSError:
+                pass
+            self.pipe = None
+        self.writing = False
+        self.outbuf.clear()
+        self.decoder = FrameDecoder()
+        self.state = "disconnected"
+
+    def _fail(self, reason):
+        if self.state == "disconnected":
+            return
+        self._teardown()
+        if self.on_closed:
+            self.on_closed(reason)
+
+
+class ConnectionSupervisor:
+    """Keeps a DiscordIpcClient connected and replays the desired presence.
+
+    States are "disconnected", "connecting", "connected" and "backoff". A lost
+    connection is retried after a jittered exponential delay; a refused
+    handshake (e.g. an invalid client ID) stops the supervisor instead.
+
+    on_state_changed(state, detail)  state transitions, detail is a reason or ""
+    on_response(nonce, error)        replies to set_activity
+    """
+
+    def __init__(self, loop, path=None):
+        self.loop = loop
+        self.path = path
+        self.client_id = None
+        self.client = None
+        self.state = "disconnected"
+        self.detail = ""
+        self.attempts = 0
+        self.retry_handle = None
+        self.desired = None
+        self.has_desired = False
+        self.on_state_changed = None
+        self.on_response = None
+
+    def start(self, client_id):
+        """Connect (or reconnect right away) with the given client ID."""
+        self._cancel_retry()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if client_id != self.client_id:
+            self.has_desired = False
+            self.desired = None
+        self.client_id = client_id
+        self.attempts = 0
+        self._connect()
+
+    def stop(self):
+        """Disconnect and stop retrying."""
+        self._cancel_retry()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.has_desired = False
+        self.desired = None
+        if self.state != "disconnected":
+            self._set_state("disconnected", "")
+
+    def set_activity(self, activity):
+        """Remember the activity and send it if connected. Returns the nonce or None."""
+        self.desired = activity
+        self.has_desired = True
+        if self.state != "connected":
+            return None
+        try:
+            return self.client.set_activity(activity)
+        except ConnectionError:
+            return None
+
+    def _connect(self):
+        self._set_state("connecting", "")
+        self.client = DiscordIpcClient(self.client_id, self.loop, path=self.path)
+        self.client.on_ready = self._on_ready
+        self.client.on_response = self._on_response
+        self.client.on_closed = self._on_closed
+        self.client.connect()
+
+    def _on_ready(self, user):
+        self.attempts = 0
+        self.state = "connected"
+        # Bring the presence back after a reconnect, before anyone is notified
+        if self.has_desired:
+            self.set_activity(self.desired)
+        self._set_state("connected", "")
+
+    def _on_response(self, nonce, error):
+        if self.on_response:
+            self.on_response(nonce, error)
+
+    def _on_closed(self, reason):
+        client = self.client
+        self.client = None
+        if client is not None and client.close_code is not None:
+            self.has_desired = False
+            self.desired = None
+            self._set_state("disconnected", reason)
+            return
+        delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** self.attempts)
+        delay *= random.uniform(0.5, 1.0)
+        self.attempts += 1
+        self.retry_handle = self.loop.call_later(delay, self._retry)
+        self._set_state("backoff", f"{reason}, retrying in {delay:.0f}s")
+
+    def _retry(self):
+        self.retry_handle = None
+        self._connect()
+
+    def _cancel_retry(self):
+        if self.retry_handle is not None:
+            self.retry_handle.cancel()
+            self.retry_handle = None
+
+    def _set_state(self, state, detail):
+        self.state = state
+        self.detail = detail
+        if self.on_state_changed:
+            self.on_state_changed(state, detail)
+
+
+class ConnectionPool:
+    """One ConnectionSupervisor per running Discord client (Stable, PTB, Flatpak, ...).
+
+    Has the supervisor's interface, so the service doesn't care how many
+    clients there are. Every activity goes to all connected clients at once;
+    each has its own non-blocking socket and retry timer, so a slow or dead
+    client never holds up the others. discover() picks up clients started
+    later and drops the sockets of clients that went away.
+
+    The pool is "connected" while any client is, and reports an update once:
+    on the first client that accepted it, or with an error once all failed.
+
+    on_state_changed(state, detail)  overall state transitions
+    on_response(nonce, error)        replies to set_activity
+    on_clients_changed()             a client came, went or changed state
+    """
+
+    def __init__(self, loop, paths=None):
+        self.loop = loop
+        self.paths = paths  # Fixed socket paths, discovered when None
+        self.client_id = None
+        self.clients = {}  # socket path -> ConnectionSupervisor
+        self.started = False
+        self.state = "disconnected"
+        self.detail = ""
+        self.desired = None
+        self.has_desired = False
+        self.updates = {}  # client nonce -> (pool nonce, socket path)
+        self.waiting = {}  # pool nonce -> [clients left to answer, first error]
+        self.sequence = 0
+        self.on_state_changed = None
+        self.on_response = None
+        self.on_clients_changed = None
+
+    def start(self, client_id):
+        """Connect to every client (or reconnect right away) with the given client ID."""
+        if client_id != self.client_id:
+            self.has_desired = False
+            self.desired = None
+        self.client_id = client_id
+        self.started = True
+        for supervisor in self.clients.values():
+            supervisor.start(client_id)
+        self.discover()
+        self._refresh()
+
+    def stop(self):
+        """Disconnect every client and stop looking for new ones."""
+        self.started = False
+        self.updates.clear()
+        self.waiting.clear()
+        for supervisor in self.clients.values():
+            supervisor.stop()
+        self.clients.clear()
+        self.has_desired = False
+        self.desired = None
+        self._refresh()
+
+    def discover(self):
+        """Add clients whose socket appeared, drop the ones whose socket is gone."""
+        if not self.started:
+            return
+        paths = self.paths if self.paths is not None else find_ipc_paths()
+        changed = False
+        for path in list(self.clients):
+            if path not in paths and self.clients[path].state != "connected":
+                self.clients.pop(path).stop()
+                changed = True
+        for path in paths:
+            if path not in self.clients:
+                self._add(path)
+                changed = True
+        if changed:
+            self._refresh()
+
+    def set_activity(self, activity):
+        """Remember the activity and send it to every connected client. Returns a nonce or None."""
+        self.desired = activity
+        self.has_desired = True
+        # Clients that aren't connected keep it and send it once they are
+        sent = [(path, supervisor.set_activity(activity)) for path, supervisor in self.clients.items()]
+        sent = [(path, nonce) for path, nonce in sent if nonce is not None]
+        if not sent:
+            return None
+        self.sequence += 1
+        pool_nonce = f"pool-{self.sequence}"
+        for path, nonce in sent:
+            self.updates[nonce] = (pool_nonce, path)
+        self.waiting[pool_nonce] = [len(sent), None]
+        return pool_nonce
+
+    def stats(self):
+        """Per-client state, keyed by a short socket name."""
+        return {
+            client_label(path): {"state": supervisor.state, "attempts": supervisor.attempts}
+            for path, supervisor in self.clients.items()
+        }
+
+    def describe(self):
+        """Per-client state as lines for the status tooltip."""
+        if not self.clients:
+            return ["No Discord client found"]
+        return [f"{client_label(path)}: {supervisor.state}" for path, supervisor in self.clients.items()]
+
+    @property
+    def connected_count(self):
+        return sum(1 for supervisor in self.clients.values() if supervisor.state == "connected")
+
+    def _add(self, path):
+        supervisor = ConnectionSupervisor(self.loop, path=path)
+        supervisor.on_state_changed = lambda state, detail: self._on_client_state(path, state, detail)
+        supervisor.on_response = self._on_response
+        self.clients[path] = supervisor
+        supervisor.start(self.client_id)
+        if self.has_desired:
+            # Sent once the handshake is done
+            supervisor.set_activity(self.desired)
+
+    def _on_client_state(self, path, state, detail):
+        if state != "connected":
+            # Its replies are not coming any more
+            for nonce, (_, client_path) in list(self.updates.items()):
+                if client_path == path:
+                    self._on_response(nonce, detail or "Discord closed the connection")
+        self._refresh()
+
+    def _on_response(self, nonce, error):
+        pool_nonce, _ = self.updates.pop(nonce, (None, None))
+        if pool_nonce is None:
+            # A presence replayed after a reconnect
+            if self.on_response:
+                self.on_response(nonce, error)
+            return
+        entry = self.waiting.get(pool_nonce)
+        if entry is None:
+            return  # Already reported
+        entry[0] -= 1
+        if error is None or entry[0] == 0:
+            del self.waiting[pool_nonce]
+            if self.on_response:
+                self.on_response(pool_nonce, error if error is None else entry[1] or error)
+        elif entry[1] is None:
+            entry[1] = error
+
+    def _refresh(self):
+        """Derive the overall state from the clients and report changes."""
+        states = {}
+        for supervisor in self.clients.values():
+            states.setdefault(supervisor.state, supervisor.detail)
+        if "connected" in states:
+            state, detail = "connected", ""
+        elif "connecting" in states:
+            state, detail = "connecting", ""
+        elif "backoff" in states:
+            state, detail = "backoff", states["backoff"]
+        elif not self.started:
+            state, detail = "disconnected", ""
+        elif not self.clients:
+            # discover() runs again on the caller's schedule
+            state, detail = "backoff", "Discord is not running"
+        else:
+            # Every client refused the handshake, e.g. an invalid client ID
+            state, detail = "disconnected", states["disconnected"] or "Discord refused the connection"
+            self.started = False
+        if state != "connected":
+            self.updates.clear()
+            self.waiting.clear()
+        if self.on_clients_changed:
+            self.on_clients_changed()
+        if (state, detail) == (self.state, self.detail):
+            return
+        self.state = state
+        self.detail = detail
+        if self.on_state_changed:
+            self.on_state_changed(state, detail)
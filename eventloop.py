@@ -0,0 +1,107 @@
+import time
+
+from metrics import registry
+
+
+class GLibHandle:
+    """Cancellable handle returned by GLibLoop.call_later."""
+
+    def __init__(self, glib):
+        self.glib = glib
+        self.source_id = None
+
+    def cancel(self):
+        if self.source_id is not None:
+            self.glib.source_remove(self.source_id)
+            self.source_id = None
+
+
+class GLibLoop:
+    """asyncio-style timers and fd watches on a GLib main loop.
+
+    dbus-python delivers bus signals through GLib, so the headless daemon runs
+    on this loop when PyGObject is installed.
+    """
+
+    def __init__(self):
+        from gi.repository import GLib
+        self.glib = GLib
+        self.mainloop = GLib.MainLoop()
+        self.readers = {}
+        self.writers = {}
+
+    def time(self):
+        return time.monotonic()
+
+    def call_later(self, delay, callback, *args):
+        handle = GLibHandle(self.glib)
+
+        def fire():
+            handle.source_id = None
+            with registry.timer('timer_tick_seconds'):
+                callback(*args)
+            return False
+
+        handle.source_id = self.glib.timeout_add(max(0, int(delay * 1000)), fire)
+        return handle
+
+    def call_soon_threadsafe(self, callback, *args):
+        def run():
+            callback(*args)
+            return False
+
+        self.glib.idle_add(run)
+
+    def add_reader(self, fd, callback, *args):
+        self._watch(self.readers, fd, self.glib.IOCondition.IN, callback, args)
+
+    def remove_reader(self, fd):
+        return self._unwatch(self.readers, fd)
+
+    def add_writer(self, fd, callback, *args):
+        self._watch(self.writers, fd, self.glib.IOCondition.OUT, callback, args)
+
+    def remove_writer(self, fd):
+        return self._unwatch(self.writers, fd)
+
+    def _watch(self, sources, fd, condition, callback, args):
+        self._unwatch(sources, fd)
+        def ready(*_):
+            callback(*args)
+            return True
+
+        condition |= self.glib.IOCondition.HUP | self.glib.IOCondition.ERR
+        sources[fd] = self.glib.unix_fd_add_full(self.glib.PRIORITY_DEFAULT, fd, condition, ready)
+
+    def _unwatch(self, sources, fd):
+        source_id = sources.pop(fd, None)
+        if source_id is None:
+            return False
+        self.glib.source_remove(source_id)
+        return True
+
+    def add_signal_handler(self, signum, callback, *args):
+        def handle():
+            callback(*args)
+            return True
+
+        self.glib.unix_signal_add(self.glib.PRIORITY_HIGH, signum, handle)
+
+    def run_forever(self):
+        self.mainloop.run()
+
+    def stop(self):
+        self.mainloop.quit()
+
+
+def new_loop():
+    """GLibLoop if PyGObject is available, otherwise a plain asyncio loop.
+
+    The second value tells whether D-Bus signals will be dispatched.
+    """
+    try:
+        loop = GLibLoop()
+        return loop, True
+    except ImportError:
+        import asyncio
+        return asyncio.new_event_loop(), False
@@ -0,0 +1,170 @@
+import argparse
+import signal
+import sys
+
+from config_store import ConfigStore, validate_config
+from control import ControlServer
+from eventloop import new_loop
+from logring import log, log_file_path, ring
+from metrics import MetricsServer, metrics_port
+from service import PresenceService
+
+POLL_INTERVAL = 5.0  # Only used when bus signals can't be dispatched
+POLL_IDLE_INTERVAL = 30.0  # While paused or disconnected
+CONFIG_POLL_INTERVAL = 2.0  # Checking config.json for edits from elsewhere
+CONFIG_POLL_IDLE_INTERVAL = 10.0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="script.py --headless",
+        description="Discord Custom Rich Presence without a window"
+    )
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--player', help="MPRIS player to follow, e.g. spotify or org.mpris.MediaPlayer2.spotify, "
+                                         "or auto for whichever is playing")
+    parser.add_argument('--config', help="config file (default: $XDG_CONFIG_HOME/DiscordCRP/config.json)")
+    parser.add_argument('--metrics-port', type=int, default=metrics_port(),
+                        help="serve Prometheus metrics on 127.0.0.1:PORT (default: $DISCORDCRP_METRICS_PORT)")
+    parser.add_argument('--log-file', default=log_file_path(),
+                        help="also log to FILE, rotated at 1 MB (default: $DISCORDCRP_LOG_FILE)")
+    return parser.parse_args(argv)
+
+
+def report_state(state, detail):
+    log(f"Discord: {state}" + (f" ({detail})" if detail else ""))
+
+
+def report_result(cleared, error):
+    if error:
+        log(f"Error updating presence: {error}")
+    else:
+        log("Presence cleared" if cleared else "Presence updated")
+
+
+def main(argv=None):
+    """Run the presence from config.json on a small event loop, without Qt."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.log_file:
+        try:
+            ring.open_file(args.log_file)
+        except OSError as e:
+            log(f"Log file unavailable: {e}")
+    try:
+        return run(args)
+    finally:
+        # Every exit path flushes the log file
+        ring.close()
+
+
+def run(args):
+    loop, dispatches_signals = new_loop()
+    if dispatches_signals:
+        # Must be set before the first bus connection
+        from dbus.mainloop.glib import DBusGMainLoop
+        DBusGMainLoop(set_as_default=True)
+    elif args.player:
+        log(f"PyGObject not found, polling the MPRIS player every {POLL_INTERVAL:.0f}s")
+
+    store = ConfigStore(args.config)
+    try:
+        config = store.load()
+    except Exception as e:
+        log(f"Error loading configuration: {e}")
+        return 1
+    if config is None or not validate_config(config):
+        log(f"No valid configuration in {store.path}, save one from the window first")
+        return 1
+
+    service = PresenceService(loop, store)
+    service.on_state_changed = report_state
+    service.on_result = report_result
+    service.on_warning = log
+
+    def reload_config():
+        # No inotify without Qt, but a stat every few seconds is as cheap
+        try:
+            changed, conflicts = service.reload_config()
+        except (OSError, ValueError) as e:
+            log(f"Error reloading configuration: {e}")
+            return
+        if changed:
+            log(f"Configuration reloaded: {', '.join(sorted(changed))}")
+    service.scheduler.add('config_reload', reload_config, CONFIG_POLL_INTERVAL,
+                          idle_interval=CONFIG_POLL_IDLE_INTERVAL)
+
+    def follow(name):
+        if args.player and service.find_player(args.player) == name:
+            service.select_player(name)
+
+    def poll():
+        # Without signals, player churn is only noticed here
+        try:
+            if service.auto:
+                service.poll_player()
+            elif service.player is None:
+                service.start_mpris()
+                name = service.find_player(args.player)
+                if name:
+                    follow(name)
+            else:
+                service.poll_player()
+        except Exception as e:
+            log(f"Failed to query MPRIS players: {e}")
+
+    service.on_player_added = follow
+    service.on_player_removed = lambda name: log(f"MPRIS player removed: {name}")
+    service.on_player_selected = lambda name: log(f"Following {name}" if name else "Not following a player")
+    if args.player:
+        try:
+            service.start_mpris()
+            name = service.find_player(args.player)
+            if args.player.lower() == "auto":
+                service.set_auto(True)
+            elif name:
+                follow(name)
+            else:
+                log(f"Waiting for MPRIS player {args.player}")
+        except Exception as e:
+            log(f"Failed to query MPRIS players: {e}")
+        if not dispatches_signals:
+            service.scheduler.add('mpris_poll', poll, POLL_INTERVAL, idle_interval=POLL_IDLE_INTERVAL)
+
+    error = service.connect()
+    if error:
+        log(error)
+        service.close()
+        return 1
+
+    control = ControlServer(loop, service)
+    try:
+        control.start()
+        log(f"Listening for commands on {control.path}")
+    except OSError as e:
+        log(f"Control socket unavailable: {e}")
+
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = MetricsServer(loop, args.metrics_port)
+        try:
+            metrics_server.start()
+            log(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            log(f"Metrics endpoint unavailable: {e}")
+            metrics_server = None
+
+    # Teardown happens once, after the loop returns
+    loop.add_signal_handler(signal.SIGINT, loop.stop)
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    try:
+        loop.run_forever()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        control.close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
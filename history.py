@@ -0,0 +1,314 @@
+import json
+import os
+import sys
+import time
+from bisect import bisect_right
+
+from config_store import atomic_write
+from logring import log
+
+SEGMENT_BYTES = 1024 * 1024  # A segment is sealed once it grows past this
+MAX_SEGMENTS = 16  # Oldest sealed segments are deleted beyond this
+MARK_BYTES = 4096  # One time index mark per this much journal
+MAX_RECORD_SECONDS = 3600.0  # Longest a record counts as shown, bounds gaps left by a crash
+INDEX_VERSION = 1
+
+
+def history_dir():
+    """Per-user data location ($XDG_DATA_HOME on Linux, %APPDATA% on Windows)."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "DiscordCRP", "history")
+
+
+def compact(payload):
+    """Activity without its unset fields, None for a clear."""
+    if payload is None:
+        return None
+    return {field: value for field, value in payload.items() if value not in (None, '')}
+
+
+class History:
+    """Append-only journal of the presences shown on Discord.
+
+    record() only appends to an in-memory buffer; flush() (run from the
+    scheduler) writes it out as JSON lines. The journal is split into
+    segments of about SEGMENT_BYTES, the oldest deleted past MAX_SEGMENTS.
+    The index keeps, per segment, its time range, a (time, offset) mark
+    every MARK_BYTES and the seconds each track was shown. So a query only
+    opens the segments overlapping its range, seeks to the mark before its
+    start, and top_tracks() takes whole segments from their totals.
+
+    A record is shown until the next one; clears (and disconnects) are
+    records with a null activity.
+    """
+
+    def __init__(self, directory=None, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS, clock=time.time):
+        self.directory = directory or history_dir()
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.clock = clock
+        self.segments = []  # Oldest first; the last one is being appended to
+        self.buffer = []  # (record, line) not written yet
+        self.open_record = None  # (time, track, segment) of the newest record
+        self.loaded = False
+        self.dirty = False
+
+    def record(self, payload, track=None):
+        """Journal an activity sent to Discord (None for a clear). No I/O."""
+        record = {"time": round(self.clock(), 1), "activity": compact(payload)}
+        if track:
+            record["track"] = track
+        self.buffer.append((record, json.dumps(record, separators=(',', ':')) + "\n"))
+
+    @property
+    def showing(self):
+        """Whether the newest record is an activity rather than a clear."""
+        if self.buffer:
+            return self.buffer[-1][0]["activity"] is not None
+        return self.open_record is not None and self.open_record[1] is not False
+
+    def flush(self):
+        """Write buffered records, rotating segments as they fill."""
+        if not self.loaded:
+            self.load()
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+        if not self.segments or self.segments[-1]["bytes"] >= self.segment_bytes:
+            self._rotate()
+        segment = self.segments[-1]
+        data = "".join(line for _, line in buffer).encode('utf-8')
+        try:
+            with open(self._path(segment), 'ab') as f:
+                f.write(data)
+        except OSError as e:
+            log(f"Error writing presence history: {e}")
+            self.buffer = buffer + self.buffer
+            return
+        offset = segment["bytes"]
+        for record, line in buffer:
+            self._index(segment, record, offset)
+            offset += len(line.encode('utf-8'))
+        segment["bytes"] = offset
+        self.dirty = True
+        if segment["bytes"] >= self.segment_bytes:
+            self._rotate()
+
+    def save(self):
+        """Flush and write the index if it changed."""
+        self.flush()
+        if not self.dirty:
+            return
+        try:
+            atomic_write(self.index_path, json.dumps({"version": INDEX_VERSION, "segments": self.segments}))
+            self.dirty = False
+        except OSError as e:
+            log(f"Error saving presence history index: {e}")
+
+    # Queries
+
+    def between(self, start, end=None):
+        """Records shown between start and end (epoch seconds), including the one shown at start."""
+        end = self.clock() if end is None else end
+        shown = []
+        for record in self._scan(start, end):
+            if record["time"] <= start:
+                shown = [record]
+            else:
+                shown.append(record)
+        return shown
+
+    def top_tracks(self, start, end=None, limit=10):
+        """[(track, seconds shown, plays)] of the tracks shown longest between start and end."""
+        end = self.clock() if end is None else end
+        totals = {}
+
+        def add(track, seconds, plays=0):
+            if track:
+                total = totals.setdefault(track, [0.0, 0])
+                total[0] += seconds
+                total[1] += plays
+
+        previous = None  # (time, track) of the record whose end comes next
+        for segment, covered in self._segments(start, end):
+            if covered:
+                # Every record in it was shown inside the range
+                if previous is not None:
+                    add(previous[1], self._shown(previous[0], segment["first"], start, end))
+                    previous = None
+                for track, (seconds, plays) in segment["tracks"].items():
+                    add(track, seconds, plays)
+                continue
+            for record in self._read(segment, start, end):
+                if previous is not None:
+                    add(previous[1], self._shown(previous[0], record["time"], start, end))
+                track = record.get("track")
+                if record["time"] >= start and track and (previous is None or previous[1] != track):
+                    add(track, 0.0, 1)
+                previous = (record["time"], track)
+        if previous is not None:
+            add(previous[1], self._shown(previous[0], self.clock(), start, end))
+        ranked = sorted(totals.items(), key=lambda item: -item[1][0])
+        return [(track, round(seconds), plays) for track, (seconds, plays) in ranked[:limit] if seconds > 0]
+
+    def stats(self):
+        if not self.loaded:
+            self.load()
+        return {
+            "segments": len(self.segments),
+            "bytes": sum(segment["bytes"] for segment in self.segments),
+            "records": sum(segment["records"] for segment in self.segments) + len(self.buffer),
+            "buffered": len(self.buffer)
+        }
+
+    def _shown(self, shown_at, next_at, start, end):
+        """Seconds of [shown_at, next_at) inside [start, end]."""
+        next_at = min(next_at, shown_at + MAX_RECORD_SECONDS)
+        return max(0.0, min(next_at, end) - max(shown_at, start))
+
+    def _segments(self, start, end):
+        """(segment, covered) for segments overlapping the range; covered ones lie entirely inside."""
+        self.flush()
+        for segment in self.segments:
+            if segment["records"] == 0 or segment["first"] > end:
+                continue
+            segment_end = segment["end"]
+            if segment_end is not None and segment_end < start:
+                continue
+            covered = segment_end is not None and segment["first"] >= start and segment_end <= end
+            yield segment, covered
+
+    def _scan(self, start, end):
+        for segment, _ in self._segments(start, end):
+            yield from self._read(segment, start, end)
+
+    def _read(self, segment, start, end):
+        """Records of a segment from the index mark before start up to end."""
+        marks = segment["marks"]
+        position = bisect_right([mark[0] for mark in marks], start) - 1
+        offset = marks[position][1] if position >= 0 else 0
+        try:
+            with open(self._path(segment), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write
+                    if record["time"] > end:
+                        return
+                    yield record
+        except OSError as e:
+            log(f"Error reading presence history: {e}")
+
+    # Segments and the index
+
+    def _path(self, segment):
+        return os.path.join(self.directory, segment["name"])
+
+    def _new_segment(self, sequence):
+        return {
+            "name": f"{sequence:08d}.jsonl", "sequence": sequence, "bytes": 0, "records": 0,
+            "first": None, "last": None, "last_track": None, "end": None, "marks": [], "tracks": {}
+        }
+
+    def _rotate(self):
+        sequence = self.segments[-1]["sequence"] + 1 if self.segments else 1
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments.append(self._new_segment(sequence))
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            if self.open_record is not None and self.open_record[2] is oldest:
+                self.open_record = None
+            try:
+                os.unlink(self._path(oldest))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(f"Error removing presence history: {e}")
+        self.dirty = True
+        self.save()
+
+    def _index(self, segment, record, offset):
+        """Account for a record written to segment at offset."""
+        when = record["time"]
+        # False marks a clear, None an activity without a track
+        track = record.get("track") if record.get("activity") is not None else False
+        if not segment["marks"] or offset - segment["marks"][-1][1] >= MARK_BYTES:
+            segment["marks"].append([when, offset])
+        if segment["first"] is None:
+            segment["first"] = when
+        segment["last"] = when
+        segment["last_track"] = track
+        segment["records"] += 1
+        # The previous record was shown until now, unless an index saved
+        # after this record already counted that
+        if self.open_record is not None:
+            shown_at, previous_track, previous_segment = self.open_record
+            if previous_segment["end"] is None:
+                previous_segment["end"] = when
+                if previous_track:
+                    total = previous_segment["tracks"].setdefault(previous_track, [0.0, 0])
+                    total[0] += min(when - shown_at, MAX_RECORD_SECONDS)
+        segment["end"] = None
+        if track and (self.open_record is None or self.open_record[1] != track):
+            segment["tracks"].setdefault(track, [0.0, 0])[1] += 1
+        self.open_record = (when, track, segment)
+
+    def load(self):
+        """Read the index, re-indexing segments written since it was saved."""
+        self.loaded = True
+        indexed = {}
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if isinstance(index, dict) and index.get("version") == INDEX_VERSION:
+                indexed = {segment["name"]: segment for segment in index.get("segments", [])}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Error loading presence history index: {e}")
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".jsonl"))
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+                sequence = int(name.split(".")[0])
+            except (OSError, ValueError):
+                continue
+            segment = indexed.get(name)
+            if segment is not None and segment["bytes"] == size:
+                self.segments.append(segment)
+                if segment["last"] is not None:
+                    self.open_record = (segment["last"], segment["last_track"], segment)
+            else:
+                self._reindex(self._new_segment(sequence))
+        self.dirty = any(segment.get("name") not in indexed for segment in self.segments)
+
+    def _reindex(self, segment):
+        """Rebuild a segment's index entry from its records."""
+        self.segments.append(segment)
+        self.dirty = True
+        try:
+            with open(self._path(segment), 'rb') as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        self._index(segment, json.loads(line), offset)
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    offset += len(line)
+            segment["bytes"] = offset
+            if os.path.getsize(self._path(segment)) > offset:
+                # Drop a torn last line so the next flush starts on a new one
+                os.truncate(self._path(segment), offset)
+        except OSError as e:
+            log(f"Error reading presence history: {e}")
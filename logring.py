@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+from collections import deque
+
+RING_SIZE = 500  # Entries kept in memory
+REPEAT_INTERVAL = 60.0  # Seconds between "repeated" notices for one call site
+SITE_BURST = 5  # Distinct messages a call site may log back to back
+SITE_REFILL = 10.0  # Seconds for a call site to earn one more
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class Entry:
+    def __init__(self, seq, message, now, wall):
+        self.seq = seq
+        self.message = message
+        self.first = wall
+        self.last = wall
+        self.count = 1
+        self.reported = 1  # Occurrences already written out
+        self.reported_at = now
+
+    def text(self):
+        stamp = time.strftime("%H:%M:%S", time.localtime(self.first))
+        if self.count == 1:
+            return f"{stamp} {self.message}"
+        last = time.strftime("%H:%M:%S", time.localtime(self.last))
+        return f"{stamp} {self.message} (x{self.count}, last {last})"
+
+
+class Site:
+    """A call site's last entry and its token bucket."""
+
+    def __init__(self, burst, now):
+        self.entry = None
+        self.tokens = float(burst)
+        self.updated = now
+        self.suppressed = 0  # Messages dropped since the last one let through
+
+
+class LogRing:
+    """Fixed-size in-memory log that collapses repeats and rate limits call sites.
+
+    A message identical to the previous one from the same call site only
+    bumps that entry's count; the output gets a "repeated N times" line at
+    most once per interval for it. So a failure that repeats every tick
+    costs a dict lookup and a compare, however long it lasts, and neither
+    the console nor the ring fills up with it.
+
+    Messages that differ (a changing delay or exception text, two errors
+    taking turns) draw on a per-site token bucket: burst messages at once,
+    then one per refill seconds. The rest are only counted, and the next
+    message let through is preceded by how many were dropped.
+    """
+
+    def __init__(self, size=RING_SIZE, interval=REPEAT_INTERVAL, stream=None, clock=time.monotonic,
+                 burst=SITE_BURST, refill=SITE_REFILL):
+        self.entries = deque(maxlen=size)
+        self.interval = interval
+        self.stream = stream
+        self.clock = clock
+        self.burst = burst
+        self.refill = refill
+        self.sites = {}  # (file, line) -> Site
+        self.seq = 0
+        self.changes = 0  # Bumped on every call, lets viewers skip redraws
+        self.file = None
+
+    def log(self, message, site=None):
+        if site is None:
+            frame = sys._getframe(1)
+            site = (frame.f_code.co_filename, frame.f_lineno)
+        now = self.clock()
+        self.changes += 1
+        state = self.sites.get(site)
+        if state is None:
+            state = self.sites[site] = Site(self.burst, now)
+        entry = state.entry
+        # Only collapse into an entry that is still in the ring
+        if entry is not None and entry.message == message and entry.seq > self.seq - self.entries.maxlen:
+            entry.count += 1
+            entry.last = time.time()
+            if now - entry.reported_at >= self.interval:
+                self._write(f"{message} (repeated {entry.count - entry.reported} times)")
+                entry.reported = entry.count
+                entry.reported_at = now
+            return
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) / self.refill)
+        state.updated = now
+        if state.tokens < 1:
+            state.suppressed += 1
+            return
+        state.tokens -= 1
+        if entry is not None and entry.count > entry.reported:
+            # The previous message stopped repeating, account for the rest
+            self._write(f"{entry.message} (repeated {entry.count - entry.reported} times)")
+        if state.suppressed:
+            self._append(f"({state.suppressed} more messages from {os.path.basename(site[0])}:{site[1]} "
+                         f"were dropped)", now)
+            state.suppressed = 0
+        state.entry = self._append(message, now)
+
+    def _append(self, message, now):
+        self.seq += 1
+        entry = Entry(self.seq, message, now, time.time())
+        self.entries.append(entry)
+        self._write(message)
+        return entry
+
+    def lines(self):
+        return [entry.text() for entry in self.entries]
+
+    def open_file(self, path):
+        """Also write to path, rotated at LOG_FILE_MAX_BYTES."""
+        # Only needed when a log file is asked for
+        import logging.handlers
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8'
+        )
+        self.file.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _write(self, text):
+        stream = self.stream or sys.stdout
+        try:
+            print(text, file=stream, flush=True)
+        except (OSError, ValueError):
+            pass  # No console (pythonw) or it went away
+        if self.file is not None:
+            import logging
+            self.file.emit(logging.makeLogRecord({"msg": text}))
+
+
+# Process-wide ring the modules log into
+ring = LogRing()
+
+
+def log(message):
+    """Log a message for the console, the viewer and the log file (if any)."""
+    frame = sys._getframe(1)
+    ring.log(message, (frame.f_code.co_filename, frame.f_lineno))
+
+
+def log_file_path():
+    """Log file from $DISCORDCRP_LOG_FILE, or None."""
+    return os.environ.get("DISCORDCRP_LOG_FILE", "").strip() or None
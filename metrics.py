@@ -0,0 +1,282 @@
+import os
+import socket
+import time
+
+from logring import log
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "discordcrp_"
+
+HELP = {
+    'dbus_call_seconds': "MPRIS Properties.GetAll round trip",
+    'discord_update_seconds': "SET_ACTIVITY sent until Discord answered",
+    'timer_tick_seconds': "Time spent in event loop timer callbacks",
+    'config_write_seconds': "Atomic config.json write",
+    'process_scan_seconds': "Listing /proc and matching new processes against the process rules",
+    'dbus_calls': "MPRIS property reads",
+    'dbus_errors': "MPRIS property reads that failed",
+    'presence_updates_sent': "SET_ACTIVITY commands sent to Discord",
+    'presence_updates_coalesced': "Updates replaced by a newer one while rate limited",
+    'presence_updates_failed': "Updates Discord answered with an error",
+    'presence_updates_skipped': "Updates not sent because Discord already shows the same activity",
+    'config_writes': "Config files written",
+    'config_writes_skipped': "Config saves skipped because nothing changed on disk",
+    'config_reloads': "Config files changed by something else and merged",
+    'scheduler_wakeups': "Wakeups of the periodic task scheduler",
+    'art_cache_hits': "Album art lookups answered from the cache",
+    'art_cache_misses': "Album art lookups that had to read or hash the image",
+}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus exposes them."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Timer:
+    """Context manager that records its duration into a histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Counters and latency histograms for the hot paths."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        return Timer(self.histogram(name))
+
+    def snapshot(self):
+        """Plain dict of every metric, for the control socket."""
+        return {
+            "counters": dict(self.counters),
+            "histograms": {
+                name: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99)
+                }
+                for name, histogram in self.histograms.items()
+            }
+        }
+
+    def prometheus_text(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name in sorted(self.counters):
+            metric = f"{PREFIX}{name}_total"
+            if name in HELP:
+                lines.append(f"# HELP {metric} {HELP[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {self.counters[name]}")
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            metric = f"{PREFIX}{name}"
+            if name in HELP:
+                lines.append(f"# HELP {metric} {HELP[name]}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def describe(self):
+        """A few human-readable lines for the Diagnostics panel."""
+        def latency(name):
+            histogram = self.histograms.get(name)
+            if histogram is None or not histogram.count:
+                return "no samples"
+            return (f"p50 {histogram.quantile(0.5) * 1000:.1f} ms, "
+                    f"p99 {histogram.quantile(0.99) * 1000:.1f} ms")
+
+        def count(name):
+            return self.counters.get(name, 0)
+
+        timer = self.histograms.get('timer_tick_seconds')
+        return [
+            f"D-Bus reads: {count('dbus_calls')} ({count('dbus_errors')} failed), {latency('dbus_call_seconds')}",
+            f"Updates: {count('presence_updates_sent')} sent, {count('presence_updates_coalesced')} coalesced, "
+            f"{count('presence_updates_skipped')} skipped, {count('presence_updates_failed')} failed",
+            f"Discord round trip: {latency('discord_update_seconds')}",
+            f"Timer ticks: {timer.count if timer else 0}, {latency('timer_tick_seconds')}",
+            f"Config writes: {count('config_writes')} ({count('config_writes_skipped')} skipped), "
+            f"{latency('config_write_seconds')}",
+        ]
+
+
+# Process-wide registry the instrumented modules report into
+registry = Metrics()
+
+
+def metrics_port():
+    """Port for the Prometheus endpoint from $DISCORDCRP_METRICS_PORT, or None."""
+    value = os.environ.get("DISCORDCRP_METRICS_PORT", "").strip()
+    return int(value) if value.isdigit() else None
+
+
+class MetricsClient:
+    """One scrape: the request read so far, then the response left to send."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.request = bytearray()
+        self.outbuf = bytearray()
+        self.reading = True
+        self.writing = False
+
+
+class MetricsServer:
+    """Minimal HTTP endpoint on 127.0.0.1 serving registry.prometheus_text().
+
+    Runs on the app's event loop like the other sockets; every request gets
+    the full text and the connection is closed.
+    """
+
+    def __init__(self, loop, port, metrics=None):
+        self.loop = loop
+        self.port = port
+        self.metrics = metrics or registry
+        self.sock = None
+        self.clients = {}  # fd -> MetricsClient
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("127.0.0.1", self.port))
+            sock.listen(8)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.loop.add_reader(sock.fileno(), self._on_accept)
+
+    def close(self):
+        for fd in list(self.clients):
+            self._drop(fd)
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+
+    def _on_accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                log(f"Error accepting metrics connection: {e}")
+                return
+            sock.setblocking(False)
+            self.clients[sock.fileno()] = MetricsClient(sock)
+            self.loop.add_reader(sock.fileno(), self._on_readable, sock.fileno())
+
+    def _on_readable(self, fd):
+        client = self.clients[fd]
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(fd)
+            return
+        client.request += data
+        if data and b"\r\n\r\n" not in client.request and len(client.request) < 8192:
+            return
+        body = self.metrics.prometheus_text().encode('utf-8')
+        client.outbuf = bytearray(
+            b"HTTP/1.0 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii')
+            + body
+        )
+        # Only the response is left; a scraper that stops reading waits on the writer
+        self.loop.remove_reader(fd)
+        client.reading = False
+        self._flush(client)
+
+    def _flush(self, client):
+        fd = client.sock.fileno()
+        try:
+            while client.outbuf:
+                sent = client.sock.send(client.outbuf)
+                del client.outbuf[:sent]
+        except BlockingIOError:
+            if not client.writing:
+                self.loop.add_writer(fd, self._flush, client)
+                client.writing = True
+            return
+        except OSError:
+            pass
+        self._drop(fd)
+
+    def _drop(self, fd):
+        client = self.clients.pop(fd, None)
+        if client is None:
+            return
+        if client.reading:
+            self.loop.remove_reader(fd)
+        if client.writing:
+            self.loop.remove_writer(fd)
+        client.sock.close()
@@ -0,0 +1,141 @@
+import dbus
+
+from metrics import registry
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+DBusException = dbus.exceptions.DBusException
+
+
+class MprisClient:
+    """Long-lived session bus connection with a cache of MPRIS player proxies."""
+
+    def __init__(self, bus=None):
+        self.bus = bus if bus is not None else dbus.SessionBus()
+        self.proxies = {}  # service name -> Properties interface
+        self.owners = {}  # unique bus name -> service name, for signals from any player
+        self.name_owner_match = None
+        self.all_properties_match = None
+        self.on_player_added = None
+        self.on_player_removed = None
+
+    def list_players(self):
+        """Return the MPRIS service names currently on the bus."""
+        return sorted(str(name) for name in self.bus.list_names() if name.startswith(MPRIS_PREFIX))
+
+    def watch_players(self, on_added, on_removed):
+        """Call on_added/on_removed with the service name as players come and go."""
+        self.on_player_added = on_added
+        self.on_player_removed = on_removed
+        if self.name_owner_match is None:
+            self.name_owner_match = self.bus.add_signal_receiver(
+                self._on_name_owner_changed,
+                signal_name='NameOwnerChanged',
+                dbus_interface='org.freedesktop.DBus',
+                bus_name='org.freedesktop.DBus',
+                path='/org/freedesktop/DBus'
+            )
+
+    def _on_name_owner_changed(self, name, old_owner, new_owner):
+        if not name.startswith(MPRIS_PREFIX):
+            return
+        name = str(name)
+        # Cached proxies are bound to the old unique name
+        if old_owner:
+            self.proxies.pop(name, None)
+            self.owners.pop(str(old_owner), None)
+        if new_owner:
+            self.owners[str(new_owner)] = name
+        if new_owner and not old_owner:
+            if self.on_player_added:
+                self.on_player_added(name)
+        elif old_owner and not new_owner:
+            if self.on_player_removed:
+                self.on_player_removed(name)
+
+    def get_properties(self, service_name):
+        """Fetch all org.mpris.MediaPlayer2.Player properties in one round trip."""
+        return self._call(service_name, 'GetAll', PLAYER_INTERFACE)
+
+    def get_position(self, service_name):
+        """Fetch the player's Position in microseconds; it is never signalled."""
+        return self._call(service_name, 'Get', PLAYER_INTERFACE, 'Position')
+
+    def _call(self, service_name, method, *args):
+        properties = self.proxies.get(service_name)
+        if properties is None:
+            # The interface is fixed by the spec, so skip the Introspect call
+            player = self.bus.get_object(service_name, MPRIS_PATH, introspect=False)
+            properties = dbus.Interface(player, PROPERTIES_INTERFACE)
+            self.proxies[service_name] = properties
+        registry.inc('dbus_calls')
+        try:
+            with registry.timer('dbus_call_seconds'):
+                return getattr(properties, method)(*args)
+        except dbus.exceptions.DBusException:
+            registry.inc('dbus_errors')
+            self.proxies.pop(service_name, None)
+            raise
+
+    def watch_properties(self, service_name, handler):
+        """Subscribe handler(interface, changed, invalidated) to a player's PropertiesChanged."""
+        return self.bus.add_signal_receiver(
+            handler,
+            signal_name='PropertiesChanged',
+            dbus_interface=PROPERTIES_INTERFACE,
+            bus_name=service_name,
+            path=MPRIS_PATH
+        )
+
+    def watch_seeked(self, service_name, handler):
+        """Subscribe handler(position) to a player's Seeked signal (microseconds)."""
+        return self.bus.add_signal_receiver(
+            handler,
+            signal_name='Seeked',
+            dbus_interface=PLAYER_INTERFACE,
+            bus_name=service_name,
+            path=MPRIS_PATH
+        )
+
+    def watch_all_properties(self, handler):
+        """Subscribe handler(service_name, interface, changed, invalidated) to every player.
+
+        One match rule covers all players; signals carry the sender's unique
+        name, which is mapped back through the owners table.
+        """
+        for name in self.list_players():
+            try:
+                self.owners[str(self.bus.get_name_owner(name))] = name
+            except dbus.exceptions.DBusException:
+                pass  # Gone already
+
+        def dispatch(interface, changed, invalidated, sender=None):
+            name = self.owners.get(str(sender))
+            if name is not None:
+                handler(name, interface, changed, invalidated)
+
+        self.unwatch_all_properties()
+        self.all_properties_match = self.bus.add_signal_receiver(
+            dispatch,
+            signal_name='PropertiesChanged',
+            dbus_interface=PROPERTIES_INTERFACE,
+            path=MPRIS_PATH,
+            sender_keyword='sender'
+        )
+
+    def unwatch_all_properties(self):
+        if self.all_properties_match is not None:
+            self.all_properties_match.remove()
+            self.all_properties_match = None
+
+    def close(self):
+        """Drop signal subscriptions and cached proxies."""
+        if self.name_owner_match is not None:
+            self.name_owner_match.remove()
+            self.name_owner_match = None
+        self.unwatch_all_properties()
+        self.proxies.clear()
+        self.owners.clear()
@@ -0,0 +1,90 @@
+SEEK_TOLERANCE = 2.0  # Seconds of drift before a Seeked signal is worth an update
+
+
+def track_identity(metadata):
+    return (metadata.get('mpris:trackid'), metadata.get('xesam:title'), metadata.get('xesam:url'))
+
+
+class PlaybackClock:
+    """Position of the current track, extrapolated between MPRIS reads.
+
+    MPRIS does not signal Position as it advances, so the clock keeps the
+    last known position with the time it was read and advances it at Rate
+    while playing. Position is read once per track and Seeked signals
+    re-anchor it; the result is turned into the absolute start/end
+    timestamps Discord draws its progress bar from, so nothing has to poll
+    Position.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.track = None  # Track identity from the metadata
+        self.position = None  # Seconds at `anchor`, None while unknown
+        self.anchor = 0.0
+        self.rate = 1.0
+        self.length = None  # Seconds, None if the player doesn't say
+        self.playing = False
+
+    def reset(self):
+        self.track = None
+        self.position = None
+        self.length = None
+        self.playing = False
+
+    def is_new_track(self, metadata):
+        return track_identity(metadata) != self.track
+
+    def sync(self, properties):
+        """Take position, rate, length and status from a Player GetAll. Returns True on a new track."""
+        metadata = properties.get('Metadata', {})
+        track = track_identity(metadata)
+        new_track = track != self.track
+        self.track = track
+        length = metadata.get('mpris:length')
+        self.length = int(length) / 1e6 if length else None
+        self.set_rate(properties.get('Rate', 1.0))
+        self.set_status(properties.get('PlaybackStatus', 'Stopped'))
+        if 'Position' in properties:
+            self.seek(properties['Position'])
+        elif new_track:
+            self.seek(0)
+        return new_track
+
+    def current(self):
+        """Extrapolated position in seconds, or None."""
+        if self.position is None:
+            return None
+        if not self.playing:
+            return self.position
+        return self.position + (self.clock() - self.anchor) * self.rate
+
+    def seek(self, position):
+        """Re-anchor at a position in microseconds. Returns how far off the extrapolation was."""
+        expected = self.current()
+        self.position = max(0.0, int(position) / 1e6)
+        self.anchor = self.clock()
+        return abs(self.position - expected) if expected is not None else None
+
+    def set_status(self, status):
+        """Freeze or restart the extrapolation where it stands."""
+        self.position = self.current()
+        self.anchor = self.clock()
+        self.playing = str(status) == 'Playing'
+
+    def set_rate(self, rate):
+        self.position = self.current()
+        self.anchor = self.clock()
+        try:
+            self.rate = float(rate) if float(rate) > 0 else 1.0
+        except (TypeError, ValueError):
+            self.rate = 1.0
+
+    def timestamps(self, wall_time):
+        """(start, end) epoch seconds for Discord, (None, None) unless playing."""
+        position = self.current()
+        if not self.playing or position is None:
+            return None, None
+        # Discord's bar runs at wall clock speed, so scale by the rate
+        start = wall_time - position / self.rate
+        end = start + self.length / self.rate if self.length else None
+        return int(round(start)), int(round(end)) if end is not None else None
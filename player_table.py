@@ -0,0 +1,93 @@
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."  # As in mpris.py, which would pull in dbus
+
+
+def split_names(text):
+    """Parse a comma separated player list from the config ("spotify, mpv")."""
+    return [name.strip().lower() for name in text.split(',') if name.strip()]
+
+
+def matches(name, pattern):
+    """True if service name belongs to the player pattern.
+
+    "firefox" matches org.mpris.MediaPlayer2.firefox and its per-process
+    instances such as org.mpris.MediaPlayer2.firefox.instance_1_42.
+    """
+    name = name.lower()
+    if name == pattern:
+        return True
+    prefix = MPRIS_PREFIX.lower()
+    suffix = name[len(prefix):] if name.startswith(prefix) else name
+    return suffix == pattern or suffix.startswith(pattern + ".")
+
+
+class PlayerState:
+    def __init__(self):
+        self.status = None
+        self.metadata = None
+        self.active_at = 0.0  # Last time it started playing or changed track while playing
+
+
+class PlayerTable:
+    """PlaybackStatus/Metadata of every MPRIS player, for Auto mode.
+
+    Fed incrementally from PropertiesChanged (and one GetAll when a player
+    appears); choose() picks the player the presence should follow.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.players = {}  # service name -> PlayerState
+        self.priority = []
+        self.ignore = []
+
+    def configure(self, priority, ignore):
+        self.priority = split_names(priority)
+        self.ignore = split_names(ignore)
+
+    def update(self, name, changed):
+        """Apply changed properties. Returns True if the choice may be affected."""
+        state = self.players.get(name)
+        if state is None:
+            state = self.players[name] = PlayerState()
+        status = changed.get('PlaybackStatus', state.status)
+        metadata = changed.get('Metadata', state.metadata)
+        status = str(status) if status is not None else None
+        if status == state.status and metadata == state.metadata:
+            return False
+        if status == 'Playing' and (state.status != 'Playing' or metadata != state.metadata):
+            state.active_at = self.clock()
+        relevant = status != state.status or status == 'Playing'
+        state.status = status
+        state.metadata = metadata
+        return relevant
+
+    def remove(self, name):
+        return self.players.pop(name, None) is not None
+
+    def clear(self):
+        self.players.clear()
+
+    def ignored(self, name):
+        return any(matches(name, pattern) for pattern in self.ignore)
+
+    def rank(self, name):
+        for index, pattern in enumerate(self.priority):
+            if matches(name, pattern):
+                return index
+        return len(self.priority)
+
+    def choose(self, current=None):
+        """Highest priority Playing player, most recently active first.
+
+        When nothing plays, stay on the current player (its paused state is
+        still worth showing), else fall back to the last active one.
+        """
+        candidates = [name for name in self.players if not self.ignored(name)]
+        playing = [name for name in candidates if self.players[name].status == 'Playing']
+        if playing:
+            return min(playing, key=lambda name: (self.rank(name), -self.players[name].active_at))
+        if current in candidates:
+            return current
+        if candidates:
+            return max(candidates, key=lambda name: (self.players[name].active_at, -self.rank(name)))
+        return None
@@ -0,0 +1,179 @@
+import json
+from urllib.parse import urlparse
+
+import templates
+from player_table import MPRIS_PREFIX
+
+
+def validate_app_id(app_id):
+    """Validate Discord App ID format."""
+    try:
+        # Discord App IDs are typically 18-19 digits
+        return app_id.isdigit() and len(app_id) >= 18
+    except:
+        return False
+
+
+def validate_url(url):
+    """Validate URL format."""
+    if not url:
+        return False
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except:
+        return False
+
+
+def normalize_url(url):
+    return url if url.startswith(('http://', 'https://')) else f'https://{url}'
+
+
+def describe_track(properties):
+    """Turn MPRIS Player properties into (details, state) strings."""
+    metadata = properties.get('Metadata', {})
+
+    # Extract metadata with fallbacks
+    artist = metadata.get('xesam:artist', ['Unknown Artist'])[0]
+    title = metadata.get('xesam:title', 'Unknown Title')
+    album = metadata.get('xesam:album', 'Unknown Album')
+
+    # Get playback status
+    playback_status = properties.get('PlaybackStatus', 'Stopped')
+
+    # Format the state based on playback status
+    if playback_status == 'Playing':
+        state = f"Playing {title} from {album}"
+    elif playback_status == 'Paused':
+        state = f"Paused: {title}"
+    else:
+        state = f"Stopped: {title}"
+
+    return str(artist), state
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+def track_values(properties, position=None, length=None, player=None):
+    """Template placeholder values for the player's current track."""
+    metadata = properties.get('Metadata', {})
+    artists = metadata.get('xesam:artist') or []
+    if player and player.startswith(MPRIS_PREFIX):
+        # org.mpris.MediaPlayer2.firefox.instance_1_42 -> firefox
+        player = player[len(MPRIS_PREFIX):].split('.')[0]
+    return {
+        'artist': ", ".join(str(artist) for artist in artists),
+        'title': str(metadata.get('xesam:title', '')),
+        'album': str(metadata.get('xesam:album', '')),
+        'status': str(properties.get('PlaybackStatus', '')),
+        'position': format_time(position) if position is not None else '',
+        'length': format_time(length) if length else '',
+        'player': player or ''
+    }
+
+
+# Config fields the activity is built from
+ACTIVITY_FIELDS = (
+    'details', 'state', 'large_image', 'large_text', 'small_image', 'small_text',
+    'button1_text', 'button1_url', 'button2_text', 'button2_url'
+)
+
+
+class ActivityModel:
+    """The inputs of the activity, updated as they change rather than per update.
+
+    configure() takes the config and set_track() the player's properties;
+    each only redoes its work (URL validation, metadata parsing) for what
+    differs from last time, so build() just renders the templates.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self.urls = {}  # Button index -> normalized URL, None if invalid
+        self.properties = None
+        self.track = None  # (details, state) from the player
+        self.values = {}
+
+    def configure(self, config):
+        """Take the activity fields of a config. Returns True if any changed."""
+        changed = False
+        for field in ACTIVITY_FIELDS:
+            value = config.get(field, '')
+            if field in self.config and self.config[field] == value:
+                continue
+            self.config[field] = value
+            changed = True
+            if field.endswith('_url'):
+                self.urls[int(field[6])] = normalize_url(value.strip()) if validate_url(value) else None
+        return changed
+
+    def set_track(self, properties, player):
+        """Take the Player properties of the followed player (None for none)."""
+        if properties is self.properties:
+            return
+        self.properties = None
+        self.track = None
+        self.values = {}
+        if properties is not None:
+            # Raises on metadata the player got wrong; the track stays unknown
+            self.track = describe_track(properties)
+            self.values = track_values(properties, player=player)
+            self.properties = properties
+
+    def build(self, start=None, end=None, image=None, position=None, length=None):
+        """Build Presence.update keyword arguments. Returns (payload, warnings).
+
+        Text fields are templates rendered with the track's values. The
+        track's (details, state) pair is shown where the details or state
+        field is left empty. image (album art) replaces the configured large
+        image. end turns the elapsed time into a progress bar.
+        """
+        config = self.config
+        values = self.values
+        if self.track is not None and (position is not None or length):
+            values = dict(values, position=format_time(position) if position is not None else '',
+                          length=format_time(length) if length else '')
+
+        def text(field):
+            return templates.render(field, config[field], values)
+
+        details = text('details')
+        state = text('state')
+        if self.track is not None:
+            details = details or templates.clamp(self.track[0] or '', templates.FIELD_LIMITS['details'])
+            state = state or templates.clamp(self.track[1] or '', templates.FIELD_LIMITS['state'])
+
+        buttons = []
+        warnings = []
+        for index in (1, 2):
+            label = text(f'button{index}_text')
+            if not label:
+                continue
+            if self.urls[index]:
+                buttons.append({"label": label, "url": self.urls[index]})
+            else:
+                warnings.append(f"Invalid URL for Button {index}")
+        payload = {
+            'details': details,
+            'state': state,
+            'start': start,
+            'end': end,
+            'large_image': image or config['large_image'],
+            'large_text': text('large_text'),
+            'small_image': config['small_image'],
+            'small_text': text('small_text'),
+            'buttons': buttons if buttons else None
+        }
+        return payload, warnings
+
+
+def activity_key(payload):
+    """Hash of a payload (None clears), equal for payloads Discord would show the same."""
+    return hash(json.dumps(payload, sort_keys=True))
@@ -0,0 +1,74 @@
+import time
+
+UPDATE_INTERVAL = 15.0  # Discord accepts roughly one SET_ACTIVITY every 15 seconds
+UPDATE_BURST = 1
+
+
+class PresenceQueue:
+    """Token bucket in front of Presence.update that only keeps the newest payload.
+
+    A payload is the keyword arguments for Presence.update, or None to clear
+    the presence. Payloads submitted while no token is available wait in a
+    single slot; a newer payload replaces the waiting one.
+    """
+
+    def __init__(self, interval=UPDATE_INTERVAL, burst=UPDATE_BURST, clock=time.monotonic):
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.refilled_at = clock()
+        self.pending = None
+        self.has_pending = False
+        self.counters = {'submitted': 0, 'sent': 0, 'coalesced': 0, 'deferred': 0}
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.refilled_at) / self.interval)
+        self.refilled_at = now
+
+    def submit(self, payload):
+        """Offer a payload. Returns True if the caller may send it right away."""
+        self.counters['submitted'] += 1
+        self._refill()
+        if self.has_pending:
+            # Whatever was waiting is stale now
+            self.counters['coalesced'] += 1
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.pending = None
+            self.has_pending = False
+            self.counters['sent'] += 1
+            return True
+        if not self.has_pending:
+            self.counters['deferred'] += 1
+        self.pending = payload
+        self.has_pending = True
+        return False
+
+    def take(self):
+        """Return (True, payload) if the waiting payload may be sent now."""
+        if not self.has_pending:
+            return False, None
+        self._refill()
+        if self.tokens < 1:
+            return False, None
+        self.tokens -= 1
+        payload = self.pending
+        self.pending = None
+        self.has_pending = False
+        self.counters['sent'] += 1
+        return True, payload
+
+    def discard(self):
+        """Drop the waiting payload, e.g. after disconnecting."""
+        self.pending = None
+        self.has_pending = False
+
+    def delay(self):
+        """Seconds until the next token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) * self.interval)
+
+    def summary(self):
+        return ", ".join(f"{name}: {count}" for name, count in self.counters.items())
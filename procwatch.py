@@ -0,0 +1,250 @@
+import os
+import re
+import time
+
+from logring import log
+from metrics import registry
+
+PROC = "/proc"
+COMM_LENGTH = 15  # The kernel truncates /proc/<pid>/comm to this
+# Presence fields a rule may set
+RULE_FIELDS = ('details', 'state', 'large_image', 'large_text', 'small_image', 'small_text')
+
+
+class Rule:
+    def __init__(self, index, spec):
+        self.index = index  # Earlier rules win when several processes match
+        name = spec.get('process', '')
+        pattern = spec.get('cmdline', '')
+        if not isinstance(name, str) or not isinstance(pattern, str):
+            raise ValueError("process and cmdline must be strings")
+        if not name and not pattern:
+            raise ValueError("needs a process name or a cmdline pattern")
+        self.name = name.lower()[:COMM_LENGTH]
+        self.pattern = pattern
+        try:
+            self.cmdline = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise ValueError(f"bad cmdline pattern: {e}")
+        self.fields = {field: spec[field] for field in RULE_FIELDS if isinstance(spec.get(field), str)}
+        self.elapsed = bool(spec.get('elapsed', False))
+        self.label = name or pattern
+
+
+def compile_rules(specs):
+    """Rules from the config's process_rules list. Returns (rules, errors)."""
+    rules = []
+    errors = []
+    for index, spec in enumerate(specs if isinstance(specs, list) else []):
+        if not isinstance(spec, dict):
+            errors.append(f"Process rule {index + 1}: not an object")
+            continue
+        try:
+            rules.append(Rule(index, spec))
+        except ValueError as e:
+            errors.append(f"Process rule {index + 1}: {e}")
+    return rules, errors
+
+
+class RuleIndex:
+    """Rules looked up by process name, so a new process costs one dict lookup.
+
+    Rules that only have a cmdline pattern are folded into one regex that
+    screens the command line before the rules are tried one by one; the
+    command line is only read when a rule could need it.
+    """
+
+    def __init__(self, rules):
+        self.by_name = {}  # comm -> rules for that process, in order
+        self.anywhere = [rule for rule in rules if not rule.name]
+        for rule in rules:
+            if rule.name:
+                self.by_name.setdefault(rule.name, []).append(rule)
+        self.screen = re.compile("|".join(f"(?:{rule.pattern})" for rule in self.anywhere)) \
+            if self.anywhere else None
+
+    def needs_cmdline(self, comm):
+        if self.screen is not None:
+            return True
+        return any(rule.cmdline is not None for rule in self.by_name.get(comm, ()))
+
+    def match(self, comm, cmdline):
+        """First rule matching a process, or None. cmdline may be None if not needed."""
+        best = None
+        for rule in self.by_name.get(comm, ()):
+            if rule.cmdline is None or (cmdline is not None and rule.cmdline.search(cmdline)):
+                best = rule
+                break
+        if self.screen is not None and cmdline and self.screen.search(cmdline):
+            for rule in self.anywhere:
+                if best is not None and rule.index > best.index:
+                    break
+                if rule.cmdline.search(cmdline):
+                    best = rule
+                    break
+        return best
+
+
+class Match:
+    def __init__(self, rule, pid, started):
+        self.rule = rule
+        self.pid = pid
+        self.started = started  # Epoch seconds the process started
+        self.pidfd = None
+
+
+class ProcessWatcher:
+    """Follows running processes that match the process rules.
+
+    scan() (run from the scheduler) lists /proc and only looks at PIDs it
+    hasn't seen before: their name is looked up in the rule index and the
+    command line is read only if a rule needs it. Matched processes are
+    watched through a pidfd, so their exit is noticed right away without
+    polling; without pidfd support the next scan notices it. So the cost
+    of a scan is one directory listing and a set difference, however many
+    processes are running.
+
+    on_changed() is called when the process the presence should show changes.
+    """
+
+    def __init__(self, loop, proc=PROC):
+        self.loop = loop
+        self.proc = proc
+        self.index = RuleIndex([])
+        self.rules = []
+        self.known = set()  # PIDs (as /proc names) already looked at
+        self.matches = {}  # pid -> Match
+        self.active = None
+        self.boot_time = None
+        self.scans = 0
+        self.checked = 0
+        self.on_changed = None
+
+    @property
+    def available(self):
+        return os.path.isdir(self.proc)
+
+    def configure(self, specs):
+        """Use a new rule table. Returns error messages for rules that were left out."""
+        self.rules, errors = compile_rules(specs)
+        self.index = RuleIndex(self.rules)
+        # Everything has to be matched again
+        for match in list(self.matches.values()):
+            self._forget(match)
+        self.known.clear()
+        self._choose()
+        return errors
+
+    def scan(self):
+        """Match processes started since the last scan and drop the ones that exited."""
+        if not self.rules:
+            return
+        try:
+            with registry.timer('process_scan_seconds'):
+                names = {name for name in os.listdir(self.proc) if name.isdigit()}
+                for name in self.known - names:
+                    match = self.matches.get(int(name))
+                    if match is not None:
+                        self._forget(match)
+                new = names - self.known
+                self.known = names
+                for name in new:
+                    self._check(int(name))
+        except OSError as e:
+            log(f"Error listing processes: {e}")
+            return
+        self.scans += 1
+        self.checked += len(new)
+        self._choose()
+
+    def fields(self):
+        """Config fields the active process sets, empty without one."""
+        if self.active is None:
+            return {}
+        fields = dict(self.active.rule.fields)
+        if self.active.rule.elapsed and self.active.started:
+            fields['timestamp'] = 'Custom Timestamp'
+            fields['custom_timestamp'] = int(self.active.started)
+        return fields
+
+    def stats(self):
+        return {
+            "rules": len(self.rules),
+            "scans": self.scans,
+            "checked": self.checked,
+            "running": sorted(f"{match.rule.label} ({pid})" for pid, match in self.matches.items()),
+            "active": self.active.rule.label if self.active else None
+        }
+
+    def close(self):
+        for match in list(self.matches.values()):
+            self._forget(match)
+        self.known.clear()
+
+    def _read(self, pid, name):
+        with open(f"{self.proc}/{pid}/{name}", 'rb') as f:
+            return f.read()
+
+    def _check(self, pid):
+        try:
+            comm = self._read(pid, "comm").decode('utf-8', 'replace').strip().lower()
+            cmdline = None
+            if self.index.needs_cmdline(comm):
+                cmdline = self._read(pid, "cmdline").replace(b"\0", b" ").decode('utf-8', 'replace').strip()
+            rule = self.index.match(comm, cmdline)
+        except OSError:
+            return  # Exited already, or not ours to read
+        if rule is not None:
+            match = Match(rule, pid, self._start_time(pid))
+            self.matches[pid] = match
+            self._watch(match)
+
+    def _start_time(self, pid):
+        """Epoch seconds a process started, from its stat and the boot time."""
+        try:
+            if self.boot_time is None:
+                with open(f"{self.proc}/stat") as f:
+                    for line in f:
+                        if line.startswith("btime "):
+                            self.boot_time = int(line.split()[1])
+            stat = self._read(pid, "stat").decode('utf-8', 'replace')
+            # The name in parentheses may contain spaces
+            ticks = int(stat.rsplit(")", 1)[1].split()[19])
+            return self.boot_time + ticks / os.sysconf('SC_CLK_TCK')
+        except (OSError, ValueError, IndexError, TypeError):
+            return time.time()
+
+    def _watch(self, match):
+        if not hasattr(os, 'pidfd_open'):
+            return
+        try:
+            match.pidfd = os.pidfd_open(match.pid)
+        except OSError:
+            return  # Old kernel; scans notice the exit
+        self.loop.add_reader(match.pidfd, self._on_exit, match)
+
+    def _on_exit(self, match):
+        if self.matches.get(match.pid) is match:
+            self._forget(match)
+            # The PID may be reused, look at it afresh
+            self.known.discard(str(match.pid))
+            self._choose()
+
+    def _forget(self, match):
+        self.matches.pop(match.pid, None)
+        if match.pidfd is not None:
+            self.loop.remove_reader(match.pidfd)
+            os.close(match.pidfd)
+            match.pidfd = None
+
+    def _choose(self):
+        """Show the process of the earliest rule, the most recently started one on a tie."""
+        best = None
+        for match in self.matches.values():
+            if best is None or (match.rule.index, -match.started) < (best.rule.index, -best.started):
+                best = match
+        if best is self.active:
+            return
+        self.active = best
+        if self.on_changed:
+            self.on_changed()
@@ -0,0 +1,126 @@
+import math
+
+from logring import log
+from metrics import registry
+
+ALIGN = 1.0  # Due times are rounded up to this grid (seconds) so tasks share wakeups
+
+
+class Task:
+    def __init__(self, name, callback, interval, idle_interval):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.due = 0.0
+        self.runs = 0
+
+
+class Scheduler:
+    """Runs every periodic task from a single loop timer.
+
+    Due times sit on a shared grid, so tasks that fall due together run in
+    one wakeup. While idle (see set_idle) tasks with an idle_interval are
+    stretched to it; leaving idle pulls them back to their normal interval.
+    """
+
+    def __init__(self, loop, align=ALIGN):
+        self.loop = loop
+        self.align = align
+        self.tasks = {}  # name -> Task
+        self.handle = None
+        self.armed_for = None
+        self.idle = False
+        self.wakeups = 0
+
+    def add(self, name, callback, interval, idle_interval=None):
+        """Run callback every interval seconds (idle_interval while idle), replacing a task of that name."""
+        task = Task(name, callback, interval, idle_interval)
+        task.due = self._next_due(task)
+        self.tasks[name] = task
+        self._arm()
+
+    def remove(self, name):
+        if self.tasks.pop(name, None) is not None:
+            self._arm()
+
+    def set_idle(self, idle):
+        if idle == self.idle:
+            return
+        self.idle = idle
+        if not idle:
+            # Snap back: nothing waits longer than its active interval
+            for task in self.tasks.values():
+                task.due = min(task.due, self._next_due(task))
+            self._arm()
+
+    def current_interval(self, task):
+        if self.idle and task.idle_interval:
+            return task.idle_interval
+        return task.interval
+
+    def stats(self):
+        return {
+            "wakeups": self.wakeups,
+            "idle": self.idle,
+            "tasks": {
+                name: {"interval": self.current_interval(task), "runs": task.runs}
+                for name, task in self.tasks.items()
+            }
+        }
+
+    def describe(self):
+        """One line for the Diagnostics panel."""
+        runs = ", ".join(f"{name} {task.runs}" for name, task in sorted(self.tasks.items()))
+        state = "idle" if self.idle else "active"
+        return f"Scheduler: {self.wakeups} wakeups ({state})" + (f"; {runs}" if runs else "")
+
+    def close(self):
+        self.tasks.clear()
+        self._cancel()
+
+    def _next_due(self, task, after=None):
+        if after is None:
+            after = self.loop.time()
+        due = after + self.current_interval(task)
+        # Tolerate float error so a due time already on the grid stays put
+        return math.ceil(due / self.align - 1e-9) * self.align
+
+    def _arm(self):
+        if not self.tasks:
+            self._cancel()
+            return
+        due = min(task.due for task in self.tasks.values())
+        if self.handle is not None and self.armed_for == due:
+            return
+        self._cancel()
+        self.armed_for = due
+        self.handle = self.loop.call_later(max(0.0, due - self.loop.time()), self._wake)
+
+    def _cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+            self.armed_for = None
+
+    def _wake(self):
+        self.handle = None
+        self.armed_for = None
+        self.wakeups += 1
+        registry.inc('scheduler_wakeups')
+        # Timers may fire a little early, allow for it
+        now = self.loop.time() + 0.005
+        for task in list(self.tasks.values()):
+            if task.due > now:
+                continue
+            task.runs += 1
+            try:
+                task.callback()
+            except Exception as e:
+                log(f"Error in scheduled task {task.name}: {e}")
+            # The callback may have removed or replaced its own task
+            if self.tasks.get(task.name) is task:
+                # Keep the cadence from the due time, unless we fell behind
+                due = self._next_due(task, task.due)
+                task.due = due if due > now else self._next_due(task)
+        self._arm()
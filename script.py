@@ -1,51 +1,498 @@
 import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # The daemon never loads Qt
+    from headless import main
+    sys.exit(main())
+
+import os
 import time
-import json
 from datetime import datetime
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton,
-    QComboBox, QDateTimeEdit, QStatusBar, QSystemTrayIcon, QMenu, QMessageBox
+    QComboBox, QDateTimeEdit, QStatusBar, QSystemTrayIcon, QMenu, QMessageBox, QCheckBox, QPlainTextEdit
+)
+from PyQt6.QtCore import (
+    QTimer, Qt, QSize, QObject, QSocketNotifier, QDateTime, QFileSystemWatcher, pyqtSignal
 )
-from PyQt6.QtCore import QTimer, Qt, QSize
 from PyQt6.QtGui import QIcon, QPixmap, QKeySequence, QShortcut
-from pypresence import Presence
-import dbus
-from urllib.parse import urlparse
-import os
+from config_store import TIMESTAMP_TYPES, ConfigStore, validate_config
+from control import ControlServer
+from logring import log, log_file_path, ring
+from metrics import MetricsServer, metrics_port, registry
+from service import PresenceService
+from templates import FIELD_LIMITS, PLACEHOLDERS, validate as validate_template
 import signal
 
-CONFIG_FILE = "config.json"
+CONFIG_SAVE_DELAY = 2000  # ms of quiet before pending config changes are written
+CONFIG_RELOAD_DELAY = 300  # ms of quiet after config.json changed on disk before it is read
+DIAGNOSTICS_INTERVAL = 1.0  # Seconds between Diagnostics panel refreshes
+LOG_VIEW_INTERVAL = 1.0  # Seconds between log viewer refreshes
+TEMPLATE_HELP = (
+    "Placeholders: " + " ".join(f"{{{name}}}" for name in PLACEHOLDERS) +
+    "\n{? from {album}} is left out unless its placeholders have values"
+)
+
+# Form defaults for fields the config file doesn't have yet
+DEFAULT_CONFIG = {
+    'app_id': '',
+    'details': '',
+    'state': '',
+    'timestamp': 'None',
+    'large_image': 'avatar',
+    'large_text': '',
+    'small_image': '',
+    'small_text': '',
+    'button1_text': '',
+    'button1_url': '',
+    'button2_text': '',
+    'button2_url': '',
+    'player_priority': '',
+    'player_ignore': '',
+    'album_art': True
+}
+
+
+class TimerHandle:
+    """Cancellable handle returned by QtLoop.call_later."""
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer.deleteLater()
+            self.timer = None
+
+class QtLoop(QObject):
+    """asyncio-style timers and fd watches on top of the Qt event loop."""
+    call_requested = pyqtSignal(object, object)
 
-class CustomRPCApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.rpc_connected = False
-        self.rpc = None
-        self.session_start_time = None
-        self.refresh_timer = QTimer()
-        self.refresh_timer.setInterval(5000)  # 5 seconds
-        self.refresh_timer.timeout.connect(self.auto_update_presence)
-        
-        # Add MPRIS refresh timer
-        self.mpris_refresh_timer = QTimer()
-        self.mpris_refresh_timer.setInterval(5000)  # 5 seconds
-        self.mpris_refresh_timer.timeout.connect(self.refresh_mpris_players)
-        self.current_mpris_players = set()  # Track current MPRIS players
-        
+        self.readers = {}
+        self.writers = {}
+        # Emitted from other threads, delivered queued on the GUI thread
+        self.call_requested.connect(self._run_call)
+
+    def time(self):
+        return time.monotonic()
+
+    def call_later(self, delay, callback, *args):
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        handle = TimerHandle(timer)
+        timer.timeout.connect(lambda: self._fire(handle, callback, args))
+        timer.start(max(0, int(delay * 1000)))
+        return handle
+
+    def _fire(self, handle, callback, args):
+        handle.cancel()
+        with registry.timer('timer_tick_seconds'):
+            callback(*args)
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.call_requested.emit(callback, args)
+
+    def _run_call(self, callback, args):
+        callback(*args)
+
+    def add_reader(self, fd, callback, *args):
+        self._watch(self.readers, fd, QSocketNotifier.Type.Read, callback, args)
+
+    def remove_reader(self, fd):
+        return self._unwatch(self.readers, fd)
+
+    def add_writer(self, fd, callback, *args):
+        self._watch(self.writers, fd, QSocketNotifier.Type.Write, callback, args)
+
+    def remove_writer(self, fd):
+        return self._unwatch(self.writers, fd)
+
+    def _watch(self, notifiers, fd, kind, callback, args):
+        self._unwatch(notifiers, fd)
+        notifier = QSocketNotifier(fd, kind, self)
+        notifier.activated.connect(lambda *_: callback(*args))
+        notifiers[fd] = notifier
+
+    def _unwatch(self, notifiers, fd):
+        notifier = notifiers.pop(fd, None)
+        if notifier is None:
+            return False
+        notifier.setEnabled(False)
+        notifier.deleteLater()
+        return True
+
+class PresenceSignals(QObject):
+    """Re-emits PresenceService callbacks as Qt signals."""
+    state_changed = pyqtSignal(str, str)  # connection state, detail
+    clients_changed = pyqtSignal()
+    result = pyqtSignal(bool, str)  # cleared, error ("" on success)
+    queued = pyqtSignal()
+    warning = pyqtSignal(str)
+    player_added = pyqtSignal(str)
+    player_removed = pyqtSignal(str)
+    player_selected = pyqtSignal(str)  # "" for no player
+
+    def __init__(self, service):
+        super().__init__()
+        service.on_state_changed = self.state_changed.emit
+        service.on_clients_changed = self.clients_changed.emit
+        service.on_result = lambda cleared, error: self.result.emit(cleared, error or "")
+        service.on_queued = self.queued.emit
+        service.on_warning = self.warning.emit
+        service.on_player_added = self.player_added.emit
+        service.on_player_removed = self.player_removed.emit
+        service.on_player_selected = lambda name: self.player_selected.emit(name or "")
+
+class LogViewer(QPlainTextEdit):
+    """Read-only window over the log ring, only refreshed while it is open."""
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+        self.changes = -1
+        self.setWindowTitle("Custom Rich Presence - Log")
+        self.setReadOnly(True)
+        self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.setStyleSheet("font-family: monospace; font-size: 10px;")
+        self.resize(640, 360)
+
+    def open(self):
+        self.refresh()
+        self.scheduler.add('log_viewer', self.refresh, LOG_VIEW_INTERVAL)
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def refresh(self):
+        if ring.changes == self.changes:
+            return
+        self.changes = ring.changes
+        self.setPlainText("\n".join(ring.lines()))
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def closeEvent(self, event):
+        self.scheduler.remove('log_viewer')
+        event.accept()
+
+class TrayApp(QObject):
+    """Everything that stays resident while the app sits in the tray.
+
+    Config, presence service, sockets and the tray icon live here; the
+    window (CustomRPCApp) is only a view of them. Minimizing to the tray
+    destroys the window and "Show" builds a new one from the config store
+    and the service state, so no widgets are kept around in the tray.
+    """
+
+    def __init__(self, show_window=True):
+        super().__init__()
         # Set up signal handlers for clean exit
         signal.signal(signal.SIGINT, self.handle_sigint)
         signal.signal(signal.SIGTERM, self.handle_sigint)
-        
-        self.init_ui()
+        self.window = None
+        self.log_viewer = None
+        self.quitting = False
+
+        # Optional log file, off unless DISCORDCRP_LOG_FILE is set
+        if log_file_path():
+            try:
+                ring.open_file(log_file_path())
+            except OSError as e:
+                log(f"Log file unavailable: {e}")
+
+        # Config changes are written once edits settle, not on every update
+        self.config_store = ConfigStore()
+        self.config_save_timer = QTimer(self)
+        self.config_save_timer.setSingleShot(True)
+        self.config_save_timer.setInterval(CONFIG_SAVE_DELAY)
+        self.config_save_timer.timeout.connect(self.save_config)
+
+        # Presence logic lives in PresenceService; Discord IPC runs on the
+        # Qt event loop and never blocks the GUI
+        self.loop = QtLoop()
+        self.service = PresenceService(self.loop, self.config_store)
+        self.presence_signals = PresenceSignals(self.service)
+        self.presence_signals.state_changed.connect(self.on_connection_state_changed)
+        self.presence_signals.result.connect(self.on_update_result)
+        self.connection_state = "disconnected"
+        self.state_detail = ""
+        self.connection_detail = "Disconnected"
+        self.mpris_started = False  # Players are listed after the first paint
+
+        loaded = self.load_config()
         self.setup_system_tray()
-        self.load_config()
-        self.mpris_refresh_timer.start()  # Start MPRIS refresh timer
+
+        # Edits to config.json from elsewhere are merged in; a burst of
+        # events (editors, atomic renames) is read once it settles
+        self.config_reload_timer = QTimer(self)
+        self.config_reload_timer.setSingleShot(True)
+        self.config_reload_timer.setInterval(CONFIG_RELOAD_DELAY)
+        self.config_reload_timer.timeout.connect(self.reload_config)
+        self.config_watcher = QFileSystemWatcher(self)
+        self.config_watcher.fileChanged.connect(self.on_config_file_changed)
+        self.config_watcher.directoryChanged.connect(self.on_config_file_changed)
+        self.watch_config()
+
+        # Scripts and editors drive the presence through a local socket
+        self.control = ControlServer(self.loop, self.service)
+        try:
+            self.control.start()
+        except OSError as e:
+            log(f"Control socket unavailable: {e}")
+
+        # Optional Prometheus endpoint, off unless DISCORDCRP_METRICS_PORT is set
+        self.metrics_server = None
+        if metrics_port():
+            self.metrics_server = MetricsServer(self.loop, metrics_port())
+            try:
+                self.metrics_server.start()
+            except OSError as e:
+                log(f"Metrics endpoint unavailable: {e}")
+                self.metrics_server = None
+
+        if show_window:
+            self.show_window()
+            if loaded:
+                self.show_message(loaded, 2000)
+        else:
+            # Nothing to paint first
+            QTimer.singleShot(0, self.start_mpris)
+
+        # Push the last presence while the window paints; the handshake runs
+        # on the event loop and MPRIS track info follows once players are listed
+        if self.config_store.values.get('connected'):
+            error = self.service.connect()
+            if error:
+                self.show_message(error, 3000)
 
     def handle_sigint(self, signum, frame):
         """Handle Ctrl+C gracefully"""
         self.close_application()
         QApplication.quit()
 
+    def show_message(self, message, timeout=0):
+        """Status bar message, dropped while there is no window."""
+        if self.window is not None:
+            self.window.status_bar.showMessage(message, timeout)
+
+    def show_window(self):
+        """Show the window, building it from the current state if it was released."""
+        if self.window is None:
+            self.window = CustomRPCApp(self)
+        self.window.show()
+        self.window.raise_()
+        self.window.activateWindow()
+
+    def show_log(self):
+        """Open the log viewer; it is kept after the first use, like the tray menu."""
+        if self.log_viewer is None:
+            self.log_viewer = LogViewer(self.service.scheduler)
+        self.log_viewer.open()
+
+    def hide_to_tray(self):
+        """Hide and destroy the window; the tray icon and presence keep running."""
+        if self.window is None:
+            return
+        self.save_config()
+        self.window.hide()
+        self.release_window()
+        self.tray_icon.showMessage(
+            "Custom Rich Presence",
+            "Application minimized to tray. Right-click the tray icon to show or quit.",
+            QSystemTrayIcon.MessageIcon.Information,
+            2000
+        )
+
+    def release_window(self):
+        self.service.scheduler.remove('diagnostics')
+        self.window.deleteLater()
+        self.window = None
+
+    def start_mpris(self):
+        """Take one snapshot of the MPRIS players and watch the bus for changes."""
+        if self.mpris_started:
+            return
+        self.mpris_started = True
+        try:
+            if self.service.mpris is None:
+                # dbus is imported here rather than at startup; bus signals are
+                # dispatched from the GLib loop that Qt runs on Linux
+                from dbus.mainloop.glib import DBusGMainLoop
+                DBusGMainLoop(set_as_default=True)
+            self.service.start_mpris()
+        except Exception as e:
+            log(f"Failed to query MPRIS players: {e}")
+            return
+        if self.config_store.values.get('player_auto'):
+            try:
+                self.service.set_auto(True)
+            except Exception as e:
+                log(f"Error enabling Auto mode: {e}")
+        if self.window is not None:
+            self.window.fill_players()
+
+    def on_connection_state_changed(self, state, detail):
+        if state == "connected":
+            # Reconnect on the next start
+            self.set_config_field('connected', True)
+        elif state == "backoff":
+            log(f"Discord connection lost: {detail}")
+        elif state == "disconnected" and detail:
+            self.set_config_field('connected', False)
+            log(f"Error connecting to Discord: {detail}")
+        self.connection_state = state
+        self.state_detail = detail
+        self.connection_detail = detail or state.capitalize()
+
+    def on_update_result(self, cleared, error):
+        if error:
+            action = "clearing" if cleared else "updating"
+            log(f"Error {action} presence: {error}")
+
+    def set_config_field(self, field, value):
+        """Record an edit and (re)start the save debounce window."""
+        if self.config_store.set(field, value):
+            self.config_save_timer.start()
+
+    def save_config(self):
+        """Write pending configuration changes to file."""
+        self.config_save_timer.stop()
+        if self.config_store.dirty and self.config_store.changed_on_disk():
+            # Merge an edit made elsewhere first instead of overwriting it
+            self.reload_config()
+        try:
+            if self.config_store.flush():
+                self.show_message("Configuration saved", 2000)
+                self.watch_config()
+        except ValueError:
+            self.show_message("Invalid configuration data", 3000)
+        except Exception as e:
+            self.show_message(f"Error saving configuration: {str(e)}", 5000)
+            log(f"Error saving configuration: {e}")
+
+    def watch_config(self):
+        """Watch config.json and its directory; renames over the file drop the file's watch."""
+        path = self.config_store.path
+        watched = self.config_watcher.files() + self.config_watcher.directories()
+        for target in (os.path.dirname(path), path):
+            if os.path.exists(target) and target not in watched:
+                self.config_watcher.addPath(target)
+
+    def on_config_file_changed(self, path):
+        self.watch_config()
+        self.config_reload_timer.start()
+
+    def reload_config(self):
+        """Apply the fields changed in config.json since it was last read or written here."""
+        self.config_reload_timer.stop()
+        try:
+            changed, conflicts = self.service.reload_config()
+        except (OSError, ValueError) as e:
+            log(f"Error reloading configuration: {e}")
+            self.show_message(f"Error reloading configuration: {e}", 3000)
+            return
+        if conflicts:
+            self.show_message(f"Kept unsaved edits to {', '.join(conflicts)} over the file", 3000)
+        elif changed:
+            self.show_message("Configuration reloaded", 2000)
+        if changed and self.window is not None:
+            self.window.fill_from_model()
+
+    def load_config(self):
+        """Load configuration from file. Returns a status message or None."""
+        message = None
+        try:
+            config = self.config_store.load()
+            if config is not None:
+                message = "Configuration loaded" if validate_config(config) else "Invalid configuration file"
+        except Exception as e:
+            message = f"Error loading configuration: {str(e)}"
+            log(f"Error loading configuration: {e}")
+        # Fields missing from the file start at the form defaults
+        self.config_store.seed(dict(DEFAULT_CONFIG, custom_timestamp=int(time.time())))
+        self.service.configure_processes()
+        return message
+
+    def setup_system_tray(self):
+        """Set up system tray icon with proper icon"""
+        self.tray_icon = QSystemTrayIcon(self)
+
+        # Create a simple icon (you can replace this with your own icon file)
+        icon_pixmap = QPixmap(32, 32)
+        icon_pixmap.fill(Qt.GlobalColor.blue)  # Temporary blue square icon
+        self.tray_icon.setIcon(QIcon(icon_pixmap))
+
+        self.tray_icon.setToolTip("Custom Rich Presence")
+
+        # Create tray menu
+        self.tray_menu = QMenu()
+        show_action = self.tray_menu.addAction("Show")
+        show_action.triggered.connect(self.show_window)
+        log_action = self.tray_menu.addAction("Log")
+        log_action.triggered.connect(self.show_log)
+        quit_action = self.tray_menu.addAction("Quit")
+        quit_action.triggered.connect(self.close_application)
+
+        self.tray_icon.setContextMenu(self.tray_menu)
+        self.tray_icon.show()
+
+    def close_application(self):
+        """Clean up and close the application"""
+        # Flush edits still inside the debounce window
+        self.save_config()
+        self.config_reload_timer.stop()
+        self.quitting = True
+        try:
+            if self.window is not None:
+                self.window.hide()
+                self.release_window()
+            if self.log_viewer is not None:
+                self.log_viewer.close()
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            self.control.close()
+            self.service.close()
+            self.tray_icon.hide()
+            ring.close()
+            QApplication.quit()
+        except Exception as e:
+            log(f"Error during cleanup: {e}")
+            QApplication.quit()
+
+class CustomRPCApp(QMainWindow):
+    """The main window, a view of TrayApp's config store and presence service."""
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+        self.config_store = app.config_store
+        self.service = app.service
+        self.current_mpris_players = set()  # Track current MPRIS players
+        self.presence_cleared = False
+
+        self.init_ui()
+        self.fill_from_model()
+        self.bind_config_fields()
+
+        # Slots are methods so the connections go away with the window
+        signals = app.presence_signals
+        signals.state_changed.connect(self.on_connection_state_changed)
+        signals.clients_changed.connect(self.on_clients_changed)
+        signals.result.connect(self.on_update_result)
+        signals.queued.connect(self.on_update_queued)
+        signals.warning.connect(self.on_warning)
+        signals.player_added.connect(self.on_mpris_player_added)
+        signals.player_removed.connect(self.on_mpris_player_removed)
+        signals.player_selected.connect(self.on_mpris_player_selected)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.app.mpris_started:
+            # The first frame is on screen, D-Bus no longer delays it
+            QTimer.singleShot(0, self.app.start_mpris)
+
     def init_ui(self):
         self.setWindowTitle("Custom Rich Presence")
         self.setGeometry(100, 100, 400, 600)
@@ -63,12 +510,6 @@ class CustomRPCApp(QMainWindow):
         # Add keyboard shortcuts
         self.setup_shortcuts()
 
-        # Auto-save timer
-        self.auto_save_timer = QTimer()
-        self.auto_save_timer.setInterval(30000)  # 30 seconds
-        self.auto_save_timer.timeout.connect(self.auto_save)
-        self.auto_save_timer.start()
-
         # Create form layout with better organization
         form_layout = QVBoxLayout()
         form_layout.setSpacing(10)
@@ -105,7 +546,8 @@ class CustomRPCApp(QMainWindow):
         timestamp_group = QVBoxLayout()
         self.timestamp_label = QLabel("Timestamp:")
         self.timestamp_combo = QComboBox()
-        self.timestamp_combo.addItems(["None", "Current Time", "Custom Timestamp"])
+        self.timestamp_combo.addItems(TIMESTAMP_TYPES)
+        self.timestamp_combo.setItemData(3, "Elapsed and remaining time of the MPRIS track", Qt.ItemDataRole.ToolTipRole)
         self.timestamp_combo.currentIndexChanged.connect(self.toggle_custom_timestamp)
         timestamp_group.addWidget(self.timestamp_label)
         timestamp_group.addWidget(self.timestamp_combo)
@@ -121,11 +563,21 @@ class CustomRPCApp(QMainWindow):
         mpris_group = QVBoxLayout()
         self.mpris_label = QLabel("Use MPRIS Player:")
         self.mpris_combo = QComboBox()
-        self.mpris_combo.addItem("None")
-        self.populate_mpris_players()
-        self.mpris_combo.currentIndexChanged.connect(self.toggle_auto_refresh)
+        self.mpris_combo.addItems(["None", "Auto"])
+        self.mpris_combo.setItemData(1, "Follow whichever player is playing", Qt.ItemDataRole.ToolTipRole)
+        self.mpris_combo.currentIndexChanged.connect(self.bind_mpris_player)
         mpris_group.addWidget(self.mpris_label)
         mpris_group.addWidget(self.mpris_combo)
+
+        # Auto mode settings, only shown while Auto is selected
+        self.player_priority_input = QLineEdit()
+        self.player_priority_input.setPlaceholderText("Prefer players, e.g. spotify, mpv")
+        self.player_priority_input.hide()
+        mpris_group.addWidget(self.player_priority_input)
+        self.player_ignore_input = QLineEdit()
+        self.player_ignore_input.setPlaceholderText("Ignore players, e.g. firefox, chromium")
+        self.player_ignore_input.hide()
+        mpris_group.addWidget(self.player_ignore_input)
         form_layout.addLayout(mpris_group)
 
         # Images Section
@@ -136,6 +588,11 @@ class CustomRPCApp(QMainWindow):
         images_group.addWidget(self.large_image_label)
         images_group.addWidget(self.large_image_input)
 
+        self.album_art_checkbox = QCheckBox("Use album art from the MPRIS player")
+        self.album_art_checkbox.setChecked(True)
+        self.album_art_checkbox.setToolTip("Replaces the large image while the player provides cover art")
+        images_group.addWidget(self.album_art_checkbox)
+
         self.large_image_text_label = QLabel("Large Image Hover Text:")
         self.large_image_text_input = QLineEdit()
         images_group.addWidget(self.large_image_text_label)
@@ -186,6 +643,21 @@ class CustomRPCApp(QMainWindow):
         self.status_indicator.setStyleSheet("color: #f44336;")
         form_layout.addWidget(self.status_indicator)
 
+        # Diagnostics Section, only refreshed while it is open
+        self.diagnostics_button = QPushButton("Show Diagnostics")
+        self.diagnostics_button.setCheckable(True)
+        self.diagnostics_button.toggled.connect(self.toggle_diagnostics)
+        form_layout.addWidget(self.diagnostics_button)
+
+        self.diagnostics_label = QLabel()
+        self.diagnostics_label.setStyleSheet("font-family: monospace; font-size: 10px;")
+        self.diagnostics_label.hide()
+        form_layout.addWidget(self.diagnostics_label)
+
+        self.log_button = QPushButton("Show Log")
+        self.log_button.clicked.connect(self.app.show_log)
+        form_layout.addWidget(self.log_button)
+
         layout.addLayout(form_layout)
 
     def setup_shortcuts(self):
@@ -200,70 +672,98 @@ class CustomRPCApp(QMainWindow):
         
         # Save shortcut
         save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
-        save_shortcut.activated.connect(self.save_config)
+        save_shortcut.activated.connect(self.app.save_config)
         
         # Quit shortcut
         quit_shortcut = QShortcut(QKeySequence("Ctrl+Q"), self)
-        quit_shortcut.activated.connect(self.close_application)
+        quit_shortcut.activated.connect(self.app.close_application)
         
         # Clear presence shortcut
         clear_shortcut = QShortcut(QKeySequence("Ctrl+X"), self)
         clear_shortcut.activated.connect(self.clear_presence)
 
-    def auto_save(self):
-        """Auto-save configuration periodically"""
-        if self.rpc_connected:
-            self.save_config()
-            self.status_bar.showMessage("Configuration auto-saved", 2000)
-
     def toggle_connection(self):
         """Toggle Discord connection with visual feedback"""
-        app_id = self.app_id_input.text().strip()
-        if not app_id:
-            self.status_bar.showMessage("Please enter a Discord App ID", 3000)
+        if self.service.connection.state != "disconnected":
+            self.service.disconnect()
+            self.app.set_config_field('connected', False)
+            self.status_bar.showMessage("Disconnected from Discord", 3000)
             return
 
-        if not self.validate_app_id(app_id):
-            self.status_bar.showMessage("Invalid Discord App ID format", 3000)
-            return
+        error = self.service.connect()
+        if error:
+            self.status_bar.showMessage(error, 3000)
+
+    def on_connection_state_changed(self, state, detail):
+        """Reflect the connection supervisor's state in the button and status label."""
+        self.show_connection_state(state, detail)
+        if state == "connected":
+            self.status_bar.showMessage("Connected to Discord", 3000)
+        elif state == "backoff":
+            self.status_bar.showMessage(f"Discord unavailable: {detail}", 5000)
+        elif state == "disconnected" and detail:
+            self.status_bar.showMessage(f"Connection failed: {detail}", 5000)
+
+    def show_connection_state(self, state, detail):
+        if state == "connected":
+            self.connect_button.setText("Connected to Discord (Ctrl+C)")
+            self.connect_button.setStyleSheet("background-color: #4CAF50; color: white;")
+            self.status_indicator.setText(f"Status: Connected{self.client_count()}")
+            self.status_indicator.setStyleSheet("color: #4CAF50;")
+        elif state == "connecting":
+            self.connect_button.setText("Connecting... (Ctrl+C)")
+            self.connect_button.setStyleSheet("background-color: #FFA500; color: white;")
+            self.status_indicator.setText("Status: Connecting")
+            self.status_indicator.setStyleSheet("color: #FFA500;")
+        elif state == "backoff":
+            self.connect_button.setText("Reconnecting... (Ctrl+C)")
+            self.connect_button.setStyleSheet("background-color: #f44336; color: white;")
+            self.status_indicator.setText("Status: Reconnecting")
+            self.status_indicator.setStyleSheet("color: #f44336;")
+        elif detail:
+            self.connect_button.setText("Connection Failed (Ctrl+C)")
+            self.connect_button.setStyleSheet("background-color: #f44336; color: white;")
+            self.status_indicator.setText("Status: Connection Failed")
+            self.status_indicator.setStyleSheet("color: #f44336;")
+        else:
+            self.connect_button.setText("Connect to Discord (Ctrl+C)")
+            self.connect_button.setStyleSheet("")
+            self.status_indicator.setText("Status: Disconnected")
+            self.status_indicator.setStyleSheet("color: #f44336;")
+        self.refresh_status_tooltip()
+
+    def refresh_status_tooltip(self):
+        clients = "\n".join(self.service.connection.describe())
+        self.status_indicator.setToolTip(
+            f"{self.app.connection_detail}\n{clients}\nUpdates {self.service.queue.summary()}"
+        )
 
-        if not self.rpc_connected:
-            try:
-                self.rpc = Presence(app_id)
-                self.rpc.connect()
-                self.rpc_connected = True
-                self.connect_button.setText("Connected to Discord (Ctrl+C)")
-                self.connect_button.setStyleSheet("background-color: #4CAF50; color: white;")
-                self.status_bar.showMessage("Connected to Discord", 3000)
-                self.save_config()
-                # Auto-update presence after connecting
-                self.update_presence()
-                self.status_indicator.setText("Status: Connected")
-                self.status_indicator.setStyleSheet("color: #4CAF50;")
-            except Exception as e:
-                self.connect_button.setText("Connection Failed (Ctrl+C)")
-                self.connect_button.setStyleSheet("background-color: #f44336; color: white;")
-                self.status_bar.showMessage(f"Connection failed: {str(e)}", 5000)
-                print(f"Error connecting to Discord: {e}")
-                self.rpc_connected = False
-                self.rpc = None
-                self.status_indicator.setText("Status: Connection Failed")
-                self.status_indicator.setStyleSheet("color: #f44336;")
+    def client_count(self):
+        """" (2/3 clients)" when more than one Discord client is running."""
+        pool = self.service.connection
+        if len(pool.clients) < 2:
+            return ""
+        return f" ({pool.connected_count}/{len(pool.clients)} clients)"
+
+    def on_clients_changed(self):
+        """A client connected or dropped without changing the overall state."""
+        if self.service.connected:
+            cleared = " (No Presence)" if self.presence_cleared else ""
+            self.status_indicator.setText(f"Status: Connected{cleared}{self.client_count()}")
+        self.refresh_status_tooltip()
+
+    def toggle_diagnostics(self, shown):
+        self.diagnostics_label.setVisible(shown)
+        self.diagnostics_button.setText("Hide Diagnostics" if shown else "Show Diagnostics")
+        if shown:
+            self.refresh_diagnostics()
+            self.service.scheduler.add('diagnostics', self.refresh_diagnostics, DIAGNOSTICS_INTERVAL)
         else:
-            try:
-                self.rpc.clear()
-                self.rpc_connected = False
-                self.refresh_timer.stop()
-                self.connect_button.setText("Connect to Discord (Ctrl+C)")
-                self.connect_button.setStyleSheet("")
-                self.status_bar.showMessage("Disconnected from Discord", 3000)
-                self.status_indicator.setText("Status: Disconnected")
-                self.status_indicator.setStyleSheet("color: #f44336;")
-            except Exception as e:
-                self.status_bar.showMessage(f"Error disconnecting: {str(e)}", 5000)
-                print(f"Error disconnecting from Discord: {e}")
-                self.status_indicator.setText("Status: Error")
-                self.status_indicator.setStyleSheet("color: #f44336;")
+            self.service.scheduler.remove('diagnostics')
+
+    def refresh_diagnostics(self):
+        lines = registry.describe() + [self.service.art_cache.describe(), self.service.scheduler.describe()]
+        self.diagnostics_label.setText("\n".join(lines))
 
     def toggle_custom_timestamp(self):
         if self.timestamp_combo.currentText() == "Custom Timestamp":
@@ -271,389 +771,232 @@ class CustomRPCApp(QMainWindow):
         else:
             self.custom_timestamp_input.hide()
 
-    def toggle_auto_refresh(self):
-        if self.mpris_combo.currentText() != "None" and self.rpc_connected:
-            self.refresh_timer.start()
-        else:
-            self.refresh_timer.stop()
-
-    def auto_update_presence(self):
-        if self.rpc_connected and self.mpris_combo.currentText() != "None":
-            self.update_presence()
-
-    def update_presence(self):
-        """Update Discord presence with auto-connect"""
-        if not self.rpc_connected:
-            # Try to connect first
-            app_id = self.app_id_input.text().strip()
-            if not app_id:
-                self.status_bar.showMessage("Please enter a Discord App ID", 3000)
-                return
-            if not self.validate_app_id(app_id):
-                self.status_bar.showMessage("Invalid Discord App ID format", 3000)
-                return
+    def bind_mpris_player(self):
+        """Follow the MPRIS player selected in the combo box."""
+        selected_player = self.mpris_combo.currentText()
+        auto = selected_player == "Auto"
+        self.player_priority_input.setVisible(auto)
+        self.player_ignore_input.setVisible(auto)
+        self.app.set_config_field('player_auto', auto)
+        if auto:
             try:
-                self.rpc = Presence(app_id)
-                self.rpc.connect()
-                self.rpc_connected = True
-                self.connect_button.setText("Connected to Discord (Ctrl+C)")
-                self.connect_button.setStyleSheet("background-color: #4CAF50; color: white;")
-                self.status_bar.showMessage("Connected to Discord", 3000)
-                self.status_indicator.setText("Status: Connected")
-                self.status_indicator.setStyleSheet("color: #4CAF50;")
+                self.service.set_auto(True)
             except Exception as e:
-                self.status_bar.showMessage(f"Connection failed: {str(e)}", 5000)
-                print(f"Error connecting to Discord: {e}")
-                self.status_indicator.setText("Status: Connection Failed")
-                self.status_indicator.setStyleSheet("color: #f44336;")
-                return
+                self.status_bar.showMessage(f"Auto mode unavailable: {str(e)}", 5000)
+                log(f"Error enabling Auto mode: {e}")
+            return
+        self.service.select_player(selected_player if selected_player not in ("None", "") else None)
 
+    def update_presence(self):
+        """Update Discord presence with auto-connect"""
         try:
-            selected_player = self.mpris_combo.currentText()
-            if selected_player != "None":
-                artist, info = self.get_mpris_metadata(selected_player)
-                details = artist or self.details_input.text()
-                state = info or self.state_input.text()
-            else:
-                details = self.details_input.text()
-                state = self.state_input.text()
-
-            timestamp = self.timestamp_combo.currentText()
-            large_image = self.large_image_input.text()
-            large_text = self.large_image_text_input.text()
-            small_image = self.small_image_input.text()
-            small_text = self.small_image_text_input.text()
-
-            start_time = None
-            if timestamp == "Current Time":
-                if self.session_start_time is None:
-                    self.session_start_time = int(time.time())
-                start_time = self.session_start_time
-            elif timestamp == "Custom Timestamp":
-                dt = self.custom_timestamp_input.dateTime().toPyDateTime()
-                start_time = int(dt.timestamp())
-                self.session_start_time = start_time
-            else:
-                self.session_start_time = None
-
-            buttons = []
-            # Button 1
-            if self.button1_text.text():
-                url = self.button1_url.text()
-                if self.validate_url(url):
-                    buttons.append({
-                        "label": self.button1_text.text(),
-                        "url": url if url.startswith(('http://', 'https://')) else f'https://{url}'
-                    })
-                else:
-                    self.status_bar.showMessage("Invalid URL for Button 1", 3000)
-
-            # Button 2
-            if self.button2_text.text():
-                url = self.button2_url.text()
-                if self.validate_url(url):
-                    buttons.append({
-                        "label": self.button2_text.text(),
-                        "url": url if url.startswith(('http://', 'https://')) else f'https://{url}'
-                    })
-                else:
-                    self.status_bar.showMessage("Invalid URL for Button 2", 3000)
-
-            # Update presence with validated data
-            self.rpc.update(
-                details=details,
-                state=state,
-                start=start_time,
-                large_image=large_image,
-                large_text=large_text,
-                small_image=small_image,
-                small_text=small_text,
-                buttons=buttons if buttons else None
-            )
-            self.status_bar.showMessage("Presence updated successfully", 3000)
-            self.save_config()
-            
-            # Visual feedback for update button
-            self.update_button.setStyleSheet("background-color: #4CAF50; color: white;")
-            QTimer.singleShot(1000, lambda: self.update_button.setStyleSheet(""))
+            error = self.service.update()
+            if error:
+                self.status_bar.showMessage(error, 3000)
+            self.refresh_status_tooltip()
         except Exception as e:
             self.status_bar.showMessage(f"Error updating presence: {str(e)}", 5000)
-            print(f"Error updating presence: {e}")
+            log(f"Error updating presence: {e}")
             self.update_button.setStyleSheet("background-color: #f44336; color: white;")
-            QTimer.singleShot(1000, lambda: self.update_button.setStyleSheet(""))
-
-    def get_mpris_metadata(self, service_name):
-        """Get metadata from MPRIS player with improved error handling."""
-        try:
-            bus = dbus.SessionBus()
-            player = bus.get_object(service_name, '/org/mpris/MediaPlayer2')
-            properties = dbus.Interface(player, 'org.freedesktop.DBus.Properties')
-            metadata = properties.Get('org.mpris.MediaPlayer2.Player', 'Metadata')
-            
-            # Extract metadata with fallbacks
-            artist = metadata.get('xesam:artist', ['Unknown Artist'])[0]
-            title = metadata.get('xesam:title', 'Unknown Title')
-            album = metadata.get('xesam:album', 'Unknown Album')
-            
-            # Get playback status
-            playback_status = properties.Get('org.mpris.MediaPlayer2.Player', 'PlaybackStatus')
-            
-            # Format the state based on playback status
-            if playback_status == 'Playing':
-                state = f"Playing {title} from {album}"
-            elif playback_status == 'Paused':
-                state = f"Paused: {title}"
-            else:
-                state = f"Stopped: {title}"
-                
-            return artist, state
-        except dbus.exceptions.DBusException as e:
-            print(f"DBus error: {e}")
-            return None, None
-        except Exception as e:
-            print(f"Error getting MPRIS metadata: {e}")
-            return None, None
-
-    def populate_mpris_players(self):
-        try:
-            bus = dbus.SessionBus()
-            services = [name for name in bus.list_names() if name.startswith("org.mpris.MediaPlayer2.")]
-            self.current_mpris_players = set(services)
-            self.mpris_combo.clear()
-            self.mpris_combo.addItem("None")
-            for name in services:
-                try:
-                    obj = bus.get_object(name, "/org/mpris/MediaPlayer2")
-                    dbus.Interface(obj, dbus_interface="org.freedesktop.DBus.Properties")
-                    self.mpris_combo.addItem(name)
-                except dbus.exceptions.DBusException:
-                    continue
-        except Exception as e:
-            print(f"Failed to query MPRIS players: {e}")
-
-    def validate_app_id(self, app_id):
-        """Validate Discord App ID format."""
-        try:
-            # Discord App IDs are typically 18-19 digits
-            return app_id.isdigit() and len(app_id) >= 18
-        except:
-            return False
-
-    def validate_url(self, url):
-        """Validate URL format."""
-        if not url:
-            return False
-        url = url.strip()
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        try:
-            result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except:
-            return False
+            QTimer.singleShot(1000, self.reset_update_button)
+
+    def on_update_queued(self):
+        self.status_bar.showMessage("Presence update queued (rate limited)", 3000)
+        self.refresh_status_tooltip()
+
+    def on_update_result(self, cleared, error):
+        """Show whether Discord accepted an update or clear."""
+        self.refresh_status_tooltip()
+        if error:
+            action = "clearing" if cleared else "updating"
+            self.status_bar.showMessage(f"Error {action} presence: {error}", 5000)
+            self.update_button.setStyleSheet("background-color: #f44336; color: white;")
+            QTimer.singleShot(1000, self.reset_update_button)
+        elif cleared:
+            self.presence_cleared = True
+            self.status_bar.showMessage("Presence cleared", 3000)
+            self.status_indicator.setText(f"Status: Connected (No Presence){self.client_count()}")
+            self.status_indicator.setStyleSheet("color: #FFA500;")
+        else:
+            self.presence_cleared = False
+            self.status_bar.showMessage("Presence updated successfully", 3000)
+            self.status_indicator.setText(f"Status: Connected{self.client_count()}")
+            self.status_indicator.setStyleSheet("color: #4CAF50;")
 
-    def validate_config(self, config):
-        """Validate configuration data."""
-        required_fields = {
-            'app_id': str,
-            'details': str,
-            'state': str,
-            'timestamp': str,
-            'large_image': str,
-            'large_text': str,
-            'small_image': str,
-            'small_text': str,
-            'button1_text': str,
-            'button1_url': str,
-            'button2_text': str,
-            'button2_url': str
+            # Visual feedback for update button
+            self.update_button.setStyleSheet("background-color: #4CAF50; color: white;")
+            QTimer.singleShot(1000, self.reset_update_button)
+
+    def reset_update_button(self):
+        self.update_button.setStyleSheet("")
+
+    def on_warning(self, message):
+        self.status_bar.showMessage(message, 3000)
+
+    def fill_players(self):
+        """Rebuild the player combo box from the service's player list and selection."""
+        self.current_mpris_players = set()
+        self.mpris_combo.blockSignals(True)
+        self.mpris_combo.clear()
+        self.mpris_combo.addItems(["None", "Auto"])
+        self.mpris_combo.setItemData(1, "Follow whichever player is playing", Qt.ItemDataRole.ToolTipRole)
+        for name in sorted(self.service.players):
+            self.add_mpris_player(name)
+        self.mpris_combo.blockSignals(False)
+        self.on_mpris_player_selected(self.service.player)
+        auto = self.service.auto
+        self.player_priority_input.setVisible(auto)
+        self.player_ignore_input.setVisible(auto)
+
+    def on_mpris_player_added(self, name):
+        self.add_mpris_player(name)
+        self.status_bar.showMessage(f"MPRIS player added: {name}", 2000)
+
+    def on_mpris_player_removed(self, name):
+        self.remove_mpris_player(name)
+        self.status_bar.showMessage(f"MPRIS player removed: {name}", 2000)
+
+    def on_mpris_player_selected(self, name):
+        """Keep the combo box in sync when the player is switched from elsewhere."""
+        if self.service.auto:
+            self.mpris_combo.setItemData(1, f"Following {name or 'no player'}", Qt.ItemDataRole.ToolTipRole)
+            if name:
+                self.status_bar.showMessage(f"Auto: following {name}", 2000)
+            name = "Auto"
+        index = self.mpris_combo.findText(name or "None")
+        if index >= 0 and index != self.mpris_combo.currentIndex():
+            self.mpris_combo.blockSignals(True)
+            self.mpris_combo.setCurrentIndex(index)
+            self.mpris_combo.blockSignals(False)
+
+    def add_mpris_player(self, name):
+        """Insert a player into the combo box, keeping entries sorted."""
+        if name in self.current_mpris_players:
+            return
+        self.current_mpris_players.add(name)
+        # Index 0 and 1 are always "None" and "Auto"
+        index = 2
+        while index < self.mpris_combo.count() and self.mpris_combo.itemText(index) < name:
+            index += 1
+        self.mpris_combo.insertItem(index, name)
+
+    def remove_mpris_player(self, name):
+        """Drop a player from the combo box, falling back to "None" if it was selected."""
+        if name not in self.current_mpris_players:
+            return
+        self.current_mpris_players.discard(name)
+        index = self.mpris_combo.findText(name)
+        if index >= 0:
+            if index == self.mpris_combo.currentIndex():
+                self.mpris_combo.setCurrentIndex(0)
+            self.mpris_combo.removeItem(index)
+
+    def bind_config_fields(self):
+        """Mark config fields dirty as they are edited."""
+        set_field = self.app.set_config_field
+        fields = {
+            'app_id': self.app_id_input,
+            'details': self.details_input,
+            'state': self.state_input,
+            'large_image': self.large_image_input,
+            'large_text': self.large_image_text_input,
+            'small_image': self.small_image_input,
+            'small_text': self.small_image_text_input,
+            'button1_text': self.button1_text,
+            'button1_url': self.button1_url,
+            'button2_text': self.button2_text,
+            'button2_url': self.button2_url,
+            'player_priority': self.player_priority_input,
+            'player_ignore': self.player_ignore_input
         }
-        
-        # Check if all required fields exist and have correct types
-        for field, field_type in required_fields.items():
-            if field not in config:
-                return False
-            if not isinstance(config[field], field_type):
-                return False
-        
-        # Validate timestamp type
-        if config['timestamp'] not in ['None', 'Current Time', 'Custom Timestamp']:
-            return False
-            
-        return True
-
-    def save_config(self):
-        """Save current configuration to file."""
-        try:
-            config = {
-                'app_id': self.app_id_input.text(),
-                'details': self.details_input.text(),
-                'state': self.state_input.text(),
-                'timestamp': self.timestamp_combo.currentText(),
-                'large_image': self.large_image_input.text(),
-                'large_text': self.large_image_text_input.text(),
-                'small_image': self.small_image_input.text(),
-                'small_text': self.small_image_text_input.text(),
-                'button1_text': self.button1_text.text(),
-                'button1_url': self.button1_url.text(),
-                'button2_text': self.button2_text.text(),
-                'button2_url': self.button2_url.text()
-            }
-            
-            if self.validate_config(config):
-                with open(CONFIG_FILE, 'w') as f:
-                    json.dump(config, f, indent=4)
-                self.status_bar.showMessage("Configuration saved", 2000)
-            else:
-                self.status_bar.showMessage("Invalid configuration data", 3000)
-        except Exception as e:
-            self.status_bar.showMessage(f"Error saving configuration: {str(e)}", 5000)
-            print(f"Error saving configuration: {e}")
+        for field, widget in fields.items():
+            widget.textChanged.connect(lambda text, field=field: set_field(field, text))
+        for widget in (self.player_priority_input, self.player_ignore_input):
+            widget.textChanged.connect(lambda text: self.service.configure_players())
+        # Templates are checked (and compiled) as they are typed, not per update
+        for field in FIELD_LIMITS:
+            widget = fields[field]
+            widget.textChanged.connect(lambda text, widget=widget: self.check_template(widget, text))
+            self.check_template(widget, widget.text(), quiet=True)
+        self.timestamp_combo.currentTextChanged.connect(
+            lambda text: set_field('timestamp', text)
+        )
+        self.custom_timestamp_input.dateTimeChanged.connect(
+            lambda value: set_field('custom_timestamp', int(value.toSecsSinceEpoch()))
+        )
+        self.album_art_checkbox.toggled.connect(
+            lambda checked: set_field('album_art', checked)
+        )
 
-    def load_config(self):
-        """Load configuration from file."""
-        try:
-            if not os.path.exists(CONFIG_FILE):
-                return
-                
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                
-            if not self.validate_config(config):
-                self.status_bar.showMessage("Invalid configuration file", 3000)
-                return
-                
-            self.app_id_input.setText(config['app_id'])
-            self.details_input.setText(config['details'])
-            self.state_input.setText(config['state'])
-            self.large_image_input.setText(config['large_image'])
-            self.large_image_text_input.setText(config['large_text'])
-            self.small_image_input.setText(config['small_image'])
-            self.small_image_text_input.setText(config['small_text'])
-            self.button1_text.setText(config['button1_text'])
-            self.button1_url.setText(config['button1_url'])
-            self.button2_text.setText(config['button2_text'])
-            self.button2_url.setText(config['button2_url'])
-            
-            # Set timestamp type
-            index = self.timestamp_combo.findText(config['timestamp'])
-            if index >= 0:
-                self.timestamp_combo.setCurrentIndex(index)
-                if config['timestamp'] == 'Custom Timestamp':
-                    self.custom_timestamp_input.show()
-                    
-            self.status_bar.showMessage("Configuration loaded", 2000)
-        except Exception as e:
-            self.status_bar.showMessage(f"Error loading configuration: {str(e)}", 5000)
-            print(f"Error loading configuration: {e}")
+    def check_template(self, widget, text, quiet=False):
+        """Mark a text field whose template doesn't compile."""
+        error = validate_template(text)
+        widget.setStyleSheet("border: 1px solid #f44336;" if error else "")
+        widget.setToolTip(error or TEMPLATE_HELP)
+        if error and not quiet:
+            self.status_bar.showMessage(error, 3000)
+
+    def fill_from_model(self):
+        """Set the form from the config store and the service state."""
+        config = self.config_store.values
+        self.app_id_input.setText(config['app_id'])
+        self.details_input.setText(config['details'])
+        self.state_input.setText(config['state'])
+        self.large_image_input.setText(config['large_image'])
+        self.large_image_text_input.setText(config['large_text'])
+        self.small_image_input.setText(config['small_image'])
+        self.small_image_text_input.setText(config['small_text'])
+        self.button1_text.setText(config['button1_text'])
+        self.button1_url.setText(config['button1_url'])
+        self.button2_text.setText(config['button2_text'])
+        self.button2_url.setText(config['button2_url'])
+
+        # Set timestamp type
+        index = self.timestamp_combo.findText(config['timestamp'])
+        if index >= 0:
+            self.timestamp_combo.setCurrentIndex(index)
+            if config['timestamp'] == 'Custom Timestamp':
+                self.custom_timestamp_input.show()
+        self.player_priority_input.setText(config.get('player_priority', ''))
+        self.player_ignore_input.setText(config.get('player_ignore', ''))
+        self.album_art_checkbox.setChecked(config.get('album_art', True))
+        if isinstance(config.get('custom_timestamp'), int):
+            self.custom_timestamp_input.setDateTime(
+                QDateTime.fromSecsSinceEpoch(config['custom_timestamp'])
+            )
 
-    def refresh_mpris_players(self):
-        """Refresh MPRIS players list with improved error handling."""
-        try:
-            bus = dbus.SessionBus()
-            current_players = set()
-            
-            # Get all MPRIS players
-            for service in bus.list_names():
-                if service.startswith('org.mpris.MediaPlayer2.'):
-                    current_players.add(service)
-            
-            # Update combo box if players changed
-            if current_players != self.current_mpris_players:
-                self.current_mpris_players = current_players
-                current_selection = self.mpris_combo.currentText()
-                
-                self.mpris_combo.clear()
-                self.mpris_combo.addItem("None")
-                
-                for player in sorted(current_players):
-                    # Extract player name from service name
-                    player_name = player.replace('org.mpris.MediaPlayer2.', '')
-                    self.mpris_combo.addItem(player)
-                
-                # Restore previous selection if possible
-                index = self.mpris_combo.findText(current_selection)
-                if index >= 0:
-                    self.mpris_combo.setCurrentIndex(index)
-                else:
-                    self.mpris_combo.setCurrentIndex(0)
-                    
-                self.status_bar.showMessage("MPRIS players refreshed", 2000)
-        except Exception as e:
-            print(f"Error refreshing MPRIS players: {e}")
-            self.status_bar.showMessage("Error refreshing MPRIS players", 3000)
-
-    def setup_system_tray(self):
-        """Set up system tray icon with proper icon"""
-        self.tray_icon = QSystemTrayIcon(self)
-        
-        # Create a simple icon (you can replace this with your own icon file)
-        icon_pixmap = QPixmap(32, 32)
-        icon_pixmap.fill(Qt.GlobalColor.blue)  # Temporary blue square icon
-        self.tray_icon.setIcon(QIcon(icon_pixmap))
-        
-        self.tray_icon.setToolTip("Custom Rich Presence")
-        
-        # Create tray menu
-        tray_menu = QMenu()
-        show_action = tray_menu.addAction("Show")
-        show_action.triggered.connect(self.show)
-        quit_action = tray_menu.addAction("Quit")
-        quit_action.triggered.connect(self.close_application)
-        
-        self.tray_icon.setContextMenu(tray_menu)
-        self.tray_icon.show()
+        self.show_connection_state(self.app.connection_state, self.app.state_detail)
+        if self.app.mpris_started:
+            self.fill_players()
 
     def closeEvent(self, event):
         """Handle window close event"""
+        if self.app.quitting:
+            event.accept()
+            return
         reply = QMessageBox.question(
             self, 'Confirm Exit',
             "Do you want to minimize to tray instead of quitting?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.Yes
         )
-        
+
+        # Either way the window goes away; TrayApp destroys it
+        event.ignore()
         if reply == QMessageBox.StandardButton.Yes:
-            event.ignore()
-            self.hide()
-            self.tray_icon.showMessage(
-                "Custom Rich Presence",
-                "Application minimized to tray. Right-click the tray icon to show or quit.",
-                QSystemTrayIcon.MessageIcon.Information,
-                2000
-            )
+            self.app.hide_to_tray()
         else:
-            self.close_application()
-            event.accept()
-
-    def close_application(self):
-        """Clean up and close the application"""
-        try:
-            if self.rpc_connected:
-                self.rpc.clear()
-            self.mpris_refresh_timer.stop()
-            self.refresh_timer.stop()
-            self.tray_icon.hide()
-            QApplication.quit()
-        except Exception as e:
-            print(f"Error during cleanup: {e}")
-            QApplication.quit()
+            self.app.close_application()
 
     def clear_presence(self):
         """Clear the current Discord presence"""
-        if self.rpc_connected:
-            try:
-                self.rpc.clear()
-                self.status_bar.showMessage("Presence cleared", 3000)
-                self.status_indicator.setText("Status: Connected (No Presence)")
-                self.status_indicator.setStyleSheet("color: #FFA500;")
-            except Exception as e:
-                self.status_bar.showMessage(f"Error clearing presence: {str(e)}", 5000)
-        else:
-            self.status_bar.showMessage("Not connected to Discord", 3000)
+        error = self.service.clear()
+        if error:
+            self.status_bar.showMessage(error, 3000)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = CustomRPCApp()
-    window.show()
+    # The tray icon keeps the app running without a window
+    app.setQuitOnLastWindowClosed(False)
+    tray_app = TrayApp(show_window="--tray" not in sys.argv[1:])
     sys.exit(app.exec())
@@ -0,0 +1,607 @@
+import time
+
+import presence
+from art_cache import ArtCache, art_url
+from discord_ipc import ConnectionPool
+from history import History
+from logring import log
+from metrics import registry
+from playback_clock import SEEK_TOLERANCE, PlaybackClock
+from player_table import PlayerTable
+from presence_queue import PresenceQueue
+from procwatch import ProcessWatcher
+from scheduler import Scheduler
+
+ART_SAVE_INTERVAL = 60.0
+ART_SAVE_IDLE_INTERVAL = 300.0
+DISCOVERY_INTERVAL = 10.0  # Looking for Discord clients started later
+DISCOVERY_IDLE_INTERVAL = 30.0
+HISTORY_FLUSH_INTERVAL = 30.0
+HISTORY_FLUSH_IDLE_INTERVAL = 120.0
+PROCESS_SCAN_INTERVAL = 3.0
+PROCESS_SCAN_IDLE_INTERVAL = 10.0
+
+
+class PresenceService:
+    """Presence logic shared by the window and the headless daemon.
+
+    Builds SET_ACTIVITY payloads from the config store and the selected MPRIS
+    player, rate limits them and keeps the Discord connection alive. It runs
+    on any loop with the asyncio-style call_later/add_reader API and reports
+    back through plain callbacks:
+
+    on_state_changed(state, detail)   overall Discord connection state
+    on_clients_changed()              a Discord client came, went or changed state
+    on_result(cleared, error)         Discord's answer to an update or clear
+    on_queued()                       an update waits for the rate limit
+    on_warning(message)               part of the config was ignored
+    on_player_added(name)             an MPRIS player appeared
+    on_player_removed(name)           an MPRIS player went away
+    on_player_selected(name)          the followed player changed (None for none)
+    """
+
+    def __init__(self, loop, config_store):
+        self.loop = loop
+        self.config_store = config_store
+        self.session_start_time = None
+        self.overrides = {}  # Presence fields set over the control socket, never saved
+
+        # One connection per running Discord client, all sent the same presence
+        self.connection = ConnectionPool(loop)
+        self.connection.on_state_changed = self._on_state_changed
+        self.connection.on_response = self._on_response
+        self.connection.on_clients_changed = self._on_clients_changed
+        self.pending = {}  # nonce -> (payload, time sent, activity key, track)
+        # Key of the activity Discord last accepted; identical ones are not resent
+        self.acknowledged = None
+        self.sent_key = None
+
+        # Payload inputs, redone on edits and track changes rather than per update
+        self.model = presence.ActivityModel()
+
+        # Presence updates are rate limited and coalesced before reaching Discord
+        self.queue = PresenceQueue(clock=loop.time)
+        self.flush_handle = None
+
+        # Periodic work goes through one scheduler that slows down while idle
+        self.scheduler = Scheduler(loop)
+
+        # Album art is resolved through a persistent cache, saved in the background
+        self.art_cache = ArtCache()
+        self.scheduler.add('art_cache', self.art_cache.save, ART_SAVE_INTERVAL,
+                           idle_interval=ART_SAVE_IDLE_INTERVAL)
+        self.discovery_waiting = None
+        self._schedule_discovery()
+
+        # What Discord showed, journaled in memory and written out in the background
+        self.history = History()
+        self.scheduler.add('history', self.history.flush, HISTORY_FLUSH_INTERVAL,
+                           idle_interval=HISTORY_FLUSH_IDLE_INTERVAL)
+
+        # MPRIS players are tracked from bus signals, no polling. The mpris
+        # module (and dbus) is only imported by start_mpris, it is slow to load
+        self.mpris = None
+        self.players = set()
+        self.player = None
+        self.properties_match = None
+        self.mpris_last_state = None
+        self.playback_status = None
+        # Track position for the progress bar, from Seeked rather than polling
+        self.playback_clock = PlaybackClock(loop.time)
+        self.seeked_match = None
+        # Auto mode follows whichever player is active, from one bus match
+        self.auto = False
+        self.player_table = PlayerTable(loop.time)
+
+        # Running programs matched against the process rules, e.g. games and editors
+        self.processes = ProcessWatcher(loop)
+        self.processes.on_changed = self._on_process_changed
+        self.process_rules = None
+
+        self.on_state_changed = None
+        self.on_clients_changed = None
+        self.on_result = None
+        self.on_queued = None
+        self.on_warning = None
+        self.on_player_added = None
+        self.on_player_removed = None
+        self.on_player_selected = None
+        self.configure_processes()
+        self._update_idle()
+
+    @property
+    def connected(self):
+        return self.connection.state == "connected"
+
+    # Discord connection
+
+    def connect(self):
+        """Connect with the configured App ID. Returns an error message or None."""
+        app_id = self.config_store.values.get('app_id', '').strip()
+        if not app_id:
+            return "Please enter a Discord App ID"
+        if not presence.validate_app_id(app_id):
+            return "Invalid Discord App ID format"
+        self.connection.start(app_id)
+        return None
+
+    def reload_config(self):
+        """Apply edits made to the config file by something else, with one presence update.
+
+        Returns (changed fields, conflicts) as ConfigStore.reload does.
+        """
+        changed, conflicts = self.config_store.reload()
+        if not changed:
+            return changed, conflicts
+        if 'player_priority' in changed or 'player_ignore' in changed:
+            self.configure_players()
+        if 'process_rules' in changed:
+            self.configure_processes()
+        if 'app_id' in changed and self.connection.state != "disconnected":
+            # A different application, so a new handshake
+            self.connect()
+        elif self.connected:
+            self.update()
+        return changed, conflicts
+
+    def disconnect(self):
+        # Closing the pipe also clears the presence on Discord's side
+        self.connection.stop()
+
+    def _on_state_changed(self, state, detail):
+        if state != "connected":
+            self.queue.discard()
+            self._cancel_flush()
+            self.pending.clear()
+            self.acknowledged = None
+            # Discord drops the presence with the connection
+            self._record(None)
+        self._schedule_discovery()
+        self._update_idle()
+        if self.on_state_changed:
+            self.on_state_changed(state, detail)
+        # Auto-update presence after connecting; reconnects replay the last one
+        if state == "connected" and not self.connection.has_desired:
+            self.update()
+
+    def _schedule_discovery(self):
+        """Look for Discord clients, without the idle stretch while waiting for one to come back."""
+        waiting = self.connection.started and not self.connected
+        if waiting == self.discovery_waiting:
+            return
+        self.discovery_waiting = waiting
+        self.scheduler.add('discord_discovery', self.connection.discover, DISCOVERY_INTERVAL,
+                           idle_interval=None if waiting else DISCOVERY_IDLE_INTERVAL)
+
+    def _on_clients_changed(self):
+        if self.on_clients_changed:
+            self.on_clients_changed()
+
+    def _on_response(self, nonce, error):
+        payload, sent_at, key, track = self.pending.pop(nonce, (None, None, None, None))
+        if sent_at is not None:
+            registry.observe('discord_update_seconds', self.loop.time() - sent_at)
+        if error:
+            registry.inc('presence_updates_failed')
+        elif sent_at is not None:
+            self.acknowledged = key
+            self._record(payload, track)
+        if self.on_result:
+            self.on_result(sent_at is not None and payload is None, error)
+
+    # Presence updates
+
+    def update(self):
+        """Rebuild and send the presence, connecting first if needed. Returns an error or None."""
+        if self.connection.state == "disconnected":
+            # The connected state runs the update
+            return self.connect()
+        self.submit(self.build_payload())
+        return None
+
+    def clear(self):
+        """Clear the presence. Returns an error message or None."""
+        if not self.connected:
+            return "Not connected to Discord"
+        self.submit(None)
+        return None
+
+    def submit(self, payload):
+        """Send a payload (None clears) now, or hold it until Discord's rate limit allows."""
+        if not self.connected:
+            # The supervisor keeps it and sends it once the connection is back
+            self.connection.set_activity(payload)
+            return
+        # Compare with what is on its way to Discord, or else what it shows
+        key = presence.activity_key(payload)
+        if key == (self.sent_key if self.pending else self.acknowledged):
+            # Whatever waits for the rate limit would replace it, drop that too
+            self.queue.discard()
+            self._cancel_flush()
+            registry.inc('presence_updates_skipped')
+            if self.on_result and not self.pending:
+                self.on_result(payload is None, None)
+            return
+        coalesced = self.queue.has_pending
+        if self.queue.submit(payload):
+            self._send(payload)
+        else:
+            if coalesced:
+                registry.inc('presence_updates_coalesced')
+            if self.flush_handle is None:
+                self.flush_handle = self.loop.call_later(self.queue.delay(), self._flush)
+            if self.on_queued:
+                self.on_queued()
+
+    def _flush(self):
+        self.flush_handle = None
+        if not self.connected:
+            self.queue.discard()
+            return
+        ready, payload = self.queue.take()
+        if ready:
+            self._send(payload)
+        elif self.queue.has_pending:
+            self.flush_handle = self.loop.call_later(self.queue.delay(), self._flush)
+
+    def _cancel_flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+    def _send(self, payload):
+        nonce = self.connection.set_activity(payload)
+        if nonce is not None:
+            registry.inc('presence_updates_sent')
+            self.sent_key = presence.activity_key(payload)
+            self.pending[nonce] = (payload, self.loop.time(), self.sent_key, self.track_name())
+
+    def track_name(self):
+        """"Artist - Title" while the followed player is playing, for the history."""
+        values = self.model.values
+        if values.get('status') != 'Playing' or not values.get('title'):
+            return None
+        return f"{values['artist']} - {values['title']}" if values.get('artist') else values['title']
+
+    def _record(self, payload, track=None):
+        if not self.config_store.values.get('history', True):
+            return
+        if payload is None and not self.history.showing:
+            return
+        self.history.record(payload, track)
+
+    def build_payload(self):
+        """Build Presence.update arguments from the config and the selected player."""
+        # Overrides from the control socket beat the running program's rule
+        config = dict(self.config_store.values)
+        config.update(self.processes.fields())
+        config.update(self.overrides)
+        self.model.configure(config)
+        image = None
+        properties = self.track_properties() if self.player else None
+        try:
+            self.model.set_track(properties, self.player)
+        except Exception as e:
+            log(f"Error getting MPRIS metadata: {e}")
+        process_image = self.processes.active is not None and 'large_image' in self.processes.active.rule.fields
+        if properties is not None and config.get('album_art', True) and not process_image:
+            image = self.resolve_art(properties, config)
+        start, end = self.resolve_timestamps(config)
+        payload, warnings = self.model.build(start, end, image, self.playback_clock.current(),
+                                             self.playback_clock.length)
+        for warning in warnings:
+            if self.on_warning:
+                self.on_warning(warning)
+        return payload
+
+    def resolve_art(self, properties, config):
+        """large_image value for the track's album art, or None to use the configured one."""
+        url = art_url(properties)
+        if not url:
+            return None
+        try:
+            return self.art_cache.resolve(url, config.get('art_base_url', ''))
+        except Exception as e:
+            log(f"Error resolving album art: {e}")
+            return None
+
+    def resolve_timestamps(self, config):
+        """(start, end) timestamps for the configured timestamp mode."""
+        timestamp = config.get('timestamp', 'None')
+        if timestamp == "Track Progress":
+            if self.player is None:
+                return None, None
+            return self.playback_clock.timestamps(time.time())
+        if timestamp == "Current Time":
+            if self.session_start_time is None:
+                self.session_start_time = int(time.time())
+        elif timestamp == "Custom Timestamp":
+            self.session_start_time = config.get('custom_timestamp') or None
+        else:
+            self.session_start_time = None
+        return self.session_start_time, None
+
+    # MPRIS
+
+    def start_mpris(self):
+        """Connect to the session bus and return the MPRIS players already running."""
+        if self.mpris is None:
+            from mpris import MprisClient
+            self.mpris = MprisClient()
+        # Subscribe before listing so a player appearing in between is not missed
+        self.mpris.watch_players(self._on_player_added, self._on_player_removed)
+        players = self.mpris.list_players()
+        self.players = set(players)
+        return players
+
+    def find_player(self, name):
+        """Resolve a full service name or its suffix (e.g. "spotify") to a running player."""
+        if name in self.players:
+            return name
+        full_name = f"org.mpris.MediaPlayer2.{name}"
+        return full_name if full_name in self.players else None
+
+    def select_player(self, name):
+        """Follow PropertiesChanged of the given player (None for no player), leaving Auto mode."""
+        self.set_auto(False)
+        self._follow(name)
+
+    def _follow(self, name):
+        if self.properties_match is not None:
+            self.properties_match.remove()
+            self.properties_match = None
+        if self.seeked_match is not None:
+            self.seeked_match.remove()
+            self.seeked_match = None
+        self.mpris_last_state = None
+        self.playback_status = None
+        self.playback_clock.reset()
+        self.player = name if name in self.players else None
+        self._update_idle()
+        if self.on_player_selected:
+            self.on_player_selected(self.player)
+        if self.player is None:
+            return
+        from mpris import DBusException
+        try:
+            self.seeked_match = self.mpris.watch_seeked(self.player, self._on_seeked)
+        except DBusException as e:
+            log(f"Error subscribing to {self.player}: {e}")
+        if not self.auto:
+            try:
+                self.properties_match = self.mpris.watch_properties(self.player, self._on_properties_changed)
+            except DBusException as e:
+                log(f"Error subscribing to {self.player}: {e}")
+                self.player = None
+                if self.on_player_selected:
+                    self.on_player_selected(None)
+                return
+        if self.connected:
+            self.update()
+
+    def set_auto(self, enabled):
+        """Turn Auto mode on or off. Starts MPRIS if needed; raises DBusException without a bus."""
+        if enabled == self.auto:
+            return
+        if not enabled:
+            self.auto = False
+            if self.mpris is not None:
+                self.mpris.unwatch_all_properties()
+            self.player_table.clear()
+            return
+        if self.mpris is None:
+            self.start_mpris()
+        if self.properties_match is not None:
+            self.properties_match.remove()
+            self.properties_match = None
+        self.mpris.watch_all_properties(self._on_any_properties_changed)
+        self.auto = True
+        self.configure_players()
+        # One GetAll per player now; signals keep the table current afterwards
+        for name in sorted(self.players):
+            self._seed_player(name)
+        self._auto_select()
+
+    def configure_players(self):
+        """Apply the priority and ignore lists from the config."""
+        config = self.config_store.values
+        self.player_table.configure(config.get('player_priority', ''), config.get('player_ignore', ''))
+        if self.auto:
+            self._auto_select()
+
+    def _seed_player(self, name):
+        from mpris import DBusException
+        try:
+            self.player_table.update(name, self.mpris.get_properties(name))
+        except DBusException as e:
+            log(f"DBus error: {e}")
+
+    def _auto_select(self):
+        name = self.player_table.choose(self.player)
+        if name != self.player:
+            self._follow(name)
+
+    def _on_any_properties_changed(self, name, interface, changed, invalidated):
+        """Auto mode: keep the player table current and switch players as needed."""
+        from mpris import PLAYER_INTERFACE
+        if interface != PLAYER_INTERFACE:
+            return
+        if self.player_table.update(name, changed):
+            previous = self.player
+            self._auto_select()
+            if self.player != previous:
+                # Following the new player already rebuilt the presence
+                return
+        if name == self.player:
+            self._on_properties_changed(interface, changed, invalidated)
+
+    def poll_player(self):
+        """Check the selected player without bus signals (loops that can't dispatch them)."""
+        from mpris import DBusException, PLAYER_INTERFACE
+        if self.auto:
+            # No events to go by, so re-read every player
+            try:
+                players = self.mpris.list_players()
+            except DBusException as e:
+                log(f"DBus error: {e}")
+                return
+            for name in self.players - set(players):
+                self._on_player_removed(name)
+            for name in players:
+                if name not in self.players:
+                    self._on_player_added(name)
+                else:
+                    self._seed_player(name)
+            self._auto_select()
+        if self.player is None:
+            return
+        try:
+            properties = self.mpris.get_properties(self.player)
+        except DBusException as e:
+            log(f"DBus error: {e}")
+            return
+        self._on_properties_changed(PLAYER_INTERFACE, properties, [])
+        # Seeked is a signal too, so compare the position instead
+        if 'Position' in properties:
+            self._on_seeked(properties['Position'])
+
+    def track_properties(self):
+        """Metadata, PlaybackStatus and Rate of the selected player, or None.
+
+        Kept current by PropertiesChanged, so only the first update after
+        following a player reads them over the bus.
+        """
+        if self.mpris_last_state is not None and 'Metadata' in self.mpris_last_state:
+            return self.mpris_last_state
+        from mpris import DBusException
+        try:
+            properties = self.mpris.get_properties(self.player)
+        except DBusException as e:
+            log(f"DBus error: {e}")
+            return None
+        self.playback_status = str(properties.get('PlaybackStatus', 'Stopped'))
+        self._update_idle()
+        self.playback_clock.sync(properties)
+        self.mpris_last_state = {key: properties[key] for key in ('Metadata', 'PlaybackStatus', 'Rate')
+                                 if key in properties}
+        return self.mpris_last_state
+
+    def _on_properties_changed(self, interface, changed, invalidated):
+        """Rebuild the presence when the track or playback status changes."""
+        from mpris import PLAYER_INTERFACE
+        if interface != PLAYER_INTERFACE:
+            return
+        # Players also emit this for Volume, CanSeek, etc.
+        if 'Metadata' not in changed and 'PlaybackStatus' not in changed and 'Rate' not in changed:
+            return
+        state = dict(self.mpris_last_state or {})
+        for key in ('Metadata', 'PlaybackStatus', 'Rate'):
+            if key in changed:
+                state[key] = changed[key]
+        # Some players re-send identical metadata
+        if state == self.mpris_last_state:
+            return
+        self.mpris_last_state = state
+        if 'Metadata' in changed:
+            # Without it the first update reads everything over the bus
+            self._sync_clock(dict(state, Position=changed['Position']) if 'Position' in changed else state)
+        else:
+            if 'Rate' in changed:
+                self.playback_clock.set_rate(changed['Rate'])
+            if 'PlaybackStatus' in changed:
+                self.playback_clock.set_status(changed['PlaybackStatus'])
+        if 'PlaybackStatus' in state:
+            self.playback_status = str(state['PlaybackStatus'])
+            self._update_idle()
+        if self.connected:
+            self.update()
+
+    def _sync_clock(self, state):
+        """Sync the playback clock, reading Position once when the track changed."""
+        if 'Position' not in state and self.playback_clock.is_new_track(state['Metadata']):
+            from mpris import DBusException
+            try:
+                state = dict(state, Position=self.mpris.get_position(self.player))
+            except DBusException as e:
+                log(f"DBus error: {e}")  # Counted from the start of the track
+        self.playback_clock.sync(state)
+
+    def _on_seeked(self, position):
+        """Re-anchor the playback clock; only a real jump is worth a new presence."""
+        drift = self.playback_clock.seek(position)
+        if drift is None or drift < SEEK_TOLERANCE:
+            return
+        timestamp = self.overrides.get('timestamp', self.config_store.values.get('timestamp'))
+        if self.connected and timestamp == "Track Progress":
+            self.update()
+
+    def _update_idle(self):
+        """Idle while Discord is not connected, or nothing is playing and no rule matches."""
+        active = self.playback_status == 'Playing' or self.processes.active is not None
+        self.scheduler.set_idle(not self.connected or not active)
+
+    # Running programs
+
+    def configure_processes(self):
+        """Apply the process rules from the config; scanning only runs while there are some."""
+        rules = self.config_store.values.get('process_rules') or []
+        if rules == self.process_rules:
+            return
+        self.process_rules = rules
+        if not self.processes.available:
+            if rules:
+                log("Process rules need /proc, ignoring them on this system")
+            return
+        for error in self.processes.configure(rules):
+            log(error)
+            if self.on_warning:
+                self.on_warning(error)
+        if self.processes.rules:
+            self.scheduler.add('process_scan', self.processes.scan, PROCESS_SCAN_INTERVAL,
+                               idle_interval=PROCESS_SCAN_IDLE_INTERVAL)
+        else:
+            self.scheduler.remove('process_scan')
+
+    def _on_process_changed(self):
+        # A different program is a new activity, "Current Time" starts over
+        self.session_start_time = None
+        self._update_idle()
+        if self.connected:
+            self.update()
+
+    def _on_player_added(self, name):
+        self.players.add(name)
+        if self.auto:
+            self._seed_player(name)
+            self._auto_select()
+        if self.on_player_added:
+            self.on_player_added(name)
+
+    def _on_player_removed(self, name):
+        self.players.discard(name)
+        if self.auto:
+            self.player_table.remove(name)
+            self._auto_select()
+        elif name == self.player:
+            self.select_player(None)
+        if self.on_player_removed:
+            self.on_player_removed(name)
+
+    def close(self):
+        """Disconnect from Discord and drop bus subscriptions."""
+        self._cancel_flush()
+        self.scheduler.close()
+        self.processes.close()
+        self.art_cache.save()
+        if self.connected:
+            self._record(None)
+        self.history.save()
+        self.connection.stop()
+        if self.properties_match is not None:
+            self.properties_match.remove()
+            self.properties_match = None
+        if self.seeked_match is not None:
+            self.seeked_match.remove()
+            self.seeked_match = None
+        if self.mpris is not None:
+            self.mpris.close()
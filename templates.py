@@ -0,0 +1,130 @@
+"""Presence text templates.
+
+    {artist}            replaced by the value, empty if unknown
+    {? from {album}}    section, left out unless every placeholder in it has a value
+    {{ and }}           literal braces ({{ only, inside sections)
+
+Templates are compiled once into a list of strings and small render
+functions and cached by their text, so rendering an update only joins
+strings.
+"""
+from functools import lru_cache
+
+PLACEHOLDERS = ('artist', 'title', 'album', 'status', 'position', 'length', 'player')
+
+# Longest values Discord accepts
+FIELD_LIMITS = {
+    'details': 128,
+    'state': 128,
+    'large_text': 128,
+    'small_text': 128,
+    'button1_text': 32,
+    'button2_text': 32,
+}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    def __init__(self, parts, names):
+        self.parts = parts  # Literal strings and render functions
+        self.names = names  # Placeholders used anywhere in the template
+        self.constant = parts[0] if len(parts) == 1 and isinstance(parts[0], str) else None
+
+    def render(self, values):
+        if self.constant is not None:
+            return self.constant
+        return "".join(part if isinstance(part, str) else part(values) for part in self.parts)
+
+
+def _placeholder(name):
+    return lambda values: values.get(name, "")
+
+
+def _section(parts, names):
+    inner = Template(parts, names)
+
+    def render(values):
+        if all(values.get(name) for name in names):
+            return inner.render(values)
+        return ""
+    return render
+
+
+def _parse(text, index, nested):
+    """Parse until the end of text or a section's closing brace. Returns (parts, names, index)."""
+    parts = []
+    names = set()
+    literal = []
+    while index < len(text):
+        char = text[index]
+        # Inside a section "}}" closes it and an enclosing one, it isn't an escape
+        if text.startswith("{{", index) or (not nested and text.startswith("}}", index)):
+            literal.append(char)
+            index += 2
+            continue
+        if char == "}":
+            if not nested:
+                raise TemplateError(f"Unmatched '}}' at position {index + 1}")
+            break
+        if char != "{":
+            literal.append(char)
+            index += 1
+            continue
+        if literal:
+            parts.append("".join(literal))
+            literal = []
+        if text.startswith("{?", index):
+            section_parts, section_names, index = _parse(text, index + 2, True)
+            if index >= len(text):
+                raise TemplateError("Unclosed '{?' section")
+            names |= section_names
+            parts.append(_section(section_parts, section_names))
+            index += 1
+            continue
+        end = text.find("}", index)
+        if end < 0:
+            raise TemplateError(f"Unclosed '{{' at position {index + 1}")
+        name = text[index + 1:end].strip()
+        if name not in PLACEHOLDERS:
+            raise TemplateError(f"Unknown placeholder {{{name}}}, use one of {', '.join(PLACEHOLDERS)}")
+        names.add(name)
+        parts.append(_placeholder(name))
+        index = end + 1
+    if literal:
+        parts.append("".join(literal))
+    return parts, names, index
+
+
+@lru_cache(maxsize=64)
+def compile_template(text):
+    """Parse and compile a template. Raises TemplateError."""
+    parts, names, _ = _parse(text, 0, False)
+    return Template(parts or [""], frozenset(names))
+
+
+def validate(text):
+    """Error message for a template, or None if it compiles."""
+    try:
+        compile_template(text)
+    except TemplateError as e:
+        return str(e)
+    return None
+
+
+def clamp(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def render(field, text, values):
+    """Render a config field's template, clamped to Discord's limit for it.
+
+    Text that doesn't compile is sent as typed; editors report the error.
+    """
+    try:
+        text = compile_template(text).render(values)
+    except TemplateError:
+        pass
+    return clamp(text.strip(), FIELD_LIMITS.get(field, 128))